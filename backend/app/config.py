@@ -1,23 +1,71 @@
 # app/config.py
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
+from app.responses import FastJSONResponse, CompressionMiddleware
+from app.logging_setup import configure_logging, LogContextMiddleware
+from app.profiling import ProfilingMiddleware, instrument_engine, profiling_enabled, RESPONSE_HEADER as PROFILE_RESPONSE_HEADER
+
 load_dotenv()
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+# Strukturiert (JSON) über eine Queue, damit Log-Ausgabe den Event-Loop nicht bremst
+configure_logging()
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pro Worker: Konfiguration laden und auf Änderungen (NOTIFY) hören
+    from app.services.config_cache import start_config_listener, stop_config_listener
+    from app.services.readiness_service import start_readiness, stop_readiness
+    from app.services.upload_service import shutdown_pdf_pool
+    from app.services.backfill_service import resume_stale_jobs
+    from app.services.final_report_service import start_regeneration_worker, stop_regeneration_worker
+    from app.services.llm_scheduler import scheduler as llm_scheduler
+    start_config_listener()
+    # Warmup (Pool, Modelle) läuft im Hintergrund; /ready meldet erst danach bereit
+    start_readiness()
+    # Entprellte Berichts-Regenerierung: fällige Einträge aus report_regen übernehmen
+    start_regeneration_worker()
+    # Backfill-Jobs abgestürzter Worker fortsetzen (im Hintergrund, blockiert den Start nicht)
+    resume_task = asyncio.get_running_loop().create_task(resume_stale_jobs())
+    yield
+    resume_task.cancel()
+    await stop_regeneration_worker()
+    await stop_readiness()
+    stop_config_listener()
+    # Globale LLM-Slots und Warte-Eintrag dieses Workers sofort freigeben
+    llm_scheduler.close()
+    shutdown_pdf_pool()
+
 def create_app() -> FastAPI:
-    app = FastAPI(title="SEPJ Backend API")
+    app = FastAPI(title="SEPJ Backend API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
+    # gzip/br ab RESPONSE_COMPRESS_MIN_BYTES (History, Analyse-Ergebnisse, Logs)
+    app.add_middleware(CompressionMiddleware)
+    # Opt-in: X-Profile-Header, PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS (liegt innerhalb der Request-ID)
+    app.add_middleware(ProfilingMiddleware)
+    if profiling_enabled():
+        from app.db.session import engine, read_engine, has_read_replica
+        instrument_engine(engine)
+        if has_read_replica():
+            instrument_engine(read_engine)
+    # Lesende Endpoints nach eigenem Schreibzugriff kurz von der Primär-DB (nur mit DATABASE_READ_URL)
+    from app.db.routing import ReadAfterWriteMiddleware
+    app.add_middleware(ReadAfterWriteMiddleware)
+    # Request-ID und Payload-Modus (Stichprobe / X-Debug-Prompts) für alle Log-Einträge
+    app.add_middleware(LogContextMiddleware)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Für ETag-Revalidierung und Delta-Sync der History im Browser lesbar
+        expose_headers=["ETag", "X-History-Cursor", "X-History-Has-More", PROFILE_RESPONSE_HEADER],
     )
 
     return app
@@ -0,0 +1,162 @@
+# app/db/routing.py
+"""
+Lesende Endpoints über das Replikat (DATABASE_READ_URL), sofern vorhanden.
+Zurück auf die Primär-DB geht es, wenn
+
+- derselbe Client gerade geschrieben hat (Read-after-write: POST/PUT/PATCH/
+  DELETE; erkannt am Cookie sepj_last_write, bei explizitem X-Client-Id auch
+  im selben Worker ohne Cookie),
+- das Replikat mehr als DB_READ_MAX_LAG_S hinterherhängt oder nicht erreichbar ist.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.db.session import engine, read_engine, SessionLocal, ReadSessionLocal, has_read_replica
+
+logger = logging.getLogger(__name__)
+
+# So lange nach einem Schreibzugriff liest derselbe Client von der Primär-DB
+DB_READ_AFTER_WRITE_S = float(os.getenv("DB_READ_AFTER_WRITE_S", "5"))
+# Maximal tolerierter Replikationsrückstand, geprüft höchstens alle DB_READ_LAG_CHECK_S
+DB_READ_MAX_LAG_S = float(os.getenv("DB_READ_MAX_LAG_S", "2"))
+DB_READ_LAG_CHECK_S = float(os.getenv("DB_READ_LAG_CHECK_S", "5"))
+
+WRITE_COOKIE = "sepj_last_write"
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# X-Client-Id -> Zeitpunkt (time.time()) des letzten Schreibzugriffs
+_recent_writes: dict[str, float] = {}
+_lag_lock = threading.Lock()
+_lag = {"checked_at": 0.0, "ok": True, "lag_s": None, "error": None}
+_stats: Counter = Counter()
+
+
+def _client_key(headers: Headers) -> Optional[str]:
+    """
+    Nur ein expliziter X-Client-Id. Nicht die IP: hinter NAT/Proxy würden sonst
+    alle Clients nach einem fremden Schreibzugriff von der Primär-DB lesen.
+    Ohne Id gilt allein das Cookie.
+    """
+    return headers.get("x-client-id") or None
+
+
+def _mark_write(key: str) -> None:
+    now = time.time()
+    _recent_writes[key] = now
+    # Alte Einträge gelegentlich entfernen
+    if len(_recent_writes) > 10_000:
+        for k, ts in list(_recent_writes.items()):
+            if now - ts > DB_READ_AFTER_WRITE_S:
+                _recent_writes.pop(k, None)
+
+
+def _wrote_recently(request: Request) -> bool:
+    now = time.time()
+    key = _client_key(request.headers)
+    if key is not None and now - _recent_writes.get(key, 0.0) < DB_READ_AFTER_WRITE_S:
+        return True
+    try:
+        return now - float(request.cookies.get(WRITE_COOKIE, "0")) < DB_READ_AFTER_WRITE_S
+    except ValueError:
+        return False
+
+
+def _check_lag() -> None:
+    with read_engine.connect() as conn:
+        lag = conn.execute(text("""
+            SELECT CASE
+                     WHEN NOT pg_is_in_recovery() THEN 0
+                     WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                     ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+                   END
+        """)).scalar()
+    _lag.update(lag_s=float(lag), ok=float(lag) <= DB_READ_MAX_LAG_S, error=None)
+
+
+def replica_usable() -> bool:
+    """Gecachter Lag-Check; nur ein Thread prüft, die anderen nehmen den letzten Stand."""
+    if time.monotonic() - _lag["checked_at"] >= DB_READ_LAG_CHECK_S and _lag_lock.acquire(blocking=False):
+        try:
+            _check_lag()
+        except Exception as e:
+            if _lag["error"] is None:
+                logger.warning("Lese-Replikat nicht erreichbar, lese von der Primär-DB: %r", e)
+            _lag.update(ok=False, lag_s=None, error=repr(e))
+        finally:
+            _lag["checked_at"] = time.monotonic()
+            _lag_lock.release()
+    return _lag["ok"]
+
+
+def read_engine_for(request: Request) -> Engine:
+    """Engine für einen rein lesenden Request."""
+    if not has_read_replica():
+        return engine
+    if _wrote_recently(request):
+        _stats["primary_after_write"] += 1
+        return engine
+    if not replica_usable():
+        _stats["primary_lag"] += 1
+        return engine
+    _stats["replica"] += 1
+    return read_engine
+
+
+def get_read_db(request: Request) -> Session:
+    """Wie get_db, aber für rein lesende Endpoints (Replikat, falls sinnvoll)."""
+    db = ReadSessionLocal() if read_engine_for(request) is read_engine else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def replica_stats() -> dict:
+    return {
+        "configured": has_read_replica(),
+        "lag_s": _lag["lag_s"],
+        "usable": _lag["ok"],
+        "error": _lag["error"],
+        "reads": dict(_stats),
+    }
+
+
+class ReadAfterWriteMiddleware:
+    """Merkt schreibende Requests pro Client; ohne Replikat ein reiner Durchreicher."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in _SAFE_METHODS or not has_read_replica():
+            await self.app(scope, receive, send)
+            return
+
+        key = _client_key(Headers(scope=scope))
+        if key is not None:
+            # Schon ab Beginn: Lesezugriffe während einer laufenden Analyse sehen deren Stufen
+            _mark_write(key)
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                if key is not None:
+                    _mark_write(key)
+                MutableHeaders(scope=message).append(
+                    "Set-Cookie",
+                    f"{WRITE_COOKIE}={time.time():.3f}; Max-Age={int(DB_READ_AFTER_WRITE_S) + 1}; "
+                    "Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -1,18 +1,99 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, Session
+from dotenv import load_dotenv
 import os
 
-from app.models.db_models import Base
-
+# .env laden
+load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL ist nicht gesetzt oder konnte nicht geladen werden")
 
-engine = create_engine(
-    DATABASE_URL,
-    future=True,
-)
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def create_db_engine(url: str, *, prefix: str = "DB") -> Engine:
+    """
+    Zentrale Engine-Factory. Alle Pool-Parameter kommen aus der Umgebung
+    (z.B. DB_POOL_SIZE, DB_MAX_OVERFLOW), damit es im Prozess nur noch
+    eine Stelle gibt, an der Verbindungen konfiguriert werden.
+    """
+    connect_args = {}
+
+    # Statement-Timeout serverseitig pro Verbindung setzen (0 = aus)
+    statement_timeout_ms = _env_int(f"{prefix}_STATEMENT_TIMEOUT_MS", 0)
+    if statement_timeout_ms > 0:
+        connect_args["options"] = f"-c statement_timeout={statement_timeout_ms}"
+
+    # psycopg 3: serverseitige Prepared Statements ab n-ter Ausführung
+    # (psycopg-Default ist 5, 0 = sofort, leer/-1 = deaktiviert)
+    prepare_threshold = os.getenv(f"{prefix}_PREPARE_THRESHOLD")
+    if prepare_threshold not in (None, "") and url.startswith("postgresql+psycopg"):
+        threshold = int(prepare_threshold)
+        connect_args["prepare_threshold"] = threshold if threshold >= 0 else None
+
+    engine = create_engine(
+        url,
+        future=True,
+        pool_size=_env_int(f"{prefix}_POOL_SIZE", 10),
+        max_overflow=_env_int(f"{prefix}_MAX_OVERFLOW", 10),
+        pool_timeout=_env_float(f"{prefix}_POOL_TIMEOUT", 30),
+        pool_recycle=_env_int(f"{prefix}_POOL_RECYCLE", 1800),
+        pool_pre_ping=_env_bool(f"{prefix}_POOL_PRE_PING", True),
+        pool_use_lifo=True,
+        connect_args=connect_args,
+    )
+
+    # Einfache Zähler, die zusammen mit dem Pool-Status ausgegeben werden
+    engine.pool_stats_counters = {"checkouts": 0, "connects": 0, "invalidations": 0}
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+        engine.pool_stats_counters["checkouts"] += 1
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, conn_record):
+        engine.pool_stats_counters["connects"] += 1
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_conn, conn_record, exception):
+        engine.pool_stats_counters["invalidations"] += 1
+
+    return engine
+
+
+def pool_stats(engine: Engine) -> dict:
+    """Momentaufnahme des Connection-Pools (für Monitoring / Lasttests)."""
+    pool = engine.pool
+    stats = {"status": pool.status()}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            stats[name] = fn()
+    stats["max_overflow"] = getattr(pool, "_max_overflow", None)
+    stats["timeout"] = pool.timeout() if callable(getattr(pool, "timeout", None)) else None
+    stats.update(getattr(engine, "pool_stats_counters", {}))
+    return stats
+
+
+engine = create_db_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -21,11 +102,26 @@ SessionLocal = sessionmaker(
     future=True,
 )
 
+# Optionales Lese-Replikat (Streaming Replication); ohne eigene URL zeigt
+# read_engine auf die Primär-Engine. Pool-Parameter mit Präfix DB_READ_*.
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+read_engine = create_db_engine(DATABASE_READ_URL, prefix="DB_READ") if DATABASE_READ_URL else engine
+
+ReadSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=read_engine,
+    future=True,
+)
+
+
+def has_read_replica() -> bool:
+    return read_engine is not engine
+
+
 def get_db() -> Session:
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
-
-
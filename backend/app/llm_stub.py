@@ -0,0 +1,183 @@
+# app/llm_stub.py
+"""
+Deterministischer Ollama-Ersatz für Lasttests ohne GPU/Modell:
+
+    uvicorn app.llm_stub:app --port 11435
+    LLM_BACKEND=stub LLM_STUB_URL=http://localhost:11435 uvicorn app.main:app
+
+Emuliert /api/generate (mit und ohne Streaming), /api/embeddings, /api/tags
+und /api/ps. Gleicher Prompt -> gleiche Antwort; Antwortzeiten ergeben sich
+aus Latenz und Token-Raten, parallele Anfragen werden wie bei Ollama auf
+STUB_CONCURRENCY Slots begrenzt.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Zeit bis zum ersten Token (Modell-Overhead)
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "50"))
+# Prompt-Verarbeitung und Generierung in Tokens pro Sekunde (0 = ohne Wartezeit)
+STUB_PROMPT_TOKENS_PER_S = float(os.getenv("STUB_PROMPT_TOKENS_PER_S", "2000"))
+STUB_TOKENS_PER_S = float(os.getenv("STUB_TOKENS_PER_S", "50"))
+# Feste Antwortlänge in Tokens (0 = natürliche Länge der Stub-Antwort)
+STUB_OUTPUT_TOKENS = int(os.getenv("STUB_OUTPUT_TOKENS", "0"))
+# Entspricht OLLAMA_NUM_PARALLEL
+STUB_CONCURRENCY = int(os.getenv("STUB_CONCURRENCY", "1"))
+STUB_EMBED_DIM = int(os.getenv("STUB_EMBED_DIM", "768"))
+STUB_MODELS = [m.strip() for m in os.getenv(
+    "STUB_MODELS", f"{os.getenv('OLLAMA_MODEL', 'gemma:2b')},nomic-embed-text"
+).split(",") if m.strip()]
+
+app = FastAPI(title="SEPJ LLM Stub")
+_slots = asyncio.Semaphore(max(1, STUB_CONCURRENCY))
+_loaded: set[str] = set()
+
+_SENTENCES = [
+    "Der Vorfall wurde vom Sicherheitsdienst aufgenommen.",
+    "Vor Ort wurden keine weiteren Auffälligkeiten festgestellt.",
+    "Die beteiligten Personen wurden befragt.",
+    "Die zuständige Stelle wurde informiert.",
+    "Eine Nachkontrolle ist für die nächste Schicht vorgesehen.",
+    "Es entstand geringer Sachschaden.",
+]
+
+
+def _seed(prompt: str) -> int:
+    return int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12], 16)
+
+
+def _tokens(text: str) -> int:
+    # Grobe Schätzung wie in prompt_budget (~4 Zeichen pro Token)
+    return max(1, math.ceil(len(text) / 4))
+
+
+def _from_schema(schema: dict, rng: random.Random):
+    """Minimaler Wert, der zum JSON-Schema passt (reicht für die Klassifikation)."""
+    kind = schema.get("type")
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    if kind == "array":
+        items = schema.get("items", {})
+        if "enum" in items and items["enum"]:
+            k = 1 + rng.randrange(min(2, len(items["enum"])))
+            return rng.sample(items["enum"], k)
+        return [_from_schema(items, rng)]
+    if kind == "object":
+        return {k: _from_schema(v, rng) for k, v in schema.get("properties", {}).items()}
+    if kind in ("integer", "number"):
+        return rng.randrange(100)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return "stub"
+
+
+def _answer(prompt: str, fmt) -> str:
+    rng = random.Random(_seed(prompt))
+    if isinstance(fmt, dict):
+        return json.dumps(_from_schema(fmt, rng), ensure_ascii=False)
+    if fmt == "json":
+        return json.dumps({"answer": f"stub-{_seed(prompt) % 10000}"})
+    if "Frage:" in prompt:
+        return f"Stub-Antwort {_seed(prompt) % 10000}"
+    return " ".join(rng.choice(_SENTENCES) for _ in range(4 + rng.randrange(6)))
+
+
+def _split_tokens(text: str, n: int) -> list[str]:
+    if n <= 1:
+        return [text]
+    size = max(1, math.ceil(len(text) / n))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body = await request.json()
+    model = body.get("model", STUB_MODELS[0])
+    prompt = body.get("prompt")
+    _loaded.add(model)
+
+    # Nur Modell laden (Warmup)
+    if not prompt:
+        return {"model": model, "created_at": _now(), "response": "", "done": True, "done_reason": "load"}
+
+    text = _answer(prompt, body.get("format"))
+    limit = (body.get("options") or {}).get("num_predict", -1)
+    eval_count = STUB_OUTPUT_TOKENS or _tokens(text)
+    if limit and limit > 0:
+        eval_count = min(eval_count, limit)
+    prompt_count = _tokens(prompt)
+    prompt_s = prompt_count / STUB_PROMPT_TOKENS_PER_S if STUB_PROMPT_TOKENS_PER_S else 0.0
+    token_s = 1 / STUB_TOKENS_PER_S if STUB_TOKENS_PER_S else 0.0
+
+    def final(total_s: float) -> dict:
+        return {
+            "model": model,
+            "created_at": _now(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int(total_s * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": prompt_count,
+            "prompt_eval_duration": int(prompt_s * 1e9),
+            "eval_count": eval_count,
+            "eval_duration": int(eval_count * token_s * 1e9),
+        }
+
+    if body.get("stream", True):
+        async def stream():
+            async with _slots:
+                start = time.monotonic()
+                await asyncio.sleep(STUB_LATENCY_MS / 1000 + prompt_s)
+                for piece in _split_tokens(text, eval_count):
+                    await asyncio.sleep(token_s)
+                    yield json.dumps({"model": model, "created_at": _now(), "response": piece, "done": False}) + "\n"
+                yield json.dumps({**final(time.monotonic() - start), "response": ""}) + "\n"
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    async with _slots:
+        start = time.monotonic()
+        await asyncio.sleep(STUB_LATENCY_MS / 1000 + prompt_s + eval_count * token_s)
+        return {**final(time.monotonic() - start), "response": text}
+
+
+@app.post("/api/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    _loaded.add(body.get("model", "nomic-embed-text"))
+    rng = random.Random(_seed(body.get("prompt") or ""))
+    vec = [rng.gauss(0, 1) for _ in range(STUB_EMBED_DIM)]
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    async with _slots:
+        await asyncio.sleep(STUB_LATENCY_MS / 1000)
+    return {"embedding": [v / norm for v in vec]}
+
+
+def _model_info(name: str) -> dict:
+    return {"name": name, "model": name, "size": 0, "digest": hashlib.sha256(name.encode()).hexdigest()}
+
+
+@app.get("/api/tags")
+def tags():
+    return {"models": [_model_info(m) for m in sorted(set(STUB_MODELS) | _loaded)]}
+
+
+@app.get("/api/ps")
+def ps():
+    return {"models": [_model_info(m) for m in sorted(_loaded)]}
+
+
+@app.get("/")
+def root():
+    return JSONResponse("Ollama is running (stub)")
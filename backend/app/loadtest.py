@@ -0,0 +1,163 @@
+# app/loadtest.py
+"""
+Lasttest gegen eine laufende Instanz (sinnvoll mit LLM_BACKEND=stub oder replay):
+
+    python -m app.loadtest --scenario mixed --concurrency 8 --requests 200
+    python -m app.loadtest --scenario history --duration 30 --json
+
+Misst Latenzen (p50/p95/p99), Durchsatz und Fehler pro Endpoint und liest am
+Ende die Scheduler-Metriken des Backends aus.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Optional
+
+import httpx
+
+SAMPLE_REPORTS = [
+    "Um 14:30 Uhr wurde im Lager B ein Brand gemeldet. Die Feuerwehr war nach zehn Minuten vor Ort, "
+    "zwei Mitarbeiter wurden mit leichter Rauchgasvergiftung versorgt.",
+    "Bei der Nachtrunde fiel auf, dass das Tor 3 aufgebrochen war. Aus dem Container fehlen vier Laptops. "
+    "Die Polizei wurde um 02:15 Uhr verständigt.",
+    "Ein Besucher ist gestern gegen 09:00 Uhr auf der nassen Treppe im Eingangsbereich gestürzt und hat sich "
+    "am Knöchel verletzt. Der Ersthelfer hat einen Verband angelegt.",
+    "Zwei Personen gerieten am Haupteingang in einen lautstarken Streit. Der Sicherheitsdienst trennte die "
+    "Beteiligten, verletzt wurde niemand.",
+]
+
+
+def _percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 1)
+
+
+class Results:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+        self.errors: Counter = Counter()
+
+    def add(self, name: str, ms: float, status: int) -> None:
+        self.latencies[name].append(ms)
+        self.statuses[name][status] += 1
+
+    def summary(self, elapsed_s: float) -> dict:
+        out = {"elapsed_s": round(elapsed_s, 2), "endpoints": {}, "errors": dict(self.errors)}
+        for name, values in self.latencies.items():
+            out["endpoints"][name] = {
+                "requests": len(values),
+                "rps": round(len(values) / elapsed_s, 2) if elapsed_s else None,
+                "p50_ms": _percentile(values, 0.5),
+                "p95_ms": _percentile(values, 0.95),
+                "p99_ms": _percentile(values, 0.99),
+                "max_ms": round(max(values), 1),
+                "status": dict(self.statuses[name]),
+            }
+        return out
+
+
+async def _analyze(client: httpx.AsyncClient, rng: random.Random, worker: int, args) -> tuple[str, httpx.Response]:
+    text = rng.choice(SAMPLE_REPORTS)
+    # Eindeutiger Zusatz: sonst träfe Replay nur denselben Prompt (gewollt nur mit --repeat-texts)
+    if not args.repeat_texts:
+        text += f" (Lasttest {worker}-{rng.randrange(1_000_000)})"
+    response = await client.post(
+        "/api/llm/analyze",
+        params={"include_prompt": "false"},
+        json={"text": text, "title": "Lasttest"},
+        headers={"X-Client-Id": f"loadtest-{worker}"},
+    )
+    return "analyze", response
+
+
+async def _history(client: httpx.AsyncClient, rng: random.Random, worker: int, args) -> tuple[str, httpx.Response]:
+    return "history", await client.get("/api/reports/history", params={"limit": args.history_limit})
+
+
+SCENARIOS = {
+    "analyze": [(_analyze, 1.0)],
+    "history": [(_history, 1.0)],
+    # Typische Nutzung: viel Lesen, wenig Analysieren
+    "mixed": [(_analyze, 0.2), (_history, 0.8)],
+}
+
+
+async def _worker(worker: int, args, client: httpx.AsyncClient, results: Results, budget: dict, deadline: Optional[float]):
+    rng = random.Random(worker)
+    steps, weights = zip(*SCENARIOS[args.scenario])
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+        if deadline is None:
+            if budget["left"] <= 0:
+                return
+            budget["left"] -= 1
+        step = rng.choices(steps, weights)[0]
+        start = time.monotonic()
+        try:
+            name, response = await step(client, rng, worker, args)
+            results.add(name, (time.monotonic() - start) * 1000, response.status_code)
+        except httpx.HTTPError as e:
+            results.errors[type(e).__name__] += 1
+
+
+async def run(args: argparse.Namespace) -> dict:
+    results = Results()
+    budget = {"left": args.requests}
+    deadline = time.monotonic() + args.duration if args.duration else None
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        start = time.monotonic()
+        await asyncio.gather(*(
+            _worker(i, args, client, results, budget, deadline) for i in range(args.concurrency)
+        ))
+        summary = results.summary(time.monotonic() - start)
+        try:
+            summary["llm_scheduler"] = (await client.get("/api/metrics/llm-scheduler")).json()
+        except (httpx.HTTPError, ValueError):
+            summary["llm_scheduler"] = None
+
+    summary["config"] = {
+        "scenario": args.scenario, "concurrency": args.concurrency,
+        "requests": None if args.duration else args.requests, "duration_s": args.duration,
+    }
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Lasttest für /api/llm/analyze und /api/reports/history")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100, help="Gesamtzahl (ohne --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="Sekunden statt fester Anzahl")
+    parser.add_argument("--history-limit", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--repeat-texts", action="store_true", help="Gleiche Texte wiederholen (für Replay)")
+    parser.add_argument("--json", action="store_true", help="Ergebnis als JSON ausgeben")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+        return
+
+    print(f"Szenario {args.scenario}, {args.concurrency} parallel, {summary['elapsed_s']} s")
+    for name, s in summary["endpoints"].items():
+        print(
+            f"  {name:8} n={s['requests']:<5} {s['rps']} req/s  "
+            f"p50={s['p50_ms']} p95={s['p95_ms']} p99={s['p99_ms']} max={s['max_ms']} ms  {s['status']}"
+        )
+    if summary["errors"]:
+        print(f"  Fehler: {summary['errors']}")
+
+
+if __name__ == "__main__":
+    main()
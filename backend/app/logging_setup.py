@@ -0,0 +1,210 @@
+# app/logging_setup.py
+"""
+Logging über eine Queue: Handler im Request-Pfad stellen nur ein, geschrieben
+wird in einem eigenen Thread. Jeder Eintrag trägt Request-ID, Bericht und
+Pipeline-Phase; große Nutzdaten (Prompts, LLM-Antworten) werden gekürzt oder
+nur per Stichprobe bzw. Debug-Header vollständig protokolliert.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.profiling import mark_phase
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" (eine Zeile pro Eintrag) oder "text" (lesbar für lokale Entwicklung)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Prompts/Antworten werden auf so viele Zeichen gekürzt
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "500"))
+# Anteil der Requests, deren Nutzdaten (gekürzt) geloggt werden; sonst nur die Länge
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+# Header, mit dem ein Request seine Prompts vollständig protokollieren lässt
+LOG_DEBUG_HEADER = os.getenv("LOG_DEBUG_HEADER", "X-Debug-Prompts")
+# Standardmäßig aus: sonst kann jeder Client volle Prompts ins Log schreiben lassen
+LOG_ALLOW_DEBUG_HEADER = os.getenv("LOG_ALLOW_DEBUG_HEADER", "0") == "1"
+# Obergrenze der Queue; bei Überlauf werden Einträge verworfen statt zu blockieren
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# "full" | "truncated" | "off"
+_payload_mode: contextvars.ContextVar[str] = contextvars.ContextVar("log_payload_mode", default="truncated")
+_fields: contextvars.ContextVar[dict] = contextvars.ContextVar("log_fields", default={})
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+# ---------------------------------------------------------------------------
+# Kontext (Request-ID, Bericht, Phase)
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def log_context(**fields):
+    """Felder für alle Log-Einträge im aktuellen Kontext (erben auch neue Tasks)."""
+    token = _fields.set({**_fields.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _fields.reset(token)
+
+
+def set_phase(phase: str) -> None:
+    """Phase bis zum Ende des umgebenden log_context setzen (auch für das Request-Profil)."""
+    fields = _fields.get()
+    _fields.set({**fields, "phase": phase})
+    mark_phase(phase, fields.get("report_id"))
+
+
+@contextmanager
+def payload_logging(mode: str):
+    token = _payload_mode.set(mode)
+    try:
+        yield
+    finally:
+        _payload_mode.reset(token)
+
+
+class Payload:
+    """
+    Hülle für große Log-Argumente: logger.info("Prompt:\\n%s", Payload(p)).
+    Formatiert wird nur, wenn der Eintrag tatsächlich ausgegeben wird.
+    """
+    __slots__ = ("text", "mode")
+
+    def __init__(self, text):
+        self.text = text
+        self.mode = _payload_mode.get()
+
+    def __str__(self) -> str:
+        text = self.text if isinstance(self.text, str) else str(self.text)
+        if self.mode == "full":
+            return text
+        if self.mode == "off":
+            return f"<{len(text)} Zeichen>"
+        if len(text) <= LOG_PAYLOAD_MAX_CHARS:
+            return text
+        return f"{text[:LOG_PAYLOAD_MAX_CHARS]}… (+{len(text) - LOG_PAYLOAD_MAX_CHARS} Zeichen)"
+
+
+# ---------------------------------------------------------------------------
+# Handler und Formatter
+# ---------------------------------------------------------------------------
+
+class ContextFilter(logging.Filter):
+    """Läuft im aufrufenden Thread, damit die Kontextvariablen noch gelten."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.ctx = _fields.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **getattr(record, "ctx", {}),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s [%(levelname)s] %(ctx_str)s%(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        ctx = getattr(record, "ctx", {})
+        record.ctx_str = "".join(f"[{k}={v}] " for k, v in ctx.items())
+        return super().format(record)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Volle Queue blockiert nicht den Event-Loop; der Eintrag wird verworfen."""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def configure_logging() -> None:
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = _DroppingQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Restliche Einträge schreiben und den Listener-Thread beenden."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# ---------------------------------------------------------------------------
+# Middleware: Request-ID, Stichprobe, Debug-Header
+# ---------------------------------------------------------------------------
+
+class LogContextMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        request_id = (headers.get("x-request-id") or uuid.uuid4().hex[:16])[:64]
+        if LOG_ALLOW_DEBUG_HEADER and headers.get(LOG_DEBUG_HEADER, "").lower() in ("1", "true", "full"):
+            mode = "full"
+        elif random.random() < LOG_PAYLOAD_SAMPLE_RATE:
+            mode = "truncated"
+        else:
+            mode = "off"
+
+        # Für innere Middleware (Profiling)
+        scope.setdefault("state", {})["request_id"] = request_id
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-Id"] = request_id
+            await send(message)
+
+        with log_context(request_id=request_id), payload_logging(mode):
+            await self.app(scope, receive, send_with_id)
@@ -7,6 +7,24 @@ from datetime import datetime
 class AnalyzeRequest(BaseModel):
     text: str
     title: Optional[str] = None
+    # "full" | "compact" – überschreibt PROMPT_MODE pro Request (z.B. für Vergleichsmessungen)
+    prompt_mode: Optional[str] = None
+    # Spekulative Extraktion pro Request an/aus (None = SPECULATIVE_EXTRACTION)
+    speculative: Optional[bool] = None
+
+# --- Validiertes Klassifikationsergebnis (wird am LLMRun gespeichert) ---
+class ClassificationResult(BaseModel):
+    incident_types: List[str]
+    repaired: bool = False
+
+# --- Manuelle Korrektur einer extrahierten Antwort ---
+class AnswerUpdate(BaseModel):
+    answer: str
+
+# --- Export mehrerer Berichte als ZIP ---
+class BulkExportRequest(BaseModel):
+    report_ids: List[UUID]
+    format: str = "pdf"
 
 # --- NEU: Admin Schemas (Prompts, Types, Questions, Logs) ---
 
@@ -57,6 +75,8 @@ class QuestionBase(BaseModel):
     answer_type: str = "text"
     required: bool = True
     order_index: int = 0
+    # Stichwort-Hinweise für die Passagen-Auswahl
+    keywords: Optional[List[str]] = None
 
 class QuestionUpdate(BaseModel):
     label: Optional[str] = None
@@ -64,12 +84,23 @@ class QuestionUpdate(BaseModel):
     answer_type: Optional[str] = None
     required: Optional[bool] = None
     order_index: Optional[int] = None
+    keywords: Optional[List[str]] = None
 
 class QuestionOut(QuestionBase):
     id: UUID
     class Config: 
         from_attributes = True
 
+# Bulk-Import der Konfiguration (ein Commit, eine Version). Fehlt ein
+# Abschnitt, bleibt er unverändert; replace=True löscht im Abschnitt alles,
+# was nicht im Import steht.
+class ConfigBundle(BaseModel):
+    incident_types: Optional[List[IncidentTypeCreate]] = None
+    questions: Optional[List[QuestionBase]] = None
+    prompts: Optional[List[PromptBase]] = None
+    replace: bool = False
+    comment: Optional[str] = None
+
 # Logs
 class LLMRunOut(BaseModel):
     id: UUID
@@ -77,6 +108,7 @@ class LLMRunOut(BaseModel):
     model_name: str
     tokens_prompt: Optional[int]
     tokens_completion: Optional[int]
+    tokens_prompt_est: Optional[int] = None
     latency_ms: Optional[int]
     created_at: datetime
     class Config: 
@@ -35,6 +35,7 @@ class LLMRunOut(BaseModel):
     response_json: Optional[Any] = None
     tokens_prompt: Optional[int]
     tokens_completion: Optional[int]
+    tokens_prompt_est: Optional[int] = None
     latency_ms: Optional[int]
     created_at: datetime
 
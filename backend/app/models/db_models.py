@@ -4,11 +4,12 @@ from sqlalchemy import (
     Text,
     Boolean,
     Integer,
+    BigInteger,
     DateTime,
     ForeignKey,
     func,
 )
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -24,6 +25,8 @@ class RawReport(Base):
     source = Column(Text, nullable=True)
     created_by = Column(UUID(as_uuid=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Gepinnter Konfigurationsstand (config_snapshots.version)
+    config_version = Column(BigInteger, nullable=True)
 
     incidents = relationship("Incident", back_populates="report")
     llm_runs = relationship("LLMRun", back_populates="report")
@@ -65,6 +68,7 @@ class IncidentQuestion(Base):
     answer_type = Column(Text, nullable=False)
     required = Column(Boolean, default=True)
     order_index = Column(Integer, default=0)
+    keywords = Column(ARRAY(Text), nullable=True)
 
 
 class StructuredAnswer(Base):
@@ -86,6 +90,7 @@ class FinalReport(Base):
     incident_id = Column(UUID(as_uuid=True), ForeignKey("incidents.id", ondelete="CASCADE"), nullable=False)
     body_md = Column(Text, nullable=False)
     model_name = Column(Text, nullable=True)
+    version = Column(Integer, nullable=False, default=1)
     created_by = Column(UUID(as_uuid=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
@@ -100,15 +105,36 @@ class LLMRun(Base):
     model_name = Column(Text, nullable=False)
     request_json = Column(JSONB, nullable=False)
     response_json = Column(JSONB, nullable=True)
+    result_json = Column(JSONB, nullable=True)
     tokens_prompt = Column(Integer, nullable=True)
     tokens_completion = Column(Integer, nullable=True)
+    tokens_prompt_est = Column(Integer, nullable=True)
     latency_ms = Column(Integer, nullable=True)
+    prompt_hash = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     report = relationship("RawReport", back_populates="llm_runs")
     incident = relationship("Incident", back_populates="llm_runs")
 
 
+class ReportSummary(Base):
+    """Denormalisierte Zeile pro Bericht für die History (report_summary_service)."""
+    __tablename__ = "report_summaries"
+
+    report_id = Column(UUID(as_uuid=True), ForeignKey("raw_reports.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    title = Column(Text, nullable=True)
+    preview = Column(Text, nullable=True)
+    matched_types = Column(ARRAY(Text), nullable=False, default=list)
+    answer_count = Column(Integer, nullable=False, default=0)
+    has_final_report = Column(Boolean, nullable=False, default=False)
+    run_count = Column(Integer, nullable=False, default=0)
+    total_latency_ms = Column(BigInteger, nullable=False, default=0)
+    total_tokens = Column(BigInteger, nullable=False, default=0)
+    result_data = Column(JSONB, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
 class Prompt(Base):
     __tablename__ = "prompts"
 
@@ -0,0 +1,361 @@
+# app/profiling.py
+"""
+Profiling einzelner Requests (opt-in):
+
+- Auslöser: Header X-Profile: 1, Stichprobe (PROFILE_SAMPLE_RATE) oder
+  Langsam-Erfassung (PROFILE_SLOW_MS) für alle Requests.
+- Zeitleiste: Pipeline-Phasen (über set_phase), DB-Statements, Warten auf
+  den LLM-Slot, LLM-Aufrufe und Serialisierung der Antwort.
+- Call-Profil: Stack-Stichproben aus einem Hintergrund-Thread (nur Header
+  und Stichprobe), als "folded stacks" (flamegraph-kompatibel).
+
+Stichproben, langsame und per Header angeforderte Traces landen in request_profiles.
+Ist alles aus, kostet ein Request nur einen Vergleich in der Middleware.
+"""
+import asyncio
+import collections
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+import sqlalchemy as sa
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Anteil der Requests mit vollem Profil (Zeitleiste + Stack-Stichproben)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Requests ab dieser Dauer werden gespeichert (0 = keine Langsam-Erfassung)
+PROFILE_SLOW_MS = int(os.getenv("PROFILE_SLOW_MS", "0"))
+# Header, mit dem ein Request sein Profil anfordert (Antwort enthält X-Profile-Id)
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile")
+# Standardmäßig aus: jeder Client könnte sonst Stack-Sampling und DB-Schreibzugriffe auslösen
+PROFILE_ALLOW_HEADER = os.getenv("PROFILE_ALLOW_HEADER", "0") == "1"
+# Nur Pfade mit diesen Präfixen (Health-Checks und Polling nicht)
+PROFILE_PATHS = tuple(p.strip() for p in os.getenv("PROFILE_PATHS", "/api/").split(",") if p.strip())
+# Abstand der Stack-Stichproben
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+# Obergrenzen pro Trace, damit ein Ausreißer die Tabelle nicht aufbläht
+PROFILE_MAX_SPANS = int(os.getenv("PROFILE_MAX_SPANS", "500"))
+PROFILE_MAX_STACKS = int(os.getenv("PROFILE_MAX_STACKS", "200"))
+# So viele Traces bleiben in request_profiles, ältere werden gelöscht
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "1000"))
+
+RESPONSE_HEADER = "X-Profile-Id"
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_THIS_FILE = os.path.abspath(__file__)
+
+_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("profile_trace", default=None)
+
+
+def profiling_enabled() -> bool:
+    return PROFILE_SAMPLE_RATE > 0 or PROFILE_SLOW_MS > 0 or PROFILE_ALLOW_HEADER
+
+
+class Trace:
+    __slots__ = (
+        "id", "method", "path", "trigger", "sampled", "start", "phases", "spans",
+        "dropped_spans", "totals", "stacks", "samples", "report_id",
+    )
+
+    def __init__(self, method: str, path: str, trigger: str, sampled: bool):
+        self.id = uuid.uuid4()
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.sampled = sampled
+        self.start = time.perf_counter()
+        self.phases: list[tuple[str, float]] = [("request", 0.0)]
+        self.spans: list[dict] = []
+        self.dropped_spans = 0
+        # kind -> [Anzahl, ms]
+        self.totals: dict[str, list] = collections.defaultdict(lambda: [0, 0.0])
+        self.stacks: collections.Counter = collections.Counter()
+        self.samples = 0
+        self.report_id: Optional[str] = None
+
+    def elapsed_ms(self, at: Optional[float] = None) -> float:
+        return ((at if at is not None else time.perf_counter()) - self.start) * 1000
+
+    def add_span(self, kind: str, start: float, end: float, detail: Optional[str] = None) -> None:
+        ms = (end - start) * 1000
+        total = self.totals[kind]
+        total[0] += 1
+        total[1] += ms
+        if len(self.spans) >= PROFILE_MAX_SPANS:
+            self.dropped_spans += 1
+            return
+        span = {"kind": kind, "phase": self.phases[-1][0], "start_ms": round(self.elapsed_ms(start), 2), "ms": round(ms, 2)}
+        if detail:
+            span["detail"] = detail
+        self.spans.append(span)
+
+    def phase_summary(self, end_ms: float) -> list[dict]:
+        """Dauer je Phase, aufgeteilt nach DB/LLM/Rest (Rest ≈ Prompt-Bau, Parsing, Python)."""
+        bounds = self.phases + [("", end_ms)]
+        out = []
+        for (name, start_ms), (_, next_ms) in zip(bounds, bounds[1:]):
+            entry = {"phase": name, "start_ms": round(start_ms, 2), "ms": round(next_ms - start_ms, 2)}
+            by_kind = collections.defaultdict(float)
+            for span in self.spans:
+                if span["phase"] == name and start_ms <= span["start_ms"] < next_ms:
+                    by_kind[span["kind"]] += span["ms"]
+            entry.update({f"{k}_ms": round(v, 2) for k, v in by_kind.items()})
+            entry["other_ms"] = round(max(0.0, entry["ms"] - sum(by_kind.values())), 2)
+            out.append(entry)
+        return out
+
+
+# ---------------------------------------------------------------------------
+# Hooks für den Anwendungscode (ohne aktiven Trace: ein ContextVar.get)
+# ---------------------------------------------------------------------------
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def record_span(kind: str, start: float, detail: Optional[str] = None) -> None:
+    """Span von `start` (time.perf_counter()) bis jetzt, z.B. Wartezeit vor einem Slot."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_span(kind, start, time.perf_counter(), detail)
+
+
+def mark_phase(phase: str, report_id: Optional[str] = None) -> None:
+    trace = _trace.get()
+    if trace is None:
+        return
+    trace.phases.append((phase, trace.elapsed_ms()))
+    if report_id and trace.report_id is None:
+        trace.report_id = report_id
+
+
+@contextmanager
+def span(kind: str, detail: Optional[str] = None):
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(kind, start, time.perf_counter(), detail)
+
+
+def instrument_engine(engine) -> None:
+    """DB-Zeit pro Statement erfassen (nur bei aktivem Trace)."""
+
+    @sa.event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _trace.get() is not None:
+            conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    @sa.event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        trace = _trace.get()
+        starts = conn.info.get("profile_start")
+        if trace is None or not starts:
+            return
+        trace.add_span("db", starts.pop(), time.perf_counter(), " ".join(statement.split())[:200])
+
+
+# ---------------------------------------------------------------------------
+# Stack-Stichproben
+# ---------------------------------------------------------------------------
+
+class _Sampler:
+    """
+    Ein Thread für alle aktiven Profile. Erfasst werden nur Frames aus app/;
+    laufen parallel andere Requests auf demselben Event-Loop, können deren
+    Stacks mit im Profil landen (Stichprobe, keine exakte Zuordnung).
+    """
+
+    def __init__(self):
+        self._active: set[Trace] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, trace: Trace) -> None:
+        with self._lock:
+            self._active.add(trace)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def discard(self, trace: Trace) -> None:
+        with self._lock:
+            self._active.discard(trace)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                traces = list(self._active)
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = _folded(frame)
+                if stack:
+                    for trace in traces:
+                        trace.stacks[stack] += 1
+            for trace in traces:
+                trace.samples += 1
+            time.sleep(PROFILE_INTERVAL_MS / 1000)
+
+
+def _folded(frame) -> Optional[str]:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename.startswith(_APP_DIR) and code.co_filename != _THIS_FILE:
+            module = os.path.relpath(code.co_filename, _APP_DIR)[:-3].replace(os.sep, ".")
+            parts.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts)) if parts else None
+
+
+_sampler = _Sampler()
+
+
+# ---------------------------------------------------------------------------
+# Speichern und Abfragen
+# ---------------------------------------------------------------------------
+
+def _to_row(trace: Trace, status: int, duration_ms: float, request_id: Optional[str]) -> dict:
+    summary = {
+        "totals": {k: {"count": c, "ms": round(ms, 2)} for k, (c, ms) in trace.totals.items()},
+        "phases": trace.phase_summary(duration_ms),
+        "dropped_spans": trace.dropped_spans,
+    }
+    profile = None
+    if trace.sampled:
+        profile = {
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "samples": trace.samples,
+            "stacks": dict(trace.stacks.most_common(PROFILE_MAX_STACKS)),
+        }
+    return {
+        "id": trace.id,
+        "method": trace.method,
+        "path": trace.path,
+        "status": status,
+        "duration_ms": int(duration_ms),
+        "trigger": trace.trigger,
+        "request_id": request_id,
+        "report_id": trace.report_id,
+        "summary": json.dumps(summary),
+        "timeline": json.dumps(trace.spans),
+        "profile": json.dumps(profile) if profile is not None else None,
+    }
+
+
+def _store(row: dict) -> None:
+    from app.db.session import engine
+
+    with engine.begin() as conn:
+        conn.execute(sa.text("""
+            INSERT INTO request_profiles
+              (id, method, path, status, duration_ms, trigger, request_id, report_id, summary, timeline, profile)
+            VALUES
+              (:id, :method, :path, :status, :duration_ms, :trigger, :request_id, CAST(:report_id AS uuid),
+               CAST(:summary AS jsonb), CAST(:timeline AS jsonb), CAST(:profile AS jsonb))
+        """), row)
+        conn.execute(sa.text("""
+            DELETE FROM request_profiles
+            WHERE created_at < (
+              SELECT created_at FROM request_profiles ORDER BY created_at DESC OFFSET :keep LIMIT 1
+            )
+        """), {"keep": PROFILE_KEEP})
+
+
+def list_profiles(db, limit: int = 50, path: Optional[str] = None, min_ms: int = 0) -> list[dict]:
+    rows = db.execute(sa.text("""
+        SELECT id, created_at, method, path, status, duration_ms, trigger, request_id, report_id,
+               summary->'totals' AS totals, profile IS NOT NULL AS has_profile
+        FROM request_profiles
+        WHERE duration_ms >= :min_ms AND (CAST(:path AS text) IS NULL OR path LIKE :path || '%')
+        ORDER BY created_at DESC
+        LIMIT :limit
+    """), {"limit": limit, "path": path, "min_ms": min_ms}).mappings().all()
+    return [dict(r) for r in rows]
+
+
+def get_profile(db, profile_id: uuid.UUID) -> Optional[dict]:
+    row = db.execute(sa.text("SELECT * FROM request_profiles WHERE id = :id"), {"id": profile_id}).mappings().first()
+    return dict(row) if row else None
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.enabled = profiling_enabled()
+
+    def _trigger(self, scope: Scope) -> Optional[str]:
+        if PROFILE_ALLOW_HEADER and Headers(scope=scope).get(PROFILE_HEADER, "").lower() in ("1", "true"):
+            return "header"
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return "sample"
+        if PROFILE_SLOW_MS > 0:
+            return "slow"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.enabled or scope["type"] != "http" or not scope["path"].startswith(PROFILE_PATHS):
+            await self.app(scope, receive, send)
+            return
+        trigger = self._trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope["method"], scope["path"], trigger, sampled=trigger != "slow")
+        # Von LogContextMiddleware (außen) gesetzt
+        request_id = scope.get("state", {}).get("request_id")
+        status = 500
+
+        async def send_with_id(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trigger == "header":
+                    MutableHeaders(scope=message)[RESPONSE_HEADER] = str(trace.id)
+            await send(message)
+
+        token = _trace.set(trace)
+        if trace.sampled:
+            _sampler.add(trace)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _trace.reset(token)
+            _sampler.discard(trace)
+            duration_ms = trace.elapsed_ms()
+            slow = PROFILE_SLOW_MS > 0 and duration_ms >= PROFILE_SLOW_MS
+            # Stichproben immer behalten, sonst wäre PROFILE_SAMPLE_RATE wirkungslos
+            if trigger in ("header", "sample") or slow:
+                if slow:
+                    logger.warning(
+                        "Langsamer Request %s %s: %.0f ms (Profil %s)", trace.method, trace.path, duration_ms, trace.id
+                    )
+                try:
+                    await asyncio.to_thread(_store, _to_row(trace, status, duration_ms, request_id))
+                except Exception:
+                    logger.exception("Profil %s konnte nicht gespeichert werden", trace.id)
@@ -0,0 +1,133 @@
+# app/responses.py
+import os
+from typing import Any, Optional
+
+import anyio.to_thread
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.profiling import span
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - Fallback auf json aus der Standardbibliothek
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dann nur gzip
+    brotli = None
+
+# Antworten darunter werden unkomprimiert geschickt
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+# Brotli-Qualität 4-5: deutlich kleiner als gzip bei ähnlicher CPU-Zeit
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+# Größere Blöcke im Thread komprimieren, damit der Event-Loop frei bleibt
+_THREAD_MIN_BYTES = 128 * 1024
+
+# Exporte sind bereits komprimiert (PDF-Streams, DOCX/ZIP)
+_EXCLUDED_CONTENT_TYPES = DEFAULT_EXCLUDED_CONTENT_TYPES + (
+    "application/pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON über orjson: serialisiert datetime/UUID direkt und ist um ein Vielfaches schneller."""
+
+    def render(self, content: Any) -> bytes:
+        with span("serialize"):
+            if orjson is None:
+                return super().render(content)
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS, default=str)
+
+
+# ---------------------------------------------------------------------------
+# Kompression (br bevorzugt, sonst gzip)
+# ---------------------------------------------------------------------------
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int, **kwargs):
+        super().__init__(app, minimum_size, **kwargs)
+        self.quality = quality
+        self._compressor = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(quality=self.quality)
+        if len(body) >= _THREAD_MIN_BYTES:
+            return await anyio.to_thread.run_sync(self._compress_body, body, more_body)
+        return self._compress_body(body, more_body)
+
+    def _compress_body(self, body: bytes, more_body: bool) -> bytes:
+        data = self._compressor.process(body)
+        return data + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+def _accepts(header: str, encoding: str) -> bool:
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+class CompressionMiddleware:
+    """Wie Starlettes GZipMiddleware, nimmt aber Brotli, wenn Client und Paket es hergeben."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = RESPONSE_COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = Headers(scope=scope).get("Accept-Encoding", "")
+        if brotli is not None and _accepts(accept, "br"):
+            responder = BrotliResponder(
+                self.app, self.minimum_size, RESPONSE_BROTLI_QUALITY, exclude_content_types=_EXCLUDED_CONTENT_TYPES
+            )
+        elif _accepts(accept, "gzip"):
+            responder = GZipResponder(
+                self.app, self.minimum_size, RESPONSE_GZIP_LEVEL, exclude_content_types=_EXCLUDED_CONTENT_TYPES
+            )
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size, exclude_content_types=_EXCLUDED_CONTENT_TYPES)
+        await responder(scope, receive, send)
+
+
+# ---------------------------------------------------------------------------
+# Feldauswahl (?fields=a,b,c.d)
+# ---------------------------------------------------------------------------
+
+def parse_fields(fields: Optional[str]) -> Optional[set[str]]:
+    if not fields:
+        return None
+    return {f.strip() for f in fields.split(",") if f.strip()}
+
+
+def wants(fields: Optional[set[str]], name: str) -> bool:
+    """True, wenn das Feld (oder ein Unterfeld davon) angefragt ist bzw. keine Auswahl besteht."""
+    return fields is None or name in fields or any(f.startswith(name + ".") for f in fields)
+
+
+def pick(data: dict, fields: Optional[set[str]]) -> dict:
+    """Reduziert ein dict auf die angefragten Felder; "a.b" wählt Unterfelder von a."""
+    if fields is None:
+        return data
+    out = {}
+    for key, value in data.items():
+        if key in fields:
+            out[key] = value
+        elif isinstance(value, dict):
+            nested = {f.split(".", 1)[1] for f in fields if f.startswith(key + ".")}
+            if nested:
+                out[key] = pick(value, nested)
+    return out
@@ -1,27 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import text
+from typing import List, Optional
 from difflib import SequenceMatcher
 import uuid
 
 from app.db.session import get_db
+from app.db.routing import get_read_db
 from app.models.db_models import LLMRun
 # Wir nutzen die neuen Models, die wir gefixt haben
 from app.models.analyze_model import (
     PromptOut, PromptBase, PromptUpdate,
     IncidentTypeOut, IncidentTypeCreate, IncidentTypeUpdate,
     QuestionOut, QuestionBase, QuestionUpdate,
-    LLMRunOut, MetricRequest
+    LLMRunOut, MetricRequest, ConfigBundle
 )
 # Wir importieren die Services, die du gerade aktualisiert hast
 from app.services import prompts_service, incident_service, incident_questions
+from app.services.speculation_service import speculation_metrics
+from app.services import backfill_service, config_snapshot_service
+from app.services.llm_scheduler import scheduler as llm_scheduler
+from app.services.config_cache import config_cache
+from app.services.http_cache import make_etag, etag_matches, not_modified, set_cache_headers, config_version, CACHE_CONTROL
+from app.responses import FastJSONResponse
+from app import profiling
 
 router = APIRouter(tags=["Admin"])
 
+
+def _config_etag(request: Request, response: Response, db: Session, scope: str):
+    """
+    ETag aus der Konfigurationsversion; liefert eine 304-Antwort, wenn unverändert.
+    Die Version wird vor den Daten gelesen: schlimmstenfalls ist der ETag zu alt
+    und der nächste Abruf lädt unnötig neu, nie umgekehrt.
+    """
+    etag = make_etag(scope, config_version(db))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_cache_headers(response, etag)
+    return None
+
 # --- PROMPTS CRUD ---
 @router.get("/api/prompts/", response_model=List[PromptOut])
-def list_prompts(db: Session = Depends(get_db)):
-    return prompts_service.get_all_prompts(db)
+def list_prompts(request: Request, response: Response, db: Session = Depends(get_read_db)):
+    return _config_etag(request, response, db, "prompts") or prompts_service.get_all_prompts(db)
 
 @router.post("/api/prompts/", response_model=PromptOut)
 def create_prompt(data: PromptBase, db: Session = Depends(get_db)):
@@ -40,8 +62,8 @@ def delete_prompt(prompt_id: uuid.UUID, db: Session = Depends(get_db)):
 
 # --- INCIDENT TYPES CRUD ---
 @router.get("/api/config/types", response_model=List[IncidentTypeOut])
-def get_types(db: Session = Depends(get_db)):
-    return incident_service.get_all_types(db)
+def get_types(request: Request, response: Response, db: Session = Depends(get_read_db)):
+    return _config_etag(request, response, db, "types") or incident_service.get_all_types(db)
 
 @router.post("/api/config/types", response_model=IncidentTypeOut)
 def create_type(data: IncidentTypeCreate, db: Session = Depends(get_db)):
@@ -62,8 +84,8 @@ def delete_type(code: str, db: Session = Depends(get_db)):
 
 # --- QUESTIONS CRUD ---
 @router.get("/api/config/questions", response_model=List[QuestionOut])
-def get_questions(db: Session = Depends(get_db)):
-    return incident_questions.get_all_questions(db)
+def get_questions(request: Request, response: Response, db: Session = Depends(get_read_db)):
+    return _config_etag(request, response, db, "questions") or incident_questions.get_all_questions(db)
 
 @router.post("/api/config/questions", response_model=QuestionOut)
 def create_question(data: QuestionBase, db: Session = Depends(get_db)):
@@ -80,12 +102,114 @@ def delete_question(q_id: uuid.UUID, db: Session = Depends(get_db)):
     if not incident_questions.delete_question(db, q_id): raise HTTPException(404, "Not found")
     return {"status": "deleted"}
 
+# --- BACKFILL (neue/geänderte Fragen für bestehende Incidents) ---
+@router.post("/api/config/questions/{q_id}/backfill")
+async def backfill_question(q_id: uuid.UUID, overwrite: bool = False):
+    """
+    Beantwortet nur diese Frage für alle Incidents des Typs, denen die Antwort
+    fehlt (overwrite=true: auch vorhandene Antworten neu erzeugen).
+    """
+    job = await backfill_service.start_question_backfill(q_id, overwrite=overwrite)
+    if not job: raise HTTPException(404, "Question not found")
+    return job
+
+@router.get("/api/backfill")
+def list_backfill_jobs(limit: int = 50):
+    return backfill_service.list_jobs(limit)
+
+@router.get("/api/backfill/{job_id}")
+def get_backfill_job(job_id: uuid.UUID):
+    job = backfill_service.get_job(job_id)
+    if not job: raise HTTPException(404, "Job not found")
+    return job
+
+@router.post("/api/backfill/{job_id}/resume")
+async def resume_backfill_job(job_id: uuid.UUID):
+    job = await backfill_service.resume_backfill(job_id)
+    if not job: raise HTTPException(404, "Job not found")
+    return job
+
+@router.post("/api/backfill/{job_id}/cancel")
+async def cancel_backfill_job(job_id: uuid.UUID):
+    job = await backfill_service.cancel_backfill(job_id)
+    if not job: raise HTTPException(404, "Job not found")
+    return job
+
+@router.get("/api/config/version")
+def get_config_version():
+    """Konfigurationsstand dieses Workers (zum Prüfen der Invalidierung)."""
+    return config_cache.info()
+
+# --- BULK-KONFIGURATION & SNAPSHOTS ---
+@router.post("/api/config/import")
+def import_config(bundle: ConfigBundle, db: Session = Depends(get_db)):
+    """Typen, Fragen und Prompts in einer Transaktion; ergibt genau eine neue Version."""
+    try:
+        return config_snapshot_service.import_bundle(db, bundle)
+    except config_snapshot_service.ConfigImportError as e:
+        raise HTTPException(400, f"Import abgelehnt: {e}")
+
+@router.get("/api/config/export")
+def export_config(request: Request, version: Optional[int] = None, db: Session = Depends(get_read_db)):
+    """Snapshot einer Version (Standard: aktuell) im Import-Format."""
+    snapshot = config_snapshot_service.export_snapshot(db, version)
+    if not snapshot: raise HTTPException(404, "Snapshot not found")
+    # Snapshots ändern sich nie
+    etag = make_etag("config-snapshot", snapshot["version"])
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    cache = "private, max-age=31536000, immutable" if version is not None else CACHE_CONTROL
+    return FastJSONResponse(snapshot, headers={"ETag": etag, "Cache-Control": cache})
+
+@router.get("/api/config/snapshots")
+def list_config_snapshots(limit: int = 50, db: Session = Depends(get_read_db)):
+    """Versionen mit Anzahl Typen/Fragen/Prompts, neueste zuerst."""
+    return config_snapshot_service.list_snapshots(db, min(limit, 500))
+
 # --- LOGS & METRICS ---
 @router.get("/api/logs/runs", response_model=List[LLMRunOut])
-def get_llm_runs(limit: int=50, db: Session = Depends(get_db)):
+def get_llm_runs(limit: int=50, db: Session = Depends(get_read_db)):
     return db.query(LLMRun).order_by(LLMRun.created_at.desc()).limit(limit).all()
 
+@router.get("/api/logs/profiles")
+def get_request_profiles(limit: int = 50, path: Optional[str] = None, min_ms: int = 0, db: Session = Depends(get_read_db)):
+    """Gespeicherte Request-Profile (langsam oder per X-Profile angefordert), neueste zuerst."""
+    return profiling.list_profiles(db, limit=min(limit, 500), path=path, min_ms=min_ms)
+
+@router.get("/api/logs/profiles/{profile_id}")
+def get_request_profile(profile_id: uuid.UUID, db: Session = Depends(get_read_db)):
+    """Ein Profil mit Phasen, Zeitleiste und Stack-Stichproben."""
+    profile = profiling.get_profile(db, profile_id)
+    if not profile: raise HTTPException(404, "Profile not found")
+    return profile
+
 @router.post("/api/metrics/compare")
 def compare_texts(payload: MetricRequest):
     ratio = SequenceMatcher(None, payload.text1, payload.text2).ratio()
-    return {"similarity_ratio": ratio}
\ No newline at end of file
+    return {"similarity_ratio": ratio}
+
+@router.get("/api/metrics/prompt-modes")
+def prompt_mode_metrics(db: Session = Depends(get_read_db)):
+    """Vergleich full vs. compact: Prompt-Tokens und Latenz der Klassifikation."""
+    rows = db.execute(text("""
+        SELECT coalesce(request_json->>'prompt_mode', 'full') AS prompt_mode,
+               count(*) AS runs,
+               avg(tokens_prompt) AS avg_tokens_prompt,
+               avg(tokens_prompt_est) AS avg_tokens_est,
+               avg(latency_ms) AS avg_latency_ms,
+               percentile_cont(0.95) WITHIN GROUP (ORDER BY latency_ms) AS p95_latency_ms
+        FROM llm_runs
+        WHERE purpose = 'classify'
+        GROUP BY 1
+    """)).mappings().all()
+    return [dict(r) for r in rows]
+
+@router.get("/api/metrics/speculation")
+def speculation_stats():
+    """Trefferquote und verschwendete Arbeit der spekulativen Extraktion (seit Prozessstart)."""
+    return speculation_metrics.snapshot()
+
+@router.get("/api/metrics/llm-scheduler")
+def llm_scheduler_stats():
+    """Warteschlangen und Wartezeiten pro Prioritätsklasse vor Ollama."""
+    return llm_scheduler.snapshot()
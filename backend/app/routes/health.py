@@ -1,7 +1,10 @@
 # app/routes/health.py
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from sqlalchemy import text
-from app.db.session import engine
+from app.db.session import engine, read_engine, has_read_replica, pool_stats
+from app.db.routing import replica_stats
+from app.services import readiness_service
 
 router = APIRouter()
 
@@ -10,3 +13,20 @@ def health():
     with engine.connect() as conn:
         conn.execute(text("SELECT 1"))
     return {"status": "ok"}
+
+@router.get("/ready")
+def ready():
+    """
+    Readiness für den Load Balancer: gecachter Status aus Warmup und
+    Hintergrundprüfung, pro Probe wird nichts neu geprüft. 503 bis bereit.
+    """
+    snapshot = readiness_service.state.snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
+@router.get("/health/db-pool")
+def db_pool():
+    """Pool-Auslastung der zentralen Engine (Checkouts, Overflow, Reconnects), ggf. auch des Replikats."""
+    stats = pool_stats(engine)
+    if has_read_replica():
+        stats["read_replica"] = {**pool_stats(read_engine), **replica_stats()}
+    return stats
@@ -1,105 +1,318 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, tuple_
+from datetime import datetime
+from typing import List, Optional
 from app.db.session import get_db
-from app.models.db_models import RawReport, LLMRun, FinalReport
-import json
-import re
+from app.db.routing import get_read_db, read_engine_for
+from app.models.db_models import RawReport, FinalReport, Incident, ReportSummary
+from app.models.analyze_model import AnswerUpdate, BulkExportRequest
+from app.services.search_service import search_reports
+from app.services import final_report_service
+from app.services.embedding_service import find_similar_reports, embed_missing_reports
+from app.services import upload_service, export_service
+from app.services.report_render import MEDIA_TYPES
+from app.services.report_summary_service import compute_result_data
+from app.services.analysis_pipeline import run_analysis, StageFailed
+from app.services.llm_scheduler import llm_context
+from app.services.config_cache import config_cache
+from app.routes.analyze import _client_key
+from app.responses import FastJSONResponse, parse_fields, pick, wants
+from app.services.http_cache import (
+    CURSOR_HEADER, HAS_MORE_HEADER, CACHE_CONTROL, make_etag, etag_matches, not_modified,
+    history_fingerprint, encode_cursor, decode_cursor,
+)
+import uuid
 
 router = APIRouter()
 
-def clean_llm_response(response_data):
+@router.get("/api/reports/history")
+def get_reports_history(
+    request: Request,
+    limit: int = Query(20, ge=1, le=200),
+    since: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
     """
-    Hilfsfunktion: Holt den reinen Text aus verschiedenen Antwort-Formaten.
+    Letzte Berichte. Jede Antwort trägt einen ETag und im Header X-History-Cursor
+    den Sync-Zeitpunkt; mit ?since=<cursor> kommen nur neue oder seither
+    geänderte Berichte, älteste Änderung zuerst (Client ersetzt Einträge per id).
+    Gibt es mehr als `limit`, steht X-History-Has-More: true in der Antwort und
+    der Cursor zeigt hinter die letzte gelieferte Zeile. Mit ?fields=id,title,...
+    werden nur diese Felder geliefert. Gelesen wird nur report_summaries.
     """
-    if not response_data:
-        return ""
-    
-    if isinstance(response_data, dict):
-        return response_data.get("response", str(response_data))
-    
-    if isinstance(response_data, str):
-        return response_data
-        
-    return str(response_data)
-
-def parse_classification(response_data):
+    fingerprint, synced_at = history_fingerprint(db)
+    etag = make_etag("history", limit, since, fields, *fingerprint)
+    if etag_matches(request, etag):
+        # Beim Delta-Sync gelten Cursor/Has-More der gecachten Antwort weiter
+        return not_modified(etag, None if since else {CURSOR_HEADER: encode_cursor(synced_at)})
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if since:
+        # Range-Scan über idx_report_summaries_updated_id; +1 Zeile zeigt, ob mehr kommt
+        since_ts, since_id = decode_cursor(since)
+        key = tuple_(ReportSummary.updated_at, ReportSummary.report_id)
+        query = db.query(ReportSummary)
+        if since_id is None:
+            query = query.filter(ReportSummary.updated_at > since_ts)
+        else:
+            query = query.filter(key > tuple_(since_ts, since_id))
+        rows = query.order_by(ReportSummary.updated_at, ReportSummary.report_id).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        summaries = rows[:limit]
+        if summaries:
+            # Cursor aus der letzten gelieferten Zeile, nicht now(): sonst gehen abgeschnittene Änderungen verloren
+            last = summaries[-1]
+            headers[CURSOR_HEADER] = encode_cursor(last.updated_at, last.report_id if has_more else None)
+        else:
+            headers[CURSOR_HEADER] = since
+        if has_more:
+            headers[HAS_MORE_HEADER] = "true"
+    else:
+        # Ein Range-Scan über idx_report_summaries_created; Volltext nur bei Bedarf per PK
+        headers[CURSOR_HEADER] = encode_cursor(synced_at)
+        summaries = db.query(ReportSummary).order_by(desc(ReportSummary.created_at)).limit(limit).all()
+
+    selected = parse_fields(fields)
+    bodies = {}
+    if summaries and wants(selected, "full_text"):
+        bodies = dict(
+            db.query(RawReport.id, RawReport.body).filter(RawReport.id.in_([s.report_id for s in summaries])).all()
+        )
+
+    history_data = []
+    for s in summaries:
+        entry = {
+            "id": str(s.report_id),
+            "title": s.title,
+            "date": s.created_at,
+            "preview": s.preview,
+            "full_text": bodies.get(s.report_id),
+            "matched_types": s.matched_types,
+            "answer_count": s.answer_count,
+            "has_final_report": s.has_final_report,
+            "run_count": s.run_count,
+            "total_latency_ms": s.total_latency_ms,
+            "total_tokens": s.total_tokens,
+        }
+        if wants(selected, "result_data"):
+            # Noch nicht nachgezogene Altberichte live berechnen
+            entry["result_data"] = s.result_data if s.result_data is not None else compute_result_data(db, s.report_id)
+        history_data.append(pick(entry, selected))
+
+    # Direkt als Response: erspart jsonable_encoder, orjson kann datetime selbst
+    return FastJSONResponse(history_data, headers=headers)
+
+@router.get("/api/reports/search")
+def search_reports_endpoint(
+    request: Request,
+    q: Optional[str] = None,
+    incident_type: Optional[List[str]] = Query(None),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    answer_key: Optional[List[str]] = Query(None),
+    cursor: Optional[str] = None,
+    page_size: int = Query(20, ge=1, le=100),
+    facets: bool = False,
+):
     """
-    Versucht, eine Klassifikations-Liste aus den Daten zu retten.
+    Volltextsuche (deutsch) über Rohberichte und Abschlussberichte, filterbar
+    nach Vorfallstyp, Zeitraum (date_to als reines Datum inklusive) und
+    vorhandenen Antwort-Schlüsseln. Weiterblättern mit ?cursor=<next_cursor>;
+    Facetten-Zählung nur mit ?facets=true.
     """
+    if date_to is not None and len(request.query_params.get("date_to", "")) == 10:
+        # Nur Datum angegeben (YYYY-MM-DD): ganzer Tag
+        date_to = date_to.date()
     try:
-        if isinstance(response_data, list):
-            return response_data
-            
-        text = clean_llm_response(response_data)
-        
-        if "[" in text and "]" in text:
-            try:
-                match = re.search(r'\[.*\]', text, re.DOTALL)
-                if match:
-                    json_str = match.group(0).replace("'", '"') # Fix single quotes
-                    return json.loads(json_str)
-            except:
-                pass
-                
-        if len(text) < 50:
-            return [text]
-            
-        return []
-    except:
-        return []
+        return search_reports(
+            q,
+            incident_types=incident_type,
+            date_from=date_from,
+            date_to=date_to,
+            answer_keys=answer_key,
+            cursor=cursor,
+            page_size=page_size,
+            with_facets=facets,
+            bind=read_engine_for(request),
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
-@router.get("/api/reports/history")
-def get_reports_history(limit: int = 20, db: Session = Depends(get_db)):
-    reports = db.query(RawReport).order_by(desc(RawReport.created_at)).limit(limit).all()
-    
-    history_data = []
-    
-    for r in reports:
-        runs = db.query(LLMRun).filter(LLMRun.report_id == r.id).order_by(LLMRun.created_at).all()
-        
-        final_rep_entry = db.query(FinalReport).filter(FinalReport.incident_id.in_(
-            [run.incident_id for run in runs if run.incident_id]
-        )).first()
-
-        classification = []
-        facts = {}
-        
-        for run in runs:
-            try:
-                if run.purpose == "classify":
-                    classification = parse_classification(run.response_json)
-                
-                elif run.purpose == "extract_answer" and run.request_json:
-                    answ = clean_llm_response(run.response_json)
-                    
-                    prompt_snippet = run.request_json.get("prompt", "")
-                    if "Frage:" in prompt_snippet:
-                        label = prompt_snippet.split("Frage:")[-1].split("\n")[0].strip()
-                        facts[label] = answ
-            except Exception as e:
-                print(f"Error parsing run {run.id}: {e}")
-                continue
-
-        # Final Report Body laden
-        final_report_content = None
-        if final_rep_entry:
-            try:
-                final_report_content = json.loads(final_rep_entry.body_md)
-            except:
-                final_report_content = final_rep_entry.body_md
-
-        history_data.append({
-            "id": str(r.id),
-            "title": r.title or "Unbenannter Bericht",
-            "date": r.created_at,
-            "preview": r.body[:60] + "..." if r.body else "",
-            "full_text": r.body,
-            "result_data": {
-                "classification": classification,
-                "facts": facts,
-                "final_report": final_report_content
+@router.get("/api/reports/{report_id}/similar")
+def get_similar_reports(report_id: uuid.UUID, k: int = Query(5, ge=1, le=50)):
+    """Ähnliche Berichte über Embedding-Nachbarsuche (Cosinus, HNSW-Index)."""
+    hits = find_similar_reports(report_id, k)
+    if hits is None:
+        raise HTTPException(404, "Für diesen Bericht liegt noch kein Embedding vor")
+    return hits
+
+@router.post("/api/reports/embeddings/backfill")
+async def backfill_embeddings(limit: int = Query(500, ge=1, le=10000)):
+    """Bettet bestehende Berichte ohne Vektor nachträglich ein."""
+    return {"embedded": await embed_missing_reports(limit)}
+
+# --- Datei-Upload (txt/docx/pdf), ggf. mehrere Berichte pro Datei ---
+@router.post("/api/reports/upload")
+async def upload_reports(
+    request: Request,
+    filename: Optional[str] = None,
+    analyze: bool = True,
+    wait: bool = False,
+    db: Session = Depends(get_db),
+):
+    """
+    Nimmt multipart/form-data (Feld "file") oder den rohen Body (mit ?filename=)
+    entgegen. Der Inhalt wird blockweise auf die Platte geschrieben, Text in
+    Worker-Thread bzw. -Prozess extrahiert und in einzelne Berichte geteilt.
+    Die Analyse läuft im Hintergrund; mit wait=true wird ein einzelner Bericht
+    direkt analysiert und das Ergebnis zurückgegeben.
+    """
+    content_type = request.headers.get("content-type", "")
+    try:
+        is_multipart = content_type.startswith("multipart/form-data")
+        upload_service.check_content_length(request.headers.get("content-length"), multipart=is_multipart)
+        if is_multipart:
+            # Selbst vom Stream geparst: Größengrenze greift beim Empfang
+            path, name, kind = await upload_service.save_multipart(
+                request.stream(), content_type, filename=filename
+            )
+        else:
+            name = filename or "upload.txt"
+            kind = upload_service.detect_kind(name, content_type)
+            path = await upload_service.save_stream(request.stream(), suffix=f".{kind}")
+        report_ids = await upload_service.ingest_upload(path, filename=name, kind=kind)
+    except upload_service.UploadError as e:
+        raise HTTPException(e.status_code, str(e))
+
+    if not report_ids:
+        raise HTTPException(422, "Keine Berichte in der Datei gefunden")
+
+    upload_id = uuid.uuid4()
+    result = {"upload_id": str(upload_id), "filename": name, "count": len(report_ids), "report_ids": [str(r) for r in report_ids]}
+
+    if analyze and wait and len(report_ids) == 1:
+        raw_report = db.query(RawReport).filter(RawReport.id == report_ids[0]).first()
+        try:
+            with llm_context("interactive", _client_key(request)):
+                result["analysis"] = await run_analysis(db, raw_report)
+        except StageFailed as e:
+            raise HTTPException(
+                status_code=502,
+                detail={"message": str(e), "stage": e.stage, "raw_report_id": str(e.report_id)},
+            )
+    elif analyze:
+        upload_service.schedule_analysis(upload_id, report_ids)
+        result["analysis"] = "scheduled"
+    return result
+
+# --- Export des Abschlussberichts (PDF/DOCX), gecacht über den Inhalts-Hash ---
+def _check_format(format: str) -> str:
+    if format not in export_service.EXPORT_FORMATS:
+        raise HTTPException(400, f"Unbekanntes Format: {format}")
+    return format
+
+@router.get("/api/reports/{report_id}/export")
+def export_report(report_id: uuid.UUID, request: Request, format: str = "pdf", db: Session = Depends(get_db)):
+    """
+    Liefert den Bericht samt Antworten als Datei. Der ETag ist der Hash des
+    Inhalts: unveränderte Berichte kommen aus dem Cache bzw. als 304.
+    """
+    fmt = _check_format(format)
+    data = export_service.load_export_data(db, report_id)
+    if data is None:
+        raise HTTPException(404, "Report not found")
+
+    etag = f'"{export_service.content_hash(data, fmt)}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    path, _ = export_service.render_cached(data, fmt)
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES[fmt],
+        filename=export_service.export_filename(data, fmt),
+        headers=headers,
+    )
+
+@router.post("/api/reports/export")
+def export_reports_zip(data: BulkExportRequest):
+    """Mehrere Berichte als ZIP; wird während des Renderns gestreamt."""
+    fmt = _check_format(data.format)
+    if not data.report_ids:
+        raise HTTPException(400, "Keine Berichte angegeben")
+    if len(data.report_ids) > export_service.EXPORT_BULK_MAX:
+        raise HTTPException(400, f"Maximal {export_service.EXPORT_BULK_MAX} Berichte pro Export")
+    return StreamingResponse(
+        export_service.iter_zip(list(dict.fromkeys(data.report_ids)), fmt),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="berichte_{fmt}.zip"'},
+    )
+
+# --- Manuelle Korrektur von Antworten + Regenerierung des Abschlussberichts ---
+@router.put("/api/incidents/{incident_id}/answers/{question_key}")
+async def update_answer(
+    incident_id: uuid.UUID,
+    question_key: str,
+    data: AnswerUpdate,
+    regenerate: bool = True,
+    db: Session = Depends(get_db),
+):
+    """
+    Überschreibt eine extrahierte Antwort (source = manual). Der Abschlussbericht
+    wird entprellt neu geschrieben: mehrere Korrekturen kurz hintereinander
+    lösen nur einen LLM-Aufruf aus.
+    """
+    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    if not incident:
+        raise HTTPException(404, "Incident not found")
+    if config_cache.get().question(incident.incident_type, question_key) is None:
+        raise HTTPException(404, f"Unbekannte Frage '{question_key}' für Typ {incident.incident_type}")
+
+    value_json = final_report_service.update_answer(db, incident, question_key, data.answer, regenerate=regenerate)
+    regenerate_in = final_report_service.REPORT_REGEN_DEBOUNCE_S if regenerate else None
+    return {
+        "incident_id": str(incident_id),
+        "question_key": question_key,
+        "value_json": value_json,
+        "regeneration_in_s": regenerate_in,
+    }
+
+@router.post("/api/reports/{report_id}/final-report/regenerate")
+async def regenerate_final_report(report_id: uuid.UUID):
+    """Schreibt den Abschlussbericht sofort neu (ohne Entprellung)."""
+    try:
+        text = await final_report_service.regenerate_final_report(report_id, reason="manual")
+    except final_report_service.FinalReportFailed as e:
+        raise HTTPException(status_code=502, detail={"message": str(e), "raw_report_id": str(report_id)})
+    if text is None:
+        raise HTTPException(404, "Report not found")
+    return {"final_report": text}
+
+@router.get("/api/reports/{report_id}/final-reports")
+def list_final_report_versions(report_id: uuid.UUID, db: Session = Depends(get_read_db)):
+    """Alle Versionen des Abschlussberichts, neueste zuerst."""
+    rows = (
+        db.query(FinalReport)
+        .join(Incident, Incident.id == FinalReport.incident_id)
+        .filter(Incident.report_id == report_id)
+        .order_by(FinalReport.version.desc())
+        .all()
+    )
+    return {
+        "regeneration_pending": final_report_service.is_regeneration_pending(db, report_id),
+        "versions": [
+            {
+                "id": str(r.id),
+                "incident_id": str(r.incident_id),
+                "version": r.version,
+                "model_name": r.model_name,
+                "created_at": r.created_at,
+                "body_md": r.body_md,
             }
-        })
-    
-    return history_data
\ No newline at end of file
+            for r in rows
+        ],
+    }
@@ -0,0 +1,450 @@
+# app/services/analysis_pipeline.py
+import json
+import logging
+import time
+import uuid
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.models.db_models import RawReport, Incident, StructuredAnswer, FinalReport
+from app.services.prompts_service import (
+    build_prompt,
+    build_compact_prompt,
+    PROMPT_MODE,
+    FEWSHOT_K,
+)
+from app.services.prompt_budget import assemble_prompt
+from app.services.classification_service import (
+    build_classification_schema,
+    parse_classification_result,
+    CLASSIFY_STRUCTURED_OUTPUT,
+    CLASSIFY_NUM_PREDICT,
+)
+from app.services.fewshot_service import select_examples
+from app.services.config_cache import config_cache, ConfigSnapshot
+from app.services.ollama_client import call_ollama_with_meta, get_base_url, get_model_name
+from app.services.embedding_service import enqueue_report_embedding
+from app.services.extraction_service import extract_answer, persist_extraction
+from app.services.passage_service import PassageSelector
+from app.logging_setup import Payload, log_context, set_phase
+from app.services.speculation_service import SpeculativeExtraction, SPECULATIVE_EXTRACTION
+from app.services.persistence_service import create_incidents_for_types, create_llm_run
+from app.services.final_report_service import generate_final_report
+from app.services.report_summary_service import sync_summary
+
+logger = logging.getLogger(__name__)
+
+# Stufen: classify -> answer:<typ>:<key> (je Frage) -> final_report
+STAGE_CLASSIFY = "classify"
+STAGE_FINAL_REPORT = "final_report"
+
+REPORT_ERROR_TEXT = "Fehler: Bericht konnte nicht generiert werden."
+
+
+def answer_stage(incident_type: str, question_key: str) -> str:
+    return f"answer:{incident_type}:{question_key}"
+
+
+class StageFailed(Exception):
+    """Eine Stufe ist fehlgeschlagen; der Bericht kann per Retry fortgesetzt werden."""
+
+    def __init__(self, stage: str, report_id: uuid.UUID, message: str):
+        super().__init__(message)
+        self.stage = stage
+        self.report_id = report_id
+
+
+# ---------------------------------------------------------------------------
+# Stufen-Status (analysis_stages)
+# ---------------------------------------------------------------------------
+
+def load_stages(db: Session, report_id: uuid.UUID) -> dict[str, dict]:
+    rows = db.execute(sa.text("""
+        SELECT stage, status, attempts, error, detail, updated_at
+        FROM analysis_stages
+        WHERE report_id = :report_id
+    """), {"report_id": report_id}).mappings().all()
+    return {r["stage"]: dict(r) for r in rows}
+
+
+def mark_stage(
+    db: Session,
+    report_id: uuid.UUID,
+    stage: str,
+    status: str,
+    *,
+    error: Optional[str] = None,
+    detail: Optional[dict] = None,
+) -> None:
+    """Schreibt den Status einer Stufe; committet wird zusammen mit deren Ergebnis."""
+    db.execute(sa.text("""
+        INSERT INTO analysis_stages (report_id, stage, status, error, detail)
+        VALUES (:report_id, :stage, :status, :error, CAST(:detail AS jsonb))
+        ON CONFLICT (report_id, stage) DO UPDATE
+        SET status = EXCLUDED.status,
+            error = EXCLUDED.error,
+            detail = coalesce(EXCLUDED.detail, analysis_stages.detail),
+            attempts = analysis_stages.attempts + 1,
+            updated_at = now()
+    """), {
+        "report_id": report_id,
+        "stage": stage,
+        "status": status,
+        "error": error,
+        "detail": json.dumps(detail, ensure_ascii=False) if detail is not None else None,
+    })
+
+
+def _is_done(stages: dict[str, dict], stage: str) -> bool:
+    return stages.get(stage, {}).get("status") == "done"
+
+
+# ---------------------------------------------------------------------------
+# Stufe 1: Klassifikation + Incidents
+# ---------------------------------------------------------------------------
+
+async def _classify(
+    db: Session,
+    raw_report: RawReport,
+    text: str,
+    config: ConfigSnapshot,
+    *,
+    prompt_mode: str,
+    use_speculation: bool,
+    model_name: str,
+    base_url: str,
+) -> tuple[dict, Optional[SpeculativeExtraction]]:
+    incident_types = config.incident_types
+    prompts = config.prompts
+
+    if prompt_mode == "compact":
+        examples = await select_examples(text, FEWSHOT_K)
+        # Beispiele füllen nur den Restplatz, das Transkript hat Vorrang
+        classify = await assemble_prompt(
+            "classify",
+            lambda t: build_compact_prompt(t, incident_types, prompts, examples),
+            text,
+            overhead_render=lambda t: build_compact_prompt(t, incident_types, prompts, []),
+        )
+    else:
+        prompt_mode = "full"
+        classify = await assemble_prompt(
+            "classify", lambda t: build_prompt(t, incident_types, prompts), text
+        )
+    logger.info("Generated classify prompt:\n%s", Payload(classify.prompt))
+
+    type_names = [t["name"] for t in incident_types]
+    classify_format = None
+    classify_options = None
+    if CLASSIFY_STRUCTURED_OUTPUT:
+        # Ausgabe per JSON-Schema auf die aktuellen Typnamen beschränken
+        classify_format = build_classification_schema(type_names)
+        classify_options = {"num_predict": CLASSIFY_NUM_PREDICT}
+
+    # Optional: Extraktion für wahrscheinliche Typen parallel vorziehen
+    speculation = None
+    if use_speculation:
+        speculation = SpeculativeExtraction.start(
+            text,
+            incident_types,
+            load_questions=config.questions_for,
+            model_name=model_name,
+            base_url=base_url,
+            reference_date=raw_report.created_at.date() if raw_report.created_at else None,
+        )
+
+    try:
+        start_ts = time.time()
+        raw_result, result_raw = await call_ollama_with_meta(
+            model_name, base_url, classify.prompt,
+            format=classify_format, options=classify_options,
+        )
+        latency_ms = int((time.time() - start_ts) * 1000)
+    except Exception as e:
+        logger.error("LLM Fehler (classify): %r", e)
+        if speculation:
+            await speculation.resolve([])
+        mark_stage(db, raw_report.id, STAGE_CLASSIFY, "failed", error=repr(e))
+        db.commit()
+        raise StageFailed(STAGE_CLASSIFY, raw_report.id, "Fehler bei LLM-Anfrage (classify)")
+
+    logger.debug("LLM raw classification response: %s", Payload(result_raw))
+    logger.info("LLM classification text response: %s", Payload(raw_result))
+
+    # Klassifikationsergebnis validieren (Reparatur nur bei Fehlern)
+    classification = parse_classification_result(raw_result, type_names)
+    logger.info("Validierte Klassifikation: %r (repariert: %s)", classification.incident_types, classification.repaired)
+
+    create_llm_run(
+        db,
+        purpose="classify",
+        model_name=model_name,
+        request_payload=classify.request_payload(
+            prompt_mode=prompt_mode, format=classify_format
+        ),
+        response_payload=result_raw,
+        report_id=raw_report.id,
+        incident_id=None,
+        latency_ms=latency_ms,
+        tokens_prompt_est=classify.tokens_est,
+        result_payload=classification.model_dump(),
+    )
+
+    # Mapping von Text zu Code
+    llm_normalized = [x.lower().strip() for x in classification.incident_types]
+    name_to_code = config.type_mapping
+
+    matched_incidents = []
+    for name in llm_normalized:
+        if name == "keiner":
+            continue
+        if name not in name_to_code:
+            logger.warning("Unbekannter Vorfalltyp: %s", name)
+            continue
+        matched_incidents.append(name_to_code[name])
+        logger.info("Mapped '%s' → '%s'", name, name_to_code[name])
+
+    if not matched_incidents:
+        logger.warning("Keine Vorfälle erkannt → fallback: unknown")
+        matched_incidents = ["unknown"]
+
+    create_incidents_for_types(db, report_id=raw_report.id, incident_types=matched_incidents)
+
+    detail = {
+        "result": classification.incident_types,
+        "matched_incident_types": matched_incidents,
+        "prompt": classify.prompt,
+        "response": raw_result,
+    }
+    mark_stage(db, raw_report.id, STAGE_CLASSIFY, "done", detail=detail)
+    db.commit()
+    return detail, speculation
+
+
+def _load_incidents(db: Session, report_id: uuid.UUID, matched: list[str]) -> list[Incident]:
+    """Incidents in der Reihenfolge der Klassifikation (erstes = primärer Incident)."""
+    rows = db.query(Incident).filter(Incident.report_id == report_id).all()
+    order = {code: i for i, code in enumerate(matched)}
+    return sorted(rows, key=lambda inc: order.get(inc.incident_type, len(order)))
+
+
+def _load_answers(db: Session, incident_ids: list) -> dict[tuple, str]:
+    rows = db.query(StructuredAnswer).filter(StructuredAnswer.incident_id.in_(incident_ids)).all()
+    return {(r.incident_id, r.question_key): (r.value_json or {}).get("answer") for r in rows}
+
+
+# ---------------------------------------------------------------------------
+# Gesamter Ablauf
+# ---------------------------------------------------------------------------
+
+async def run_analysis(
+    db: Session,
+    raw_report: RawReport,
+    *,
+    prompt_mode: Optional[str] = None,
+    speculative: Optional[bool] = None,
+) -> dict:
+    """
+    Führt die Analyse für einen gespeicherten Rohbericht aus. Jede Stufe wird
+    nach Abschluss committet und in analysis_stages vermerkt; ein erneuter
+    Aufruf (Retry) überspringt erledigte Stufen und holt nur fehlende oder
+    fehlgeschlagene nach. Danach wird die History-Zeile (report_summaries)
+    aktualisiert, auch nach Fehlern.
+    """
+    # Alle Log-Einträge des Laufs tragen Bericht und aktuelle Stufe
+    with log_context(report_id=str(raw_report.id)):
+        try:
+            result = await _run_analysis_steps(db, raw_report, prompt_mode=prompt_mode, speculative=speculative)
+        except Exception:
+            db.rollback()
+            sync_summary(db, raw_report.id)
+            raise
+        sync_summary(db, raw_report.id)
+        return result
+
+
+async def _run_analysis_steps(
+    db: Session,
+    raw_report: RawReport,
+    *,
+    prompt_mode: Optional[str],
+    speculative: Optional[bool],
+) -> dict:
+    text = raw_report.body
+    model_name = get_model_name()
+    base_url = get_base_url()
+    stages = load_stages(db, raw_report.id)
+    resumed = bool(stages)
+    # Ein Konfigurationsstand für den ganzen Lauf; gepinnt am Bericht, damit ein
+    # Retry mit derselben Version weiterarbeitet (committet mit der ersten Stufe)
+    config = config_cache.for_version(raw_report.config_version)
+    if raw_report.config_version is None:
+        raw_report.config_version = config.version
+
+    # -----------------------------------------------------------------------
+    # 1) Klassifikation
+    # -----------------------------------------------------------------------
+    set_phase(STAGE_CLASSIFY)
+    speculation = None
+    if _is_done(stages, STAGE_CLASSIFY):
+        classified = stages[STAGE_CLASSIFY]["detail"]
+        logger.info("Klassifikation für %s bereits vorhanden, übersprungen", raw_report.id)
+    else:
+        use_speculation = SPECULATIVE_EXTRACTION if speculative is None else speculative
+        classified, speculation = await _classify(
+            db, raw_report, text, config,
+            prompt_mode=(prompt_mode or PROMPT_MODE).lower(),
+            use_speculation=use_speculation,
+            model_name=model_name,
+            base_url=base_url,
+        )
+
+    matched_incidents = classified["matched_incident_types"]
+    final_prompt = f"{classified['prompt']}\nAntwort: {classified['response']}"
+    logger.info("Matched incidents: %s", matched_incidents)
+
+    incident_rows = _load_incidents(db, raw_report.id, matched_incidents)
+    type_to_incident = {inc.incident_type: inc for inc in incident_rows}
+
+    # Spekulative Ergebnisse für bestätigte Typen übernehmen, Rest verwerfen
+    speculation_summary = None
+    if speculation:
+        speculation_summary = await speculation.resolve(matched_incidents)
+        logger.info("Spekulation: %s", speculation_summary)
+
+    # -----------------------------------------------------------------------
+    # 2) Fragen pro Incident (je Frage eine Stufe)
+    # -----------------------------------------------------------------------
+    incident_questions = config.questions_for(matched_incidents)
+    logger.info("Loaded %d incident questions", len(incident_questions))
+
+    stored_answers = _load_answers(db, [inc.id for inc in incident_rows]) if resumed else {}
+    answers = {}
+    failed_stages = []
+    # Satzzerlegung + Index einmal pro Bericht, Auswahl pro Frage
+    passages = PassageSelector(text)
+    # Bezugsdatum für relative Angaben wie "gestern" in Regel-Extraktoren
+    report_date = raw_report.created_at.date() if raw_report.created_at else None
+
+    for q in incident_questions:
+        inc_type = q["incident_type"]
+        question_key = q["question_key"]
+        stage = answer_stage(inc_type, question_key)
+        set_phase(stage)
+
+        incident_obj = type_to_incident.get(inc_type)
+        if incident_obj is None:
+            logger.warning("Keine Incident-Instanz für %s gefunden", inc_type)
+            continue
+
+        if _is_done(stages, stage):
+            answer = stored_answers.get((incident_obj.id, question_key))
+            answers.setdefault(inc_type, {})[question_key] = answer
+            final_prompt += f"\nFrage: {q['label']}\nAntwort: {answer}"
+            continue
+
+        extraction = speculation.take(inc_type, question_key) if speculation else None
+        if extraction is None:
+            extraction = await extract_answer(
+                text, q, model_name=model_name, base_url=base_url,
+                passages=passages, reference_date=report_date,
+            )
+
+        answers.setdefault(inc_type, {})[question_key] = extraction.answer
+        final_prompt += f"\nFrage: {q['label']}\nAntwort: {extraction.answer}"
+
+        # LLM run + Antwort + Stufe gemeinsam committen (Checkpoint)
+        persist_extraction(
+            db,
+            extraction,
+            model_name=model_name,
+            report_id=raw_report.id,
+            incident_id=incident_obj.id,
+            upsert=resumed,
+        )
+        if extraction.error:
+            failed_stages.append(stage)
+            mark_stage(db, raw_report.id, stage, "failed", error=extraction.raw.get("error"))
+        else:
+            mark_stage(db, raw_report.id, stage, "done")
+        db.commit()
+
+    # Embedding für Ähnlichkeitssuche im Hintergrund berechnen (einmal pro Bericht)
+    if not _is_done(stages, STAGE_CLASSIFY):
+        enqueue_report_embedding(raw_report.id)
+
+    # -----------------------------------------------------------------------
+    # 3) Formalen Bericht generieren
+    # -----------------------------------------------------------------------
+    set_phase(STAGE_FINAL_REPORT)
+    primary_incident = incident_rows[0] if incident_rows else None
+
+    if _is_done(stages, STAGE_FINAL_REPORT) and not failed_stages and primary_incident:
+        latest = (
+            db.query(FinalReport)
+            .filter(FinalReport.incident_id == primary_incident.id)
+            .order_by(FinalReport.version.desc())
+            .first()
+        )
+        final_report_text = latest.body_md if latest else ""
+    elif failed_stages:
+        # Bericht erst schreiben, wenn alle Antworten vorliegen
+        final_report_text = REPORT_ERROR_TEXT
+    else:
+        final_report_text = await _write_final_report(
+            db, raw_report, text, answers, primary_incident, model_name=model_name, base_url=base_url
+        )
+        if final_report_text == REPORT_ERROR_TEXT:
+            failed_stages.append(STAGE_FINAL_REPORT)
+
+    return {
+        "status": "partial" if failed_stages else "ok",
+        "result": classified["result"],
+        "final_report": final_report_text,
+        "prompt": final_prompt,
+        "model": model_name,
+        "chars_in": len(text),
+        "raw_report_id": str(raw_report.id),
+        "incident_ids": [str(i.id) for i in incident_rows],
+        "matched_incident_types": matched_incidents,
+        "answers": answers,
+        "speculation": speculation_summary,
+        "resumed": resumed,
+        "failed_stages": failed_stages,
+    }
+
+
+async def _write_final_report(
+    db: Session,
+    raw_report: RawReport,
+    text: str,
+    answers: dict,
+    primary_incident: Optional[Incident],
+    *,
+    model_name: str,
+    base_url: str,
+) -> str:
+    logger.info("Generiere formalen Abschlussbericht...")
+    try:
+        final_report_text = await generate_final_report(
+            db,
+            report_id=raw_report.id,
+            text=text,
+            answers=answers,
+            primary_incident=primary_incident,
+            model_name=model_name,
+            base_url=base_url,
+        )
+    except Exception as e:
+        logger.error("Fehler bei der Berichts-Generierung: %r", e)
+        db.rollback()
+        mark_stage(db, raw_report.id, STAGE_FINAL_REPORT, "failed", error=repr(e))
+        db.commit()
+        return REPORT_ERROR_TEXT
+
+    mark_stage(db, raw_report.id, STAGE_FINAL_REPORT, "done")
+    db.commit()
+    logger.info("Final Report gespeichert für %s", raw_report.id)
+    return final_report_text
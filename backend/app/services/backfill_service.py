@@ -0,0 +1,366 @@
+# app/services/backfill_service.py
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Optional
+
+import sqlalchemy as sa
+
+from app.db.session import engine, SessionLocal
+from app.services.ollama_client import get_base_url, get_model_name
+from app.services.extraction_service import extract_answer, persist_extraction, ExtractionResult
+from app.services.passage_service import PassageSelector
+from app.services.llm_scheduler import llm_context
+from app.services.config_cache import config_cache
+from app.services.report_summary_service import refresh_summary
+
+logger = logging.getLogger(__name__)
+
+# Gleichzeitige LLM-Aufrufe pro Job (Ollama soll für Live-Analysen frei bleiben)
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "2"))
+# Incidents pro Seite; nach jeder Seite wird der Fortschritt gespeichert
+BACKFILL_PAGE_SIZE = int(os.getenv("BACKFILL_PAGE_SIZE", "25"))
+# Ohne Checkpoint so lange gilt ein laufender Job als verwaist (Worker abgestürzt)
+BACKFILL_STALE_S = int(os.getenv("BACKFILL_STALE_S", "900"))
+
+ACTIVE_STATUSES = ("pending", "running")
+
+# Laufende Jobs dieses Prozesses; wer einen Job ausführt, steht in backfill_jobs.runner
+_tasks: dict[uuid.UUID, asyncio.Task] = {}
+RUNNER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+_JOB_COLUMNS = """
+    id, incident_type, question_key, overwrite, status, runner, total, processed, failed,
+    cursor_created_at, cursor_incident_id, error, created_at, updated_at, finished_at
+"""
+
+# Incidents des Typs ohne Antwort auf die Frage (bzw. alle bei overwrite),
+# nach dem Cursor in stabiler Reihenfolge
+_TARGET_FILTER = """
+    FROM incidents i
+    JOIN raw_reports r ON r.id = i.report_id
+    WHERE i.incident_type = :incident_type
+      AND (:overwrite OR NOT EXISTS (
+            SELECT 1 FROM structured_answers a
+            WHERE a.incident_id = i.id AND a.question_key = :question_key
+      ))
+"""
+
+
+def _job_dict(row) -> dict:
+    job = dict(row)
+    done = job["processed"] + job["failed"]
+    job["progress"] = round(done / job["total"], 3) if job["total"] else 1.0
+    return job
+
+
+def get_job(job_id: uuid.UUID) -> Optional[dict]:
+    with engine.connect() as conn:
+        row = conn.execute(
+            sa.text(f"SELECT {_JOB_COLUMNS} FROM backfill_jobs WHERE id = :id"), {"id": job_id}
+        ).mappings().first()
+    return _job_dict(row) if row else None
+
+
+def list_jobs(limit: int = 50) -> list[dict]:
+    with engine.connect() as conn:
+        rows = conn.execute(
+            sa.text(f"SELECT {_JOB_COLUMNS} FROM backfill_jobs ORDER BY created_at DESC LIMIT :limit"),
+            {"limit": limit},
+        ).mappings().all()
+    return [_job_dict(r) for r in rows]
+
+
+def _update_job(job_id: uuid.UUID, *, finished: bool = False, owned: bool = False, **fields) -> bool:
+    """
+    owned=True: nur solange dieser Prozess den Job laufen hat. False heißt dann,
+    dass der Job inzwischen abgebrochen oder übernommen wurde.
+    """
+    assignments = "".join(f"{k} = :{k}, " for k in fields)
+    if finished:
+        assignments += "finished_at = now(), "
+    guard = " AND status = 'running' AND runner = :runner" if owned else ""
+    with engine.begin() as conn:
+        result = conn.execute(
+            sa.text(f"UPDATE backfill_jobs SET {assignments}updated_at = now() WHERE id = :id{guard}"),
+            {"id": job_id, "runner": RUNNER_ID, **fields},
+        )
+    return result.rowcount > 0
+
+
+def _claim_job(job_id: uuid.UUID) -> Optional[dict]:
+    """Atomar pending -> running; nur ein Worker bekommt den Job."""
+    with engine.begin() as conn:
+        row = conn.execute(sa.text(f"""
+            UPDATE backfill_jobs SET status = 'running', runner = :runner, updated_at = now()
+            WHERE id = :id AND status = 'pending'
+            RETURNING {_JOB_COLUMNS}
+        """), {"id": job_id, "runner": RUNNER_ID}).mappings().first()
+    return dict(row) if row else None
+
+
+def _load_page(job: dict) -> list[dict]:
+    query = sa.text(f"""
+        SELECT i.id AS incident_id, i.report_id, i.created_at, r.body, r.created_at AS report_created_at
+        {_TARGET_FILTER}
+          AND (CAST(:cursor_created_at AS timestamptz) IS NULL
+               OR (i.created_at, i.id) > (CAST(:cursor_created_at AS timestamptz), CAST(:cursor_id AS uuid)))
+        ORDER BY i.created_at, i.id
+        LIMIT :limit
+    """)
+    with engine.connect() as conn:
+        return [dict(r) for r in conn.execute(query, {
+            "incident_type": job["incident_type"],
+            "question_key": job["question_key"],
+            "overwrite": job["overwrite"],
+            "cursor_created_at": job["cursor_created_at"],
+            "cursor_id": job["cursor_incident_id"],
+            "limit": BACKFILL_PAGE_SIZE,
+        }).mappings()]
+
+
+# ---------------------------------------------------------------------------
+# Job anlegen / fortsetzen / abbrechen
+# ---------------------------------------------------------------------------
+
+def _create_job(incident_type: str, question_key: str, overwrite: bool) -> uuid.UUID:
+    with engine.begin() as conn:
+        # Gleichzeitiges Anlegen derselben Frage aus mehreren Workern serialisieren
+        conn.execute(
+            sa.text("SELECT pg_advisory_xact_lock(hashtext('backfill:' || :incident_type || '/' || :question_key))"),
+            {"incident_type": incident_type, "question_key": question_key},
+        )
+        existing = conn.execute(sa.text("""
+            SELECT id FROM backfill_jobs
+            WHERE incident_type = :incident_type AND question_key = :question_key
+              AND status = ANY(:active)
+            ORDER BY created_at DESC LIMIT 1
+        """), {"incident_type": incident_type, "question_key": question_key,
+               "active": list(ACTIVE_STATUSES)}).scalar()
+
+        if existing is None:
+            params = {"incident_type": incident_type, "question_key": question_key, "overwrite": overwrite}
+            total = conn.execute(sa.text(f"SELECT count(*) {_TARGET_FILTER}"), params).scalar()
+            existing = conn.execute(sa.text("""
+                INSERT INTO backfill_jobs (incident_type, question_key, overwrite, total)
+                VALUES (:incident_type, :question_key, :overwrite, :total)
+                RETURNING id
+            """), {**params, "total": total}).scalar()
+            logger.info("Backfill-Job %s angelegt: %s/%s (%d Incidents)", existing, incident_type, question_key, total)
+    return existing
+
+
+def _load_question_key(question_id: uuid.UUID) -> Optional[tuple[str, str]]:
+    with engine.connect() as conn:
+        row = conn.execute(
+            sa.text("SELECT incident_type, question_key FROM incident_questions WHERE id = :id"),
+            {"id": question_id},
+        ).first()
+    return (row.incident_type, row.question_key) if row else None
+
+
+def _reset_job(job_id: uuid.UUID) -> Optional[uuid.UUID]:
+    with engine.begin() as conn:
+        return conn.execute(sa.text("""
+            UPDATE backfill_jobs SET status = 'pending', runner = NULL, error = NULL, finished_at = NULL,
+                                     updated_at = now()
+            WHERE id = :id
+              AND (status IN ('failed', 'cancelled')
+                   OR (status = 'running' AND updated_at < now() - make_interval(secs => :stale)))
+            RETURNING id
+        """), {"id": job_id, "stale": BACKFILL_STALE_S}).scalar()
+
+
+def _mark_cancelled(job_id: uuid.UUID) -> None:
+    with engine.begin() as conn:
+        conn.execute(sa.text("""
+            UPDATE backfill_jobs SET status = 'cancelled', finished_at = now(), updated_at = now()
+            WHERE id = :id AND status = ANY(:active)
+        """), {"id": job_id, "active": list(ACTIVE_STATUSES)})
+
+
+def _reset_stale_jobs() -> list[uuid.UUID]:
+    """
+    Verwaiste Jobs (running ohne Checkpoint seit BACKFILL_STALE_S) zurück auf
+    pending; liefert diese plus alle noch nicht übernommenen pending-Jobs.
+    """
+    with engine.begin() as conn:
+        conn.execute(sa.text("""
+            UPDATE backfill_jobs SET status = 'pending', runner = NULL, updated_at = now()
+            WHERE status = 'running' AND updated_at < now() - make_interval(secs => :stale)
+        """), {"stale": BACKFILL_STALE_S})
+        return list(conn.execute(sa.text(
+            "SELECT id FROM backfill_jobs WHERE status = 'pending' ORDER BY created_at"
+        )).scalars())
+
+
+# Alle Einstiegspunkte sind async: DB-Zugriffe laufen per to_thread, damit der
+# Event-Loop frei bleibt; _spawn braucht den laufenden Loop.
+
+async def start_backfill(incident_type: str, question_key: str, *, overwrite: bool = False) -> dict:
+    """
+    Legt einen Backfill-Job für eine Frage an und startet ihn im laufenden
+    Event-Loop. Läuft für die Frage schon ein Job, wird dieser zurückgegeben.
+    """
+    job_id = await asyncio.to_thread(_create_job, incident_type, question_key, overwrite)
+    _spawn(job_id)
+    return await asyncio.to_thread(get_job, job_id)
+
+
+async def start_question_backfill(question_id: uuid.UUID, *, overwrite: bool = False) -> Optional[dict]:
+    """Wie start_backfill, aber über die ID der Frage; None, wenn es sie nicht gibt."""
+    key = await asyncio.to_thread(_load_question_key, question_id)
+    if key is None:
+        return None
+    return await start_backfill(*key, overwrite=overwrite)
+
+
+async def resume_backfill(job_id: uuid.UUID) -> Optional[dict]:
+    """
+    Setzt einen abgebrochenen/fehlgeschlagenen Job am gespeicherten Cursor fort.
+    Ein laufender Job wird nur übernommen, wenn sein Worker seit
+    BACKFILL_STALE_S keinen Checkpoint mehr geschrieben hat.
+    """
+    found = await asyncio.to_thread(_reset_job, job_id)
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        return None
+    if found is not None or job["status"] == "pending":
+        _spawn(job_id)
+    return job
+
+
+async def cancel_backfill(job_id: uuid.UUID) -> Optional[dict]:
+    """
+    Status in der DB setzen; der ausführende Worker (ggf. ein anderer Prozess)
+    bemerkt das beim nächsten Checkpoint und hört auf.
+    """
+    await asyncio.to_thread(_mark_cancelled, job_id)
+    # Läuft er hier, sofort abbrechen statt erst nach der Seite
+    task = _tasks.pop(job_id, None)
+    if task is not None and not task.done():
+        task.cancel()
+    return await asyncio.to_thread(get_job, job_id)
+
+
+async def resume_stale_jobs() -> None:
+    """
+    Beim Start: Jobs, deren Worker abgestürzt ist oder die nie übernommen
+    wurden, wieder anstoßen. _claim_job sorgt dafür, dass bei mehreren
+    Workern nur einer den Job bekommt.
+    """
+    try:
+        job_ids = await asyncio.to_thread(_reset_stale_jobs)
+    except Exception as e:
+        logger.warning("Backfill: verwaiste Jobs nicht geprüft: %r", e)
+        return
+    for job_id in job_ids:
+        logger.info("Backfill-Job %s wird nach Neustart fortgesetzt", job_id)
+        _spawn(job_id)
+
+
+def _spawn(job_id: uuid.UUID) -> None:
+    task = _tasks.get(job_id)
+    if task is not None and not task.done():
+        return
+    _tasks[job_id] = asyncio.get_running_loop().create_task(_run_job(job_id))
+
+
+# ---------------------------------------------------------------------------
+# Ausführung
+# ---------------------------------------------------------------------------
+
+async def _run_job(job_id: uuid.UUID) -> None:
+    # Niedrigere Priorität als Live-Analysen, Fairness pro Job
+    with llm_context("backfill", f"backfill:{job_id}"):
+        await _run_job_steps(job_id)
+
+
+async def _run_job_steps(job_id: uuid.UUID) -> None:
+    job = await asyncio.to_thread(_claim_job, job_id)
+    if job is None:
+        # Läuft schon (anderer Worker) oder ist nicht mehr pending
+        logger.info("Backfill-Job %s nicht übernommen", job_id)
+        return
+    question = config_cache.get().question(job["incident_type"], job["question_key"])
+    if question is None:
+        await asyncio.to_thread(
+            _update_job, job_id, status="failed", error="Frage nicht mehr vorhanden", finished=True, owned=True
+        )
+        return
+
+    model_name = get_model_name()
+    base_url = get_base_url()
+    semaphore = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+
+    async def process(row: dict) -> bool:
+        async with semaphore:
+            result = await extract_answer(
+                row["body"], question,
+                model_name=model_name, base_url=base_url,
+                passages=PassageSelector(row["body"]),
+                reference_date=row["report_created_at"].date(),
+            )
+        if result.error:
+            return False
+        result.meta["backfill_job"] = str(job_id)
+        await asyncio.to_thread(_persist, result, row, model_name, job["overwrite"])
+        return True
+
+    try:
+        while True:
+            page = await asyncio.to_thread(_load_page, job)
+            if not page:
+                break
+
+            results = await asyncio.gather(*(process(r) for r in page), return_exceptions=True)
+            ok = sum(1 for r in results if r is True)
+            for r in results:
+                if isinstance(r, Exception):
+                    logger.warning("Backfill %s: Incident fehlgeschlagen: %r", job_id, r)
+
+            # Checkpoint: Cursor erst nach der ganzen Seite weiterschieben
+            job["processed"] += ok
+            job["failed"] += len(page) - ok
+            job["cursor_created_at"] = page[-1]["created_at"]
+            job["cursor_incident_id"] = page[-1]["incident_id"]
+            still_running = await asyncio.to_thread(
+                _update_job, job_id, owned=True,
+                processed=job["processed"], failed=job["failed"],
+                cursor_created_at=job["cursor_created_at"], cursor_incident_id=job["cursor_incident_id"],
+            )
+            if not still_running:
+                logger.info("Backfill-Job %s abgebrochen oder übernommen, beende Lauf", job_id)
+                return
+
+        if not await asyncio.to_thread(_update_job, job_id, status="done", finished=True, owned=True):
+            return
+        logger.info("Backfill-Job %s fertig: %d beantwortet, %d fehlgeschlagen", job_id, job["processed"], job["failed"])
+    except asyncio.CancelledError:
+        logger.info("Backfill-Job %s abgebrochen", job_id)
+        raise
+    except Exception as e:
+        logger.error("Backfill-Job %s fehlgeschlagen: %r", job_id, e)
+        await asyncio.to_thread(_update_job, job_id, status="failed", error=str(e), finished=True, owned=True)
+    finally:
+        _tasks.pop(job_id, None)
+
+
+def _persist(result: ExtractionResult, row: dict, model_name: str, overwrite: bool) -> None:
+    db = SessionLocal()
+    try:
+        persist_extraction(
+            db,
+            result,
+            model_name=model_name,
+            report_id=row["report_id"],
+            incident_id=row["incident_id"],
+            upsert=overwrite,
+        )
+        refresh_summary(db, row["report_id"])
+        db.commit()
+    finally:
+        db.close()
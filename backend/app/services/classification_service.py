@@ -0,0 +1,83 @@
+# app/services/classification_service.py
+import json
+import logging
+import os
+import re
+from difflib import get_close_matches
+
+from app.models.analyze_model import ClassificationResult
+
+logger = logging.getLogger(__name__)
+
+# Strukturierte Ausgabe über Ollamas `format` (JSON-Schema) – 0 schaltet ab
+CLASSIFY_STRUCTURED_OUTPUT = os.getenv("CLASSIFY_STRUCTURED_OUTPUT", "1") == "1"
+# Die Antwort ist nur eine kurze Liste, mehr Tokens braucht es nicht
+CLASSIFY_NUM_PREDICT = int(os.getenv("CLASSIFY_NUM_PREDICT", "128"))
+
+
+def build_classification_schema(type_names: list[str]) -> dict:
+    """
+    JSON-Schema für die Klassifikation: eine Liste aus den aktuell
+    konfigurierten Typnamen (passt zur 'JSON-Liste' aus classify_rules_prompt).
+    """
+    return {
+        "type": "array",
+        "items": {"type": "string", "enum": sorted(set(type_names))},
+        "uniqueItems": True,
+    }
+
+
+def validate_classification(text: str, type_names: list[str]) -> ClassificationResult:
+    """Strikte Prüfung: JSON-Liste, nur bekannte Namen. Wirft ValueError."""
+    data = json.loads(text)
+    if not isinstance(data, list) or not all(isinstance(x, str) for x in data):
+        raise ValueError("Klassifikation ist keine Liste von Strings")
+
+    allowed = set(type_names)
+    unknown = [x for x in data if x not in allowed]
+    if unknown:
+        raise ValueError(f"Unbekannte Vorfallstypen: {unknown}")
+
+    return ClassificationResult(incident_types=list(dict.fromkeys(data)))
+
+
+def repair_classification(text: str, type_names: list[str]) -> ClassificationResult:
+    """
+    Kleine lokale Reparatur, nur wenn die Validierung scheitert: Liste aus
+    dem Text herauslösen und Namen tolerant (Groß/Klein, Tippfehler) zuordnen.
+    """
+    candidates: list = []
+    match = re.search(r"\[.*?\]", text or "", re.DOTALL)
+    if match:
+        try:
+            candidates = json.loads(match.group(0).replace("'", '"'))
+        except ValueError:
+            candidates = []
+    if not candidates:
+        candidates = [x for x in re.split(r"[,\n;]", (text or "").strip("[]{} \n")) if x.strip()]
+
+    by_lower = {name.lower(): name for name in type_names}
+    result = []
+    for item in candidates:
+        cleaned = str(item).strip().strip("\"'*-. ").lower()
+        if not cleaned or cleaned == "keiner":
+            continue
+        name = by_lower.get(cleaned)
+        if name is None:
+            close = get_close_matches(cleaned, list(by_lower), n=1, cutoff=0.8)
+            name = by_lower[close[0]] if close else None
+        if name is None:
+            logger.warning("Reparatur: unbekannter Vorfalltyp verworfen: %r", item)
+            continue
+        if name not in result:
+            result.append(name)
+
+    return ClassificationResult(incident_types=result, repaired=True)
+
+
+def parse_classification_result(text: str, type_names: list[str]) -> ClassificationResult:
+    try:
+        return validate_classification(text, type_names)
+    except ValueError as e:
+        logger.warning("Klassifikation ungültig (%s), Reparatur aktiv", e)
+        return repair_classification(text, type_names)
@@ -0,0 +1,226 @@
+# app/services/config_cache.py
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import psycopg
+import sqlalchemy as sa
+
+from app.db.session import engine
+from app.services.config_events import CONFIG_CHANNEL, on_config_change
+from app.services.incident_service import load_incident_types
+from app.services.incident_questions import load_incident_questions
+from app.services.load_incident_type_mapping import load_incident_type_mapping
+from app.services.prompts_service import load_prompts, CLASSIFY_PROMPT_NAMES
+from app.services.fewshot_service import fewshot_index
+from app.services.config_snapshot_service import load_snapshot_data
+
+logger = logging.getLogger(__name__)
+
+# LISTEN/NOTIFY-Abo pro Worker (0 = nur Versionsabgleich per Polling)
+CONFIG_LISTEN = os.getenv("CONFIG_LISTEN", "1") == "1"
+# Sicherheitsnetz: Version spätestens nach so vielen Sekunden prüfen
+CONFIG_POLL_S = float(os.getenv("CONFIG_POLL_S", "30"))
+CONFIG_LISTEN_RETRY_S = float(os.getenv("CONFIG_LISTEN_RETRY_S", "5"))
+# Ältere, von Berichten gepinnte Stände im Speicher (Retry)
+CONFIG_PINNED_CACHE = int(os.getenv("CONFIG_PINNED_CACHE", "8"))
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Unveränderlicher Stand von Typen, Prompts und Fragen."""
+    version: int
+    incident_types: list[dict]
+    prompts: dict[str, str]
+    type_mapping: dict[str, str]
+    questions: list[dict]
+    loaded_at: float = field(default_factory=time.time)
+
+    def questions_for(self, types: list[str]) -> list[dict]:
+        wanted = set(types)
+        return [q for q in self.questions if q["incident_type"] in wanted]
+
+    def question(self, incident_type: str, question_key: str) -> Optional[dict]:
+        for q in self.questions:
+            if q["incident_type"] == incident_type and q["question_key"] == question_key:
+                return q
+        return None
+
+
+def snapshot_from_data(version: int, data: dict) -> ConfigSnapshot:
+    """Aus config_snapshots.data, gleiche Form wie die load_*-Funktionen."""
+    types = data.get("incident_types") or []
+    return ConfigSnapshot(
+        version=version,
+        incident_types=[{"code": t["code"], "name": t["name"], "desc": t.get("description") or ""} for t in types],
+        prompts={
+            p["name"]: p["content"] for p in data.get("prompts") or []
+            if p["name"] in CLASSIFY_PROMPT_NAMES and p.get("version_tag") == "v1"
+        },
+        type_mapping={t["name"].strip().lower(): t["code"].strip().lower() for t in types},
+        questions=[
+            {
+                "incident_type": q["incident_type"],
+                "question_key": q["question_key"],
+                "label": q["label"],
+                "answer_type": q["answer_type"],
+                "order_index": q.get("order_index"),
+                "keywords": q.get("keywords") or [],
+            }
+            for q in data.get("questions") or []
+        ],
+    )
+
+
+def _current_version() -> int:
+    try:
+        with engine.connect() as conn:
+            return conn.execute(sa.text("SELECT version FROM config_state")).scalar() or 0
+    except Exception as e:
+        logger.warning("Config-Version nicht lesbar: %r", e)
+        return 0
+
+
+class ConfigCache:
+    """
+    Hält einen Konfigurations-Snapshot pro Prozess. Neu geladen wird nur
+    bei Änderungen (NOTIFY oder höhere Version), der Tausch ist eine
+    einzelne Referenzzuweisung: Leser sehen immer einen vollständigen Stand.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._checked_at = 0.0
+        self._pinned: dict[int, ConfigSnapshot] = {}
+
+    def get(self) -> ConfigSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.reload()
+        # Ohne LISTEN-Verbindung: gelegentlich die Version abgleichen
+        if not _listener_connected.is_set() and time.monotonic() - self._checked_at > CONFIG_POLL_S:
+            self._checked_at = time.monotonic()
+            return self.refresh_if_newer(_current_version())
+        return snapshot
+
+    def reload(self, version: Optional[int] = None) -> ConfigSnapshot:
+        with self._lock:
+            version = _current_version() if version is None else version
+            # Ein Lookup in config_snapshots; ohne Snapshot (Altbestand) aus den Tabellen
+            data = load_snapshot_data(version)
+            if data is not None:
+                snapshot = snapshot_from_data(version, data)
+            else:
+                snapshot = ConfigSnapshot(
+                    version=version,
+                    incident_types=load_incident_types(),
+                    prompts=load_prompts(),
+                    type_mapping=load_incident_type_mapping(),
+                    questions=load_incident_questions(),
+                )
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+        logger.info("Konfiguration geladen (Version %s)", version)
+        return snapshot
+
+    def refresh_if_newer(self, version: int, scope: str = "all") -> ConfigSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and version <= snapshot.version:
+            return snapshot
+        try:
+            snapshot = self.reload(version)
+        except Exception as e:
+            # Alten Stand behalten, beim nächsten Signal erneut versuchen
+            logger.error("Konfiguration konnte nicht neu geladen werden: %r", e)
+            return self._snapshot
+        if scope in ("types", "bulk", "all"):
+            fewshot_index.invalidate()
+        return snapshot
+
+    def for_version(self, version: Optional[int]) -> ConfigSnapshot:
+        """Gepinnter Stand eines Berichts; ältere Versionen per PK aus config_snapshots."""
+        current = self.get()
+        if version is None or version == current.version:
+            return current
+        snapshot = self._pinned.get(version)
+        if snapshot is None:
+            data = load_snapshot_data(version)
+            if data is None:
+                logger.warning("Kein Snapshot für Konfigurationsversion %s, nutze %s", version, current.version)
+                return current
+            snapshot = snapshot_from_data(version, data)
+            if len(self._pinned) >= CONFIG_PINNED_CACHE:
+                self._pinned.pop(next(iter(self._pinned)))
+            self._pinned[version] = snapshot
+        return snapshot
+
+    def info(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "listening": _listener_connected.is_set(),
+            "pid": os.getpid(),
+        }
+
+
+config_cache = ConfigCache()
+on_config_change(lambda version, scope: config_cache.refresh_if_newer(version, scope))
+
+
+# ---------------------------------------------------------------------------
+# LISTEN-Thread pro Worker (wird im FastAPI-Lifespan gestartet)
+# ---------------------------------------------------------------------------
+
+_stop = threading.Event()
+_listener_connected = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+def _listen_loop() -> None:
+    dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    while not _stop.is_set():
+        try:
+            with psycopg.connect(dsn, autocommit=True) as conn:
+                conn.execute(f"LISTEN {CONFIG_CHANNEL}")
+                _listener_connected.set()
+                # Änderungen, die während einer Unterbrechung passiert sind
+                config_cache.refresh_if_newer(_current_version())
+                while not _stop.is_set():
+                    for note in conn.notifies(timeout=1.0):
+                        try:
+                            payload = json.loads(note.payload)
+                        except ValueError:
+                            payload = {}
+                        config_cache.refresh_if_newer(
+                            int(payload.get("version") or _current_version()), payload.get("scope", "all")
+                        )
+        except Exception as e:
+            logger.warning("Config-LISTEN unterbrochen: %r", e)
+        finally:
+            _listener_connected.clear()
+        _stop.wait(CONFIG_LISTEN_RETRY_S)
+
+
+def start_config_listener() -> None:
+    global _thread
+    try:
+        config_cache.reload()
+    except Exception as e:
+        logger.warning("Konfiguration beim Start nicht geladen: %r", e)
+    if not CONFIG_LISTEN or (_thread is not None and _thread.is_alive()):
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_listen_loop, name="config-listener", daemon=True)
+    _thread.start()
+
+
+def stop_config_listener() -> None:
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=3)
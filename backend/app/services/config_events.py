@@ -0,0 +1,56 @@
+# app/services/config_events.py
+import json
+import logging
+from typing import Callable, Optional
+
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Postgres-Kanal für Konfigurationsänderungen (LISTEN/NOTIFY)
+CONFIG_CHANNEL = "sepj_config"
+
+# Prozesslokale Abonnenten, werden nach dem Commit direkt benachrichtigt
+_local_listeners: list[Callable[[int, str], None]] = []
+
+
+def on_config_change(callback: Callable[[int, str], None]) -> None:
+    _local_listeners.append(callback)
+
+
+def notify_config_change(db: Session, scope: str, comment: Optional[str] = None) -> int:
+    """
+    Erhöht die Konfigurationsversion, legt den Snapshot dieser Version an und
+    sendet NOTIFY in derselben Transaktion. Postgres stellt die Nachricht erst
+    beim Commit zu, andere Worker sehen also nie einen Stand vor dem Commit.
+    """
+    # Ausstehende ORM-Änderungen müssen im Snapshot enthalten sein
+    db.flush()
+    version = db.execute(sa.text("""
+        INSERT INTO config_state (id, version) VALUES (TRUE, 1)
+        ON CONFLICT (id) DO UPDATE
+        SET version = config_state.version + 1, updated_at = now()
+        RETURNING version
+    """)).scalar()
+    # Nach der Versionszeile: gleichzeitige Änderungen sind serialisiert, der Snapshot ist vollständig
+    db.execute(
+        sa.text("INSERT INTO config_snapshots (version, scope, comment, data) VALUES (:v, :scope, :comment, config_snapshot_data())"),
+        {"v": version, "scope": scope, "comment": comment},
+    )
+    db.execute(
+        sa.text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": CONFIG_CHANNEL, "payload": json.dumps({"version": version, "scope": scope})},
+    )
+
+    # Eigener Prozess: nicht auf den Umweg über LISTEN warten
+    @event.listens_for(db, "after_commit", once=True)
+    def _after_commit(session):
+        for callback in _local_listeners:
+            try:
+                callback(version, scope)
+            except Exception as e:
+                logger.warning("Config-Listener fehlgeschlagen: %r", e)
+
+    return version
@@ -0,0 +1,139 @@
+# app/services/config_snapshot_service.py
+import logging
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.session import engine
+from app.models.db_models import IncidentType, IncidentQuestion, Prompt
+from app.models.analyze_model import ConfigBundle
+from app.services.config_events import notify_config_change
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigImportError(ValueError):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Lesen (Snapshots sind unveränderlich)
+# ---------------------------------------------------------------------------
+
+def load_snapshot_data(version: int) -> Optional[dict]:
+    with engine.connect() as conn:
+        return conn.execute(
+            sa.text("SELECT data FROM config_snapshots WHERE version = :v"), {"v": version}
+        ).scalar()
+
+
+def export_snapshot(db: Session, version: Optional[int] = None) -> Optional[dict]:
+    """Snapshot im Import-Format; ohne Version der aktuelle Stand."""
+    row = db.execute(sa.text("""
+        SELECT version, scope, comment, created_at, data
+        FROM config_snapshots
+        WHERE version = coalesce(CAST(:v AS bigint), (SELECT version FROM config_state))
+    """), {"v": version}).mappings().first()
+    if row is None:
+        return None
+    return {
+        "version": row["version"],
+        "scope": row["scope"],
+        "comment": row["comment"],
+        "created_at": row["created_at"],
+        **row["data"],
+    }
+
+
+def list_snapshots(db: Session, limit: int = 50) -> list[dict]:
+    rows = db.execute(sa.text("""
+        SELECT version, scope, comment, created_at,
+               jsonb_array_length(data->'incident_types') AS incident_types,
+               jsonb_array_length(data->'questions') AS questions,
+               jsonb_array_length(data->'prompts') AS prompts
+        FROM config_snapshots
+        ORDER BY version DESC
+        LIMIT :limit
+    """), {"limit": limit}).mappings().all()
+    return [dict(r) for r in rows]
+
+
+# ---------------------------------------------------------------------------
+# Bulk-Import: alles in einer Transaktion, genau eine neue Version
+# ---------------------------------------------------------------------------
+
+def _apply_types(db: Session, items, replace: bool) -> int:
+    existing = {t.code: t for t in db.query(IncidentType).all()}
+    for item in items:
+        obj = existing.pop(item.code, None)
+        if obj is None:
+            db.add(IncidentType(**item.dict()))
+        else:
+            obj.name, obj.description, obj.prompt_ref = item.name, item.description, item.prompt_ref
+    if replace:
+        # Fragen entfallender Typen löscht die DB (ON DELETE CASCADE)
+        for obj in existing.values():
+            db.delete(obj)
+    return len(items)
+
+
+def _apply_questions(db: Session, items, replace: bool) -> int:
+    existing = {(q.incident_type, q.question_key): q for q in db.query(IncidentQuestion).all()}
+    for item in items:
+        obj = existing.pop((item.incident_type, item.question_key), None)
+        if obj is None:
+            db.add(IncidentQuestion(**item.dict()))
+        else:
+            for key, value in item.dict().items():
+                setattr(obj, key, value)
+    if replace:
+        for obj in existing.values():
+            db.delete(obj)
+    return len(items)
+
+
+def _apply_prompts(db: Session, items, replace: bool) -> int:
+    # Prompts haben keinen eindeutigen Schlüssel; (name, version_tag) gilt als Identität
+    existing: dict[tuple, list[Prompt]] = {}
+    for p in db.query(Prompt).order_by(Prompt.created_at).all():
+        existing.setdefault((p.name, p.version_tag), []).append(p)
+    for item in items:
+        matches = existing.pop((item.name, item.version_tag), [])
+        if not matches:
+            db.add(Prompt(**item.dict()))
+            continue
+        matches[-1].purpose, matches[-1].content = item.purpose, item.content
+        # Dubletten würden load_prompts zufällig überschreiben
+        for dup in matches[:-1]:
+            db.delete(dup)
+    if replace:
+        for objs in existing.values():
+            for obj in objs:
+                db.delete(obj)
+    return len(items)
+
+
+def import_bundle(db: Session, bundle: ConfigBundle) -> dict:
+    """
+    Wendet Typen, Fragen und Prompts in einer Transaktion an. Laufende
+    Analysen sehen entweder den alten oder den vollständigen neuen Stand.
+    """
+    counts = {}
+    try:
+        # Reihenfolge wegen FK incident_questions -> incident_types
+        if bundle.incident_types is not None:
+            counts["incident_types"] = _apply_types(db, bundle.incident_types, bundle.replace)
+            db.flush()
+        if bundle.questions is not None:
+            counts["questions"] = _apply_questions(db, bundle.questions, bundle.replace)
+        if bundle.prompts is not None:
+            counts["prompts"] = _apply_prompts(db, bundle.prompts, bundle.replace)
+        version = notify_config_change(db, "bulk", comment=bundle.comment)
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise ConfigImportError(str(e.orig).splitlines()[0]) from e
+    logger.info("Konfiguration importiert: Version %s %s", version, counts)
+    return {"version": version, "applied": counts, "replace": bundle.replace}
@@ -0,0 +1,219 @@
+# app/services/embedding_service.py
+import asyncio
+import logging
+import os
+import uuid
+import sqlalchemy as sa
+
+from app.db.session import engine
+from app.services.ollama_client import embed, get_base_url
+from app.services.llm_scheduler import llm_context
+
+logger = logging.getLogger(__name__)
+
+EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+# Muss zur Spalte report_embeddings.embedding vector(N) passen
+EMBED_DIM = int(os.getenv("OLLAMA_EMBED_DIM", "768"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "16"))
+EMBED_BATCH_WAIT_MS = int(os.getenv("EMBED_BATCH_WAIT_MS", "500"))
+# Maximal eingebettete Zeichen pro Bericht (Kontextfenster des Embedding-Modells)
+EMBED_MAX_CHARS = int(os.getenv("EMBED_MAX_CHARS", "8000"))
+# Suchbreite des HNSW-Index (höher = genauer, langsamer)
+EMBED_EF_SEARCH = int(os.getenv("EMBED_EF_SEARCH", "64"))
+
+_queue: asyncio.Queue | None = None
+_worker: asyncio.Task | None = None
+
+
+def _to_vector_literal(values: list[float]) -> str:
+    return "[" + ",".join(f"{v:.7g}" for v in values) + "]"
+
+
+# ---------------------------------------------------------------------------
+# Asynchrone Einbettung beim Ingest (gebündelt)
+# ---------------------------------------------------------------------------
+
+def enqueue_report_embedding(report_id: uuid.UUID) -> None:
+    """
+    Reiht einen Bericht zur Einbettung ein. Der Worker wird beim ersten
+    Aufruf im laufenden Event-Loop gestartet; der Request wartet nie darauf.
+    """
+    global _queue, _worker
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        logger.warning("Kein Event-Loop aktiv, Embedding für %s übersprungen", report_id)
+        return
+
+    if _queue is None:
+        _queue = asyncio.Queue()
+    if _worker is None or _worker.done():
+        _worker = loop.create_task(_embedding_worker(_queue))
+
+    _queue.put_nowait(report_id)
+
+
+async def _embedding_worker(queue: asyncio.Queue) -> None:
+    # Hintergrundarbeit: hinter interaktiven Anfragen einreihen
+    with llm_context("backfill", "embeddings"):
+        await _embedding_loop(queue)
+
+
+async def _embedding_loop(queue: asyncio.Queue) -> None:
+    while True:
+        first = await queue.get()
+        batch = [first]
+
+        # Weitere IDs einsammeln, bis Batch voll oder Wartezeit vorbei
+        deadline = asyncio.get_running_loop().time() + EMBED_BATCH_WAIT_MS / 1000
+        while len(batch) < EMBED_BATCH_SIZE:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            await embed_reports(batch)
+        except Exception as e:
+            logger.error("Embedding-Batch fehlgeschlagen (%d Berichte): %r", len(batch), e)
+        finally:
+            for _ in batch:
+                queue.task_done()
+
+
+async def embed_reports(report_ids: list[uuid.UUID]) -> int:
+    """Bettet die angegebenen Berichte ein und speichert alle Vektoren in einer Transaktion."""
+    if not report_ids:
+        return 0
+
+    rows = await asyncio.to_thread(_load_report_texts, report_ids)
+
+    vectors = []
+    base_url = get_base_url()
+    for report_id, text in rows:
+        try:
+            vector = await embed(EMBED_MODEL, base_url, text[:EMBED_MAX_CHARS])
+        except Exception as e:
+            logger.warning("Embedding für Bericht %s fehlgeschlagen: %r", report_id, e)
+            continue
+        if len(vector) != EMBED_DIM:
+            logger.warning(
+                "Embedding-Dimension %d passt nicht zu OLLAMA_EMBED_DIM=%d", len(vector), EMBED_DIM
+            )
+            continue
+        vectors.append({"report_id": report_id, "model": EMBED_MODEL, "embedding": _to_vector_literal(vector)})
+
+    if vectors:
+        await asyncio.to_thread(_store_embeddings, vectors)
+    logger.info("Embeddings gespeichert: %d/%d", len(vectors), len(report_ids))
+    return len(vectors)
+
+
+def _load_report_texts(report_ids: list[uuid.UUID]) -> list[tuple]:
+    query = sa.text("""
+        SELECT id, coalesce(title, '') || E'\\n' || body AS text
+        FROM raw_reports
+        WHERE id = ANY(:ids)
+    """)
+    with engine.connect() as conn:
+        return [(r[0], r[1]) for r in conn.execute(query, {"ids": list(report_ids)})]
+
+
+def _store_embeddings(vectors: list[dict]) -> None:
+    query = sa.text("""
+        INSERT INTO report_embeddings (report_id, model_name, embedding)
+        VALUES (:report_id, :model, CAST(:embedding AS vector))
+        ON CONFLICT (report_id) DO UPDATE
+        SET model_name = EXCLUDED.model_name, embedding = EXCLUDED.embedding, created_at = now()
+    """)
+    with engine.begin() as conn:
+        conn.execute(query, vectors)
+
+
+async def embed_missing_reports(limit: int = 500) -> int:
+    """Nachträgliche Einbettung aller Berichte ohne Vektor (z.B. Altbestand)."""
+    query = sa.text("""
+        SELECT r.id FROM raw_reports r
+        LEFT JOIN report_embeddings e ON e.report_id = r.id
+        WHERE e.report_id IS NULL
+        ORDER BY r.created_at DESC
+        LIMIT :limit
+    """)
+
+    def _missing():
+        with engine.connect() as conn:
+            return [r[0] for r in conn.execute(query, {"limit": limit})]
+
+    ids = await asyncio.to_thread(_missing)
+    done = 0
+    for i in range(0, len(ids), EMBED_BATCH_SIZE):
+        done += await embed_reports(ids[i:i + EMBED_BATCH_SIZE])
+    return done
+
+
+# ---------------------------------------------------------------------------
+# Ähnlichkeitssuche (Top-k über HNSW-Index, Cosinus-Distanz)
+# ---------------------------------------------------------------------------
+
+def _nearest(conn, vector_literal: str, k: int, exclude_id=None) -> list[dict]:
+    conn.execute(sa.text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+                 {"ef": str(max(EMBED_EF_SEARCH, k))})
+    params = {"vector": vector_literal, "k": k}
+    exclude_sql = ""
+    if exclude_id is not None:
+        params["exclude_id"] = exclude_id
+        exclude_sql = "WHERE e.report_id <> :exclude_id"
+
+    # ORDER BY auf dem Distanz-Operator mit konstantem Vektor -> HNSW-Indexscan
+    query = sa.text(f"""
+        SELECT r.id, r.title, r.created_at, left(r.body, 200) AS preview,
+               e.embedding <=> CAST(:vector AS vector) AS distance,
+               ARRAY(
+                   SELECT DISTINCT i.incident_type FROM incidents i WHERE i.report_id = r.id
+               ) AS incident_types
+        FROM report_embeddings e
+        JOIN raw_reports r ON r.id = e.report_id
+        {exclude_sql}
+        ORDER BY e.embedding <=> CAST(:vector AS vector)
+        LIMIT :k
+    """)
+    rows = conn.execute(query, params).mappings().fetchall()
+    return [
+        {
+            "id": str(r["id"]),
+            "title": r["title"] or "Unbenannter Bericht",
+            "date": r["created_at"],
+            "preview": r["preview"],
+            "similarity": 1.0 - float(r["distance"]),
+            "incident_types": list(r["incident_types"] or []),
+        }
+        for r in rows
+    ]
+
+
+def find_similar_reports(report_id: uuid.UUID, k: int = 5) -> list[dict] | None:
+    """Top-k ähnliche Berichte zu einem bereits eingebetteten Bericht (None = kein Vektor)."""
+    with engine.begin() as conn:
+        vector_literal = conn.execute(
+            sa.text("SELECT embedding::text FROM report_embeddings WHERE report_id = :id"),
+            {"id": report_id},
+        ).scalar()
+        if vector_literal is None:
+            return None
+        return _nearest(conn, vector_literal, k, exclude_id=report_id)
+
+
+async def find_similar_to_text(text: str, k: int = 5) -> list[dict]:
+    """Top-k ähnliche Berichte zu einem neuen Text (z.B. für Few-Shot-Beispiele)."""
+    vector = await embed(EMBED_MODEL, get_base_url(), text[:EMBED_MAX_CHARS])
+    if len(vector) != EMBED_DIM:
+        return []
+
+    def _query():
+        with engine.begin() as conn:
+            return _nearest(conn, _to_vector_literal(vector), k)
+
+    return await asyncio.to_thread(_query)
@@ -0,0 +1,225 @@
+# app/services/export_service.py
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import uuid
+import zipfile
+from typing import Iterator, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.services.report_render import RENDERERS, Block, markdown_blocks
+
+logger = logging.getLogger(__name__)
+
+# Gerenderte Dateien, Name = Inhalts-Hash -> gleicher Stand wird nur einmal gerendert
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "sepj-exports"))
+# Obergrenze des Caches; älteste (zuletzt nicht genutzte) Dateien fliegen zuerst
+EXPORT_CACHE_MAX_MB = int(os.getenv("EXPORT_CACHE_MAX_MB", "500"))
+# Höchstzahl Berichte pro ZIP-Export
+EXPORT_BULK_MAX = int(os.getenv("EXPORT_BULK_MAX", "500"))
+# Bei Änderungen an der Darstellung erhöhen -> alle Cache-Einträge ungültig
+EXPORT_RENDER_VERSION = "1"
+EXPORT_FORMATS = tuple(RENDERERS)
+_CHUNK = 64 * 1024
+
+
+def load_export_data(db: Session, report_id: uuid.UUID) -> Optional[dict]:
+    """Alles, was im Export steht – und damit auch alles, was in den Hash eingeht."""
+    row = db.execute(sa.text("""
+        SELECT r.id, r.title, r.body, r.created_at,
+               f.body_md, f.version, f.model_name, f.created_at AS report_created_at
+        FROM raw_reports r
+        LEFT JOIN LATERAL (
+            SELECT fr.body_md, fr.version, fr.model_name, fr.created_at
+            FROM final_reports fr
+            JOIN incidents i ON i.id = fr.incident_id
+            WHERE i.report_id = r.id
+            ORDER BY fr.version DESC, fr.created_at DESC
+            LIMIT 1
+        ) f ON TRUE
+        WHERE r.id = :report_id
+    """), {"report_id": report_id}).mappings().first()
+    if row is None:
+        return None
+
+    answers = db.execute(sa.text("""
+        SELECT i.incident_type, a.question_key, COALESCE(q.label, a.question_key) AS label,
+               a.value_json->>'answer' AS answer
+        FROM structured_answers a
+        JOIN incidents i ON i.id = a.incident_id
+        LEFT JOIN incident_questions q
+               ON q.incident_type = i.incident_type AND q.question_key = a.question_key
+        WHERE i.report_id = :report_id
+        ORDER BY i.incident_type, q.order_index NULLS LAST, a.question_key
+    """), {"report_id": report_id}).mappings().all()
+
+    return {
+        "report_id": str(row["id"]),
+        "title": row["title"] or "Unbenannter Bericht",
+        "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+        "text": row["body"],
+        "final_report": None if row["version"] is None else {
+            "body": row["body_md"],
+            "version": row["version"],
+            "model_name": row["model_name"],
+            "created_at": row["report_created_at"].isoformat() if row["report_created_at"] else None,
+        },
+        "answers": [dict(a) for a in answers],
+    }
+
+
+def content_hash(data: dict, fmt: str) -> str:
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{EXPORT_RENDER_VERSION}:{fmt}:{payload}".encode("utf-8")).hexdigest()
+
+
+def _final_report_text(body: str) -> str:
+    # Ältere Einträge liegen teils als JSON vor (siehe /api/reports/history)
+    try:
+        parsed = json.loads(body)
+    except (TypeError, ValueError):
+        return body
+    if isinstance(parsed, str):
+        return parsed
+    if isinstance(parsed, dict):
+        return parsed.get("response") or "\n".join(f"- {k}: {v}" for k, v in parsed.items())
+    return body
+
+
+def export_blocks(data: dict) -> Iterator[Block]:
+    yield ("h1", data["title"])
+    if data["created_at"]:
+        yield ("p", f"Erstellt: {data['created_at'][:16].replace('T', ' ')}")
+
+    final = data["final_report"]
+    yield ("h2", "Abschlussbericht" + (f" (Version {final['version']})" if final else ""))
+    if final:
+        yield from markdown_blocks(_final_report_text(final["body"]))
+    else:
+        yield ("p", "Noch kein Abschlussbericht vorhanden.")
+
+    current_type = None
+    for a in data["answers"]:
+        if a["incident_type"] != current_type:
+            current_type = a["incident_type"]
+            yield ("h2", f"Angaben – {current_type}")
+        yield ("kv", (a["label"], a["answer"]))
+
+    yield ("h2", "Ursprünglicher Bericht")
+    for para in (data["text"] or "").split("\n\n"):
+        if para.strip():
+            yield ("p", " ".join(para.split()))
+
+
+def export_filename(data: dict, fmt: str) -> str:
+    safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in data["title"])[:60].strip("_")
+    return f"{safe or 'bericht'}_{data['report_id'][:8]}.{fmt}"
+
+
+# ---------------------------------------------------------------------------
+# Cache auf der Platte
+# ---------------------------------------------------------------------------
+
+def render_cached(data: dict, fmt: str) -> tuple[str, str]:
+    """Pfad zur gerenderten Datei und deren Hash (= ETag); rendert nur bei Cache-Miss."""
+    digest = content_hash(data, fmt)
+    path = os.path.join(EXPORT_CACHE_DIR, f"{digest}.{fmt}")
+    if os.path.exists(path):
+        os.utime(path)  # für die Verdrängung: zuletzt genutzt
+        return path, digest
+
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=EXPORT_CACHE_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            RENDERERS[fmt](export_blocks(data), out)
+        # Atomar: parallele Anfragen sehen nie eine halb geschriebene Datei
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    _prune_cache()
+    return path, digest
+
+
+def _prune_cache() -> None:
+    limit = EXPORT_CACHE_MAX_MB * 1024 * 1024
+    try:
+        entries = [e for e in os.scandir(EXPORT_CACHE_DIR) if e.is_file() and not e.name.endswith(".part")]
+    except FileNotFoundError:
+        return
+    total = sum(e.stat().st_size for e in entries)
+    for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+        if total <= limit:
+            break
+        try:
+            total -= entry.stat().st_size
+            os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+# ---------------------------------------------------------------------------
+# ZIP-Export vieler Berichte (gestreamt)
+# ---------------------------------------------------------------------------
+
+class _ChunkSink:
+    """Schreibziel für ZipFile ohne seek(): sammelt Bytes bis zum nächsten drain()."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(report_ids: list[uuid.UUID], fmt: str) -> Iterator[bytes]:
+    """
+    Synchroner Generator (Starlette führt ihn im Threadpool aus). Es liegt nie
+    mehr als ein 64-KB-Block einer Datei im Speicher; fehlende Berichte werden
+    am Ende in fehlend.txt aufgeführt.
+    """
+    sink = _ChunkSink()
+    missing: list[str] = []
+    names: set[str] = set()
+    db = SessionLocal()
+    try:
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+            for report_id in report_ids:
+                data = load_export_data(db, report_id)
+                # Keine offene Transaktion, während der Client liest
+                db.rollback()
+                if data is None:
+                    missing.append(str(report_id))
+                    continue
+                path, _ = render_cached(data, fmt)
+                name = export_filename(data, fmt)
+                if name in names:
+                    name = f"{data['report_id']}.{fmt}"
+                names.add(name)
+                with open(path, "rb") as src, zf.open(name, "w") as dst:
+                    while chunk := src.read(_CHUNK):
+                        dst.write(chunk)
+                        if out := sink.drain():
+                            yield out
+                if out := sink.drain():
+                    yield out
+            if missing:
+                zf.writestr("fehlend.txt", "\n".join(missing) + "\n")
+        yield sink.drain()
+    finally:
+        db.close()
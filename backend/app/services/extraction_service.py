@@ -0,0 +1,155 @@
+# app/services/extraction_service.py
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Optional
+from sqlalchemy.orm import Session
+
+from app.services.ollama_client import call_ollama_with_meta
+from app.services.prompt_budget import assemble_prompt, BudgetedPrompt
+from app.services.prompts_service import build_question_prompt
+from app.services.persistence_service import (
+    create_llm_run,
+    create_structured_answer,
+    upsert_structured_answer,
+)
+from app.services.passage_service import PassageSelector
+from app.services.extractors import TypedAnswer, extract_typed, normalize_llm_answer
+from app.logging_setup import Payload
+
+logger = logging.getLogger(__name__)
+
+ERROR_ANSWER = "Fehler bei der LLM-Anfrage"
+
+
+@dataclass
+class ExtractionResult:
+    incident_type: str
+    question_key: str
+    question_text: str
+    answer: str
+    raw: dict
+    prompt: Optional[BudgetedPrompt]
+    latency_ms: Optional[int]
+    error: bool = False
+    answer_type: str = "text"
+    # Normalisierter Wert + Herkunft (Regel oder LLM), landet in value_json
+    typed: Optional[TypedAnswer] = None
+    # Zusätzliche Felder für request_json des LLMRun (z.B. speculative=True)
+    meta: dict[str, Any] = field(default_factory=dict)
+
+
+async def extract_answer(
+    text: str,
+    question: dict,
+    *,
+    model_name: str,
+    base_url: str,
+    passages: Optional[PassageSelector] = None,
+    reference_date: Optional[date] = None,
+) -> ExtractionResult:
+    """
+    Beantwortet eine Frage zum Text. Zuerst wird ein regelbasierter
+    Extraktor für den answer_type versucht; nur wenn der nicht sicher ist,
+    geht die Frage ans LLM. Mit `passages` wird nur der relevante
+    Ausschnitt verwendet. Fehler werden im Ergebnis markiert, nicht geworfen.
+    """
+    question_text = question["label"]
+    answer_type = question.get("answer_type") or "text"
+
+    context, passage_meta = text, {"mode": "full"}
+    if passages is not None:
+        context, passage_meta = passages.select(question_text, question.get("keywords"))
+
+    typed = extract_typed(context, question, reference_date)
+    if typed is not None:
+        logger.info("Regel-Antwort für %s (%s): %s", question["question_key"], typed.source, typed.answer)
+        return ExtractionResult(
+            incident_type=question["incident_type"],
+            question_key=question["question_key"],
+            question_text=question_text,
+            answer=typed.answer,
+            raw={"rule": typed.source, "evidence": typed.evidence},
+            prompt=None,
+            latency_ms=0,
+            answer_type=answer_type,
+            typed=typed,
+            meta={"passage": passage_meta},
+        )
+
+    prompt = await assemble_prompt(
+        "extract_answer", lambda t: build_question_prompt(t, question_text), context
+    )
+    logger.info("Generated question prompt for type=%s:\n%s", question["incident_type"], Payload(prompt.prompt))
+
+    try:
+        start_ts = time.time()
+        answer, raw = await call_ollama_with_meta(model_name, base_url, prompt.prompt)
+        latency_ms = int((time.time() - start_ts) * 1000)
+        error = False
+    except Exception as e:
+        logger.error("LLM Fehler bei Frage '%s': %r", question_text, e)
+        answer = ERROR_ANSWER
+        raw = {"error": str(e)}
+        latency_ms = None
+        error = True
+
+    logger.info("Antwort erhalten: %s → %s", question["question_key"], Payload(answer))
+
+    return ExtractionResult(
+        incident_type=question["incident_type"],
+        question_key=question["question_key"],
+        question_text=question_text,
+        answer=answer,
+        raw=raw,
+        prompt=prompt,
+        latency_ms=latency_ms,
+        error=error,
+        answer_type=answer_type,
+        typed=None if error else normalize_llm_answer(answer, question, reference_date),
+        meta={"passage": passage_meta},
+    )
+
+
+def persist_extraction(
+    db: Session,
+    result: ExtractionResult,
+    *,
+    model_name: str,
+    report_id,
+    incident_id,
+    upsert: bool = False,
+) -> None:
+    """
+    Speichert LLMRun und StructuredAnswer zu einem Extraktionsergebnis.
+    Mit `upsert` wird eine vorhandene Antwort ersetzt (Backfill).
+    """
+    if result.prompt is not None:
+        create_llm_run(
+            db,
+            purpose="extract_answer",
+            model_name=model_name,
+            request_payload=result.prompt.request_payload(**result.meta),
+            response_payload=result.raw,
+            report_id=report_id,
+            incident_id=incident_id,
+            latency_ms=result.latency_ms,
+            tokens_prompt_est=result.prompt.tokens_est,
+        )
+
+    value_json = None
+    if result.typed:
+        value_json = result.typed.to_value_json(result.answer_type)
+    elif result.error:
+        # Markiert die Antwort für Retry/Backfill als nicht beantwortet
+        value_json = {"answer": result.answer, "source": "llm", "error": True}
+
+    save_answer = upsert_structured_answer if upsert else create_structured_answer
+    save_answer(
+        db,
+        incident_id=incident_id,
+        question_key=result.question_key,
+        answer_text=result.answer,
+        value_json=value_json,
+    )
@@ -0,0 +1,376 @@
+# app/services/extractors.py
+"""
+Lokale, regelbasierte Extraktoren pro answer_type. Ein Extraktor liefert
+nur dann ein Ergebnis, wenn er sich sicher ist – sonst fragt der Aufrufer
+das LLM. Neue Typen werden über @register_extractor angemeldet.
+"""
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Callable, Optional
+
+RULE_EXTRACTORS = os.getenv("RULE_EXTRACTORS", "1") == "1"
+RULE_MIN_CONFIDENCE = float(os.getenv("RULE_EXTRACTOR_MIN_CONFIDENCE", "0.8"))
+
+
+@dataclass
+class TypedAnswer:
+    answer: str                 # lesbare Antwort (wie bisher value_json["answer"])
+    value: Any                  # normalisierter Wert (ISO-Datum, int, bool, ...)
+    confidence: float
+    source: str                 # z.B. "rule:time" oder "llm"
+    evidence: list[str] = field(default_factory=list)
+
+    def to_value_json(self, answer_type: str) -> dict:
+        return {
+            "answer": self.answer,
+            "value": self.value,
+            "answer_type": answer_type,
+            "source": self.source,
+            "confidence": round(self.confidence, 2),
+            "evidence": self.evidence,
+        }
+
+
+Extractor = Callable[[str, dict, date], Optional[TypedAnswer]]
+EXTRACTORS: dict[str, Extractor] = {}
+
+
+def register_extractor(*answer_types: str):
+    def decorator(fn: Extractor) -> Extractor:
+        for answer_type in answer_types:
+            EXTRACTORS[answer_type] = fn
+        return fn
+    return decorator
+
+
+def get_extractor(answer_type: Optional[str]) -> Optional[Extractor]:
+    return EXTRACTORS.get((answer_type or "").strip().lower())
+
+
+def _unique(values: list) -> list:
+    return list(dict.fromkeys(values))
+
+
+# ---------------------------------------------------------------------------
+# Zahlen
+# ---------------------------------------------------------------------------
+
+NUMBER_WORDS = {
+    "ein": 1, "eine": 1, "einer": 1, "einen": 1, "zwei": 2, "drei": 3, "vier": 4, "fünf": 5,
+    "sechs": 6, "sieben": 7, "acht": 8, "neun": 9, "zehn": 10, "elf": 11, "zwölf": 12,
+}
+_NUMBER_RE = re.compile(
+    r"(?<![\d.:,])(\d+(?:,\d+)?)(?![\d.:]\d)|\b(" + "|".join(NUMBER_WORDS) + r")\b",
+    re.IGNORECASE,
+)
+
+
+def _parse_number(token: str):
+    token = token.lower()
+    if token in NUMBER_WORDS:
+        return NUMBER_WORDS[token]
+    if "," in token:
+        return float(token.replace(",", "."))
+    return int(token)
+
+
+# ---------------------------------------------------------------------------
+# Datum
+# ---------------------------------------------------------------------------
+
+MONTHS = {
+    "januar": 1, "jänner": 1, "februar": 2, "feber": 2, "märz": 3, "april": 4, "mai": 5,
+    "juni": 6, "juli": 7, "august": 8, "september": 9, "oktober": 10, "november": 11, "dezember": 12,
+}
+_DATE_NUMERIC_RE = re.compile(r"\b(\d{1,2})\.(\d{1,2})\.(\d{2,4})?(?!\d)")
+_DATE_WORDS_RE = re.compile(r"\b(\d{1,2})\.\s*(" + "|".join(MONTHS) + r")(?:\s+(\d{4}))?", re.IGNORECASE)
+_RELATIVE_DAYS = {"vorgestern": -2, "gestern": -1, "heute": 0}
+
+
+def _find_dates(text: str, reference: date) -> list[tuple[date, str]]:
+    found = []
+    for m in _DATE_NUMERIC_RE.finditer(text):
+        day, month, year = int(m.group(1)), int(m.group(2)), m.group(3)
+        y = reference.year if not year else (int(year) + 2000 if len(year) == 2 else int(year))
+        try:
+            found.append((date(y, month, day), m.group(0)))
+        except ValueError:
+            continue
+    for m in _DATE_WORDS_RE.finditer(text):
+        y = int(m.group(3)) if m.group(3) else reference.year
+        try:
+            found.append((date(y, MONTHS[m.group(2).lower()], int(m.group(1))), m.group(0)))
+        except ValueError:
+            continue
+    for word, offset in _RELATIVE_DAYS.items():
+        for m in re.finditer(rf"\b{word}\b", text, re.IGNORECASE):
+            found.append((reference + timedelta(days=offset), m.group(0)))
+    return found
+
+
+@register_extractor("date")
+def extract_date(text: str, question: dict, reference: date) -> Optional[TypedAnswer]:
+    found = _find_dates(text, reference)
+    values = _unique([d for d, _ in found])
+    if not values:
+        return None
+    d = values[0]
+    return TypedAnswer(
+        answer=d.strftime("%d.%m.%Y"),
+        value=d.isoformat(),
+        confidence=0.9 if len(values) == 1 else 0.4,
+        source="rule:date",
+        evidence=_unique([e for _, e in found]),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Uhrzeit
+# ---------------------------------------------------------------------------
+
+_TIME_RE = re.compile(r"\b([01]?\d|2[0-3])[:.]([0-5]\d)(?:\s*Uhr)?\b|\b([01]?\d|2[0-3])\s*Uhr\b", re.IGNORECASE)
+
+
+def _find_times(text: str) -> list[tuple[str, str]]:
+    found = []
+    for m in _TIME_RE.finditer(text):
+        # "20.09." ist ein Datum, keine Uhrzeit
+        if m.group(1) and m.group(0)[len(m.group(1))] == "." and "uhr" not in m.group(0).lower():
+            continue
+        if m.group(1):
+            value = f"{int(m.group(1)):02d}:{m.group(2)}"
+        else:
+            value = f"{int(m.group(3)):02d}:00"
+        found.append((value, m.group(0)))
+    return found
+
+
+@register_extractor("time")
+def extract_time(text: str, question: dict, reference: date) -> Optional[TypedAnswer]:
+    found = _find_times(text)
+    values = _unique([v for v, _ in found])
+    if not values:
+        return None
+    return TypedAnswer(
+        answer=f"{values[0]} Uhr",
+        value=values[0],
+        confidence=0.9 if len(values) == 1 else 0.4,
+        source="rule:time",
+        evidence=_unique([e for _, e in found]),
+    )
+
+
+@register_extractor("datetime")
+def extract_datetime(text: str, question: dict, reference: date) -> Optional[TypedAnswer]:
+    d = extract_date(text, question, reference)
+    t = extract_time(text, question, reference)
+    parts = [x for x in (d, t) if x is not None]
+    if not parts:
+        return None
+    answer = ", ".join(x.answer for x in parts)
+    confidence = min(x.confidence for x in parts)
+    if d is None:
+        # Nur Uhrzeit ("gegen 23 Uhr"): Hinweis, das Datum kennt ggf. das LLM
+        confidence = min(confidence, 0.6)
+    elif t is None:
+        confidence -= 0.05
+    return TypedAnswer(
+        answer=answer,
+        value={"date": d.value if d else None, "time": t.value if t else None},
+        confidence=confidence,
+        source="rule:datetime",
+        evidence=[e for x in parts for e in x.evidence],
+    )
+
+
+# ---------------------------------------------------------------------------
+# Zahl / Personenanzahl
+# ---------------------------------------------------------------------------
+
+# Großgeschriebene Wörter der Frage, die nichts über das Gezählte sagen
+_GENERIC_NOUNS = {"wie", "wieviel", "wieviele", "welche", "welcher", "gab", "anzahl", "zahl", "menge", "es"}
+_WORD_RE = re.compile(r"[A-Za-zÄÖÜäöüß]+")
+_IDENTIFIER_BEFORE_RE = re.compile(r"\b[A-ZÄÖÜ][\wäöüß-]*\s*(?:Nr\.\s*)?$")
+
+
+def _question_stems(question: dict) -> set[str]:
+    """Nomen aus Frage-Label und Stichwörtern, auf 6 Zeichen gekürzt (grobe Flexion)."""
+    words = [w for w in _WORD_RE.findall(question.get("label") or "") if w[0].isupper()]
+    words += list(question.get("keywords") or [])
+    return {w.lower()[:6] for w in words if w.lower() not in _GENERIC_NOUNS}
+
+
+def _counts_question_noun(cleaned: str, m: re.Match, stems: set[str]) -> bool:
+    """
+    Zahl direkt (ggf. mit einem Adjektiv) vor einem Nomen der Frage und nicht
+    selbst Bezeichner ("Zelle 12", "Tor 3").
+    """
+    if _IDENTIFIER_BEFORE_RE.search(cleaned[:m.start()]):
+        return False
+    following = _WORD_RE.findall(cleaned[m.end():m.end() + 60])[:2]
+    if following and following[0][0].isupper():
+        return following[0].lower()[:6] in stems
+    return len(following) == 2 and following[1][0].isupper() and following[1].lower()[:6] in stems
+
+
+@register_extractor("number", "integer")
+def extract_number(text: str, question: dict, reference: date) -> Optional[TypedAnswer]:
+    # Datums- und Zeitangaben nicht als Zahl werten
+    cleaned = _TIME_RE.sub(" ", _DATE_NUMERIC_RE.sub(" ", text))
+    stems = _question_stems(question)
+    values, anchored, evidence = [], [], []
+    for m in _NUMBER_RE.finditer(cleaned):
+        token = m.group(1) or m.group(2)
+        # Unbestimmter Artikel ("ein Insasse") ist keine Zahlenangabe
+        if token.lower() in ("ein", "eine", "einer", "einen"):
+            continue
+        values.append(_parse_number(token))
+        if _counts_question_noun(cleaned, m, stems):
+            anchored.append(values[-1])
+        evidence.append(m.group(0))
+    values, anchored = _unique(values), _unique(anchored)
+    if not values:
+        return None
+    if len(anchored) == 1:
+        # Sicher nur, wenn genau eine Zahl beim gefragten Nomen steht
+        value, confidence = anchored[0], 0.85
+    else:
+        value, confidence = values[0], 0.5 if len(values) == 1 else 0.3
+    return TypedAnswer(
+        answer=str(value),
+        value=value,
+        confidence=confidence,
+        source="rule:number",
+        evidence=_unique(evidence),
+    )
+
+
+_PERSON_NOUNS = (
+    r"(?:insass(?:e|en)|person(?:en)?|bedienstete[nr]?|beamt(?:e|en|innen)|häftling(?:e)?|"
+    r"täter(?:n)?|zeug(?:e|en|in|innen)|männer|frauen|mitgefangene[n]?|leute)"
+)
+_PERSON_COUNT_RE = re.compile(
+    r"\b(\d+|" + "|".join(w for w in NUMBER_WORDS if w not in ("einen",)) + r")\s+(?:\w+\s+)?" + _PERSON_NOUNS + r"\b",
+    re.IGNORECASE,
+)
+
+
+@register_extractor("person-count", "person_count", "people_count")
+def extract_person_count(text: str, question: dict, reference: date) -> Optional[TypedAnswer]:
+    found = [(_parse_number(m.group(1)), m.group(0)) for m in _PERSON_COUNT_RE.finditer(text)]
+    values = _unique([v for v, _ in found])
+    if not values:
+        return None
+    return TypedAnswer(
+        answer=str(values[0]),
+        value=values[0],
+        confidence=0.85 if len(values) == 1 else 0.4,
+        source="rule:person-count",
+        evidence=_unique([e for _, e in found]),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Ja/Nein
+# ---------------------------------------------------------------------------
+
+_NEGATIONS = re.compile(r"\b(kein(?:e|en|er)?|nicht|niemand|ohne|nichts)\b", re.IGNORECASE)
+
+
+@register_extractor("boolean", "bool")
+def extract_boolean(text: str, question: dict, reference: date) -> Optional[TypedAnswer]:
+    """
+    Nur mit Stichwort-Hinweisen an der Frage: Satz mit Stichwort gefunden ->
+    ja, mit Verneinung im selben Satz -> nein. Ohne Hinweise entscheidet das LLM.
+    """
+    keywords = [k.lower() for k in question.get("keywords") or []]
+    if not keywords:
+        return None
+
+    verdicts, evidence = [], []
+    for sentence in re.split(r"(?<=[.!?])\s+|\n+", text):
+        lower = sentence.lower()
+        if any(k in lower for k in keywords):
+            verdicts.append(not _NEGATIONS.search(sentence))
+            evidence.append(sentence.strip())
+    verdicts = _unique(verdicts)
+    if len(verdicts) != 1:
+        return None
+    return TypedAnswer(
+        answer="Ja" if verdicts[0] else "Nein",
+        value=verdicts[0],
+        confidence=0.8,
+        source="rule:boolean",
+        evidence=evidence[:3],
+    )
+
+
+# ---------------------------------------------------------------------------
+# Ort
+# ---------------------------------------------------------------------------
+
+_LOCATION_RE = re.compile(
+    r"\b(?:in der|in|im|auf dem|auf der|am|an der|vor dem|vor der|beim|hinter dem|hinter der)\s+"
+    r"((?:[A-ZÄÖÜ][\wäöüß-]+)(?:\s+(?:Nr\.\s*)?\d+[a-z]?)?)"
+)
+# Großgeschriebene Wörter nach Präpositionen, die keine Orte sind
+_NOT_LOCATIONS = {"Streit", "Folge", "Gesicht", "Arm", "Kopf", "Bein", "Finger", "Ruhe", "Versuch", "Zuge"}
+# Sicher ist nur eine Adresse (Straßenzusatz oder Hausnummer); ein einzelnes
+# Nomen ("im Dienst", "im Regen") bleibt ein Hinweis unter RULE_MIN_CONFIDENCE
+_ADDRESS_RE = re.compile(
+    r"(?:stra(?:ß|ss)e|str\.?|gasse|weg|platz|allee|ring|damm|ufer|chaussee|markt)\b|\d",
+    re.IGNORECASE,
+)
+
+
+@register_extractor("location")
+def extract_location(text: str, question: dict, reference: date) -> Optional[TypedAnswer]:
+    found = [m.group(1) for m in _LOCATION_RE.finditer(text) if m.group(1).split()[0] not in _NOT_LOCATIONS]
+    values = _unique(found)
+    if not values:
+        return None
+    if len(values) > 1:
+        confidence = 0.4
+    elif _ADDRESS_RE.search(values[0]):
+        confidence = 0.85
+    else:
+        confidence = 0.6
+    return TypedAnswer(
+        answer=values[0],
+        value=values[0],
+        confidence=confidence,
+        source="rule:location",
+        evidence=values,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Einstiegspunkte
+# ---------------------------------------------------------------------------
+
+def extract_typed(text: str, question: dict, reference: Optional[date] = None) -> Optional[TypedAnswer]:
+    """Regelbasierte Antwort, wenn für den answer_type ein Extraktor existiert und sicher ist."""
+    if not RULE_EXTRACTORS:
+        return None
+    extractor = get_extractor(question.get("answer_type"))
+    if extractor is None:
+        return None
+    typed = extractor(text, question, reference or date.today())
+    if typed is None or typed.confidence < RULE_MIN_CONFIDENCE:
+        return None
+    return typed
+
+
+def normalize_llm_answer(answer: str, question: dict, reference: Optional[date] = None) -> Optional[TypedAnswer]:
+    """Normalisiert eine LLM-Antwort mit demselben Parser (Provenienz bleibt 'llm')."""
+    extractor = get_extractor(question.get("answer_type"))
+    if extractor is None or not answer:
+        return None
+    typed = extractor(answer, question, reference or date.today())
+    if typed is None:
+        return None
+    typed.answer = answer
+    typed.source = "llm"
+    return typed
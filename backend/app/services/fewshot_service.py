@@ -0,0 +1,101 @@
+# app/services/fewshot_service.py
+import asyncio
+import logging
+import os
+import threading
+import time
+import sqlalchemy as sa
+
+from app.db.session import engine
+from app.services.text_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+# Anzahl der jüngsten klassifizierten Berichte im lokalen Index
+FEWSHOT_INDEX_SIZE = int(os.getenv("FEWSHOT_INDEX_SIZE", "2000"))
+FEWSHOT_REFRESH_S = int(os.getenv("FEWSHOT_REFRESH_S", "300"))
+# Beispieltexte werden gekürzt, damit sie billig im Prompt bleiben
+FEWSHOT_EXAMPLE_CHARS = int(os.getenv("FEWSHOT_EXAMPLE_CHARS", "300"))
+# "bm25" (lokal, ohne LLM-Aufruf) oder "embedding" (pgvector, 1 Embedding-Aufruf)
+FEWSHOT_RETRIEVER = os.getenv("FEWSHOT_RETRIEVER", "bm25")
+
+
+class FewShotIndex:
+    """
+    Lokaler BM25-Index über bereits klassifizierte Berichte. Wird lazy
+    aufgebaut und nach FEWSHOT_REFRESH_S Sekunden neu geladen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index: BM25Index | None = None
+        self._examples: list[dict] = []
+        self._loaded_at = 0.0
+
+    def is_stale(self) -> bool:
+        return self._index is None or time.monotonic() - self._loaded_at > FEWSHOT_REFRESH_S
+
+    def invalidate(self) -> None:
+        self._loaded_at = 0.0
+
+    def refresh(self) -> None:
+        # Bestätigte Beispiele: Berichte mit erkanntem Typ (nicht 'unknown'/verworfen)
+        query = sa.text("""
+            SELECT left(r.body, :max_chars) AS body,
+                   array_agg(DISTINCT i.incident_type) AS types
+            FROM raw_reports r
+            JOIN incidents i ON i.report_id = r.id
+            WHERE i.incident_type <> 'unknown' AND i.status <> 'rejected'
+            GROUP BY r.id, r.body, r.created_at
+            ORDER BY r.created_at DESC
+            LIMIT :limit
+        """)
+        with self._lock:
+            if not self.is_stale():
+                return
+            with engine.connect() as conn:
+                rows = conn.execute(query, {
+                    "max_chars": FEWSHOT_EXAMPLE_CHARS,
+                    "limit": FEWSHOT_INDEX_SIZE,
+                }).mappings().fetchall()
+
+            examples = [{"text": r["body"], "types": list(r["types"] or [])} for r in rows]
+            self._index = BM25Index([e["text"] for e in examples])
+            self._examples = examples
+            self._loaded_at = time.monotonic()
+            logger.info("Few-Shot-Index geladen: %d Beispiele", len(examples))
+
+    def search(self, text: str, k: int) -> list[dict]:
+        if not self._index or k <= 0:
+            return []
+        return [
+            {**self._examples[i], "score": score}
+            for i, score in self._index.top_k(text, k)
+        ]
+
+
+fewshot_index = FewShotIndex()
+
+
+async def select_examples(text: str, k: int) -> list[dict]:
+    """Liefert bis zu k ähnliche, bereits klassifizierte Beispiele: [{"text", "types"}]."""
+    if k <= 0:
+        return []
+
+    try:
+        if FEWSHOT_RETRIEVER == "embedding":
+            from app.services.embedding_service import find_similar_to_text
+
+            hits = await find_similar_to_text(text, k)
+            return [
+                {"text": h["preview"][:FEWSHOT_EXAMPLE_CHARS], "types": h["incident_types"]}
+                for h in hits
+                if h["incident_types"] and "unknown" not in h["incident_types"]
+            ]
+
+        if fewshot_index.is_stale():
+            await asyncio.to_thread(fewshot_index.refresh)
+        return fewshot_index.search(text, k)
+    except Exception as e:
+        logger.warning("Few-Shot-Auswahl fehlgeschlagen, ohne Beispiele weiter: %r", e)
+        return []
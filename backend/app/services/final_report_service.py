@@ -0,0 +1,310 @@
+# app/services/final_report_service.py
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models.db_models import RawReport, Incident, StructuredAnswer, FinalReport
+from app.services.prompts_service import build_facts_summary, build_writer_prompt
+from app.services.prompt_budget import assemble_prompt
+from app.services.ollama_client import call_ollama, get_base_url, get_model_name
+from app.services.persistence_service import create_llm_run, upsert_structured_answer
+from app.services.report_summary_service import refresh_summary
+
+logger = logging.getLogger(__name__)
+
+# Wartezeit nach der letzten Korrektur, bevor der Bericht neu geschrieben wird
+REPORT_REGEN_DEBOUNCE_S = float(os.getenv("REPORT_REGEN_DEBOUNCE_S", "5"))
+# Wie oft jeder Worker nach fälligen Regenerierungen schaut
+REPORT_REGEN_POLL_S = float(os.getenv("REPORT_REGEN_POLL_S", "1"))
+# Fällige Berichte pro Abfrage (LLM-Aufrufe regelt ohnehin der Scheduler)
+REPORT_REGEN_BATCH = int(os.getenv("REPORT_REGEN_BATCH", "4"))
+# Ohne Abschluss so lange gilt eine übernommene Regenerierung als verwaist
+REPORT_REGEN_STALE_S = int(os.getenv("REPORT_REGEN_STALE_S", "600"))
+
+RUNNER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class FinalReportFailed(Exception):
+    """LLM-Aufruf für den Abschlussbericht fehlgeschlagen (Route: 502)."""
+
+
+# ---------------------------------------------------------------------------
+# Bericht schreiben (Analyse und Regenerierung)
+# ---------------------------------------------------------------------------
+
+def next_version(db: Session, incident_id: uuid.UUID) -> int:
+    """Sperrt den Incident bis zum Commit, damit parallele Regenerierungen nicht dieselbe Version vergeben."""
+    db.query(Incident.id).filter(Incident.id == incident_id).with_for_update().first()
+    current = db.query(sa.func.max(FinalReport.version)).filter(FinalReport.incident_id == incident_id).scalar()
+    return (current or 0) + 1
+
+
+async def generate_final_report(
+    db: Session,
+    *,
+    report_id: uuid.UUID,
+    text: str,
+    answers: dict[str, dict[str, str]],
+    primary_incident: Optional[Incident],
+    model_name: str,
+    base_url: str,
+    reason: str = "analyze",
+) -> str:
+    """
+    Schreibt den formalen Bericht aus Transkript + Antworten und legt ihn als
+    neue Version am primären Incident ab (ohne Commit). LLM-Fehler werden
+    als FinalReportFailed an den Aufrufer weitergereicht.
+    """
+    facts_summary = build_facts_summary(answers)
+    writer = await assemble_prompt(
+        "write_final_report", lambda t: build_writer_prompt(t, facts_summary), text
+    )
+
+    start_ts = time.time()
+    try:
+        final_report_text = await call_ollama(model_name, base_url, writer.prompt)
+    except Exception as e:
+        raise FinalReportFailed(f"Fehler bei LLM-Anfrage (write_final_report): {e!r}") from e
+    latency_ms = int((time.time() - start_ts) * 1000)
+
+    if primary_incident is not None:
+        version = next_version(db, primary_incident.id)
+        db.add(FinalReport(
+            incident_id=primary_incident.id,
+            body_md=final_report_text,
+            model_name=model_name,
+            version=version,
+            created_by=None,
+        ))
+        create_llm_run(
+            db,
+            purpose="write_final_report",
+            model_name=model_name,
+            request_payload=writer.request_payload(reason=reason, version=version),
+            response_payload={"response": final_report_text},
+            report_id=report_id,
+            incident_id=primary_incident.id,
+            latency_ms=latency_ms,
+            tokens_prompt_est=writer.tokens_est,
+        )
+    return final_report_text
+
+
+def load_report_answers(db: Session, report_id: uuid.UUID) -> tuple[list[Incident], dict[str, dict[str, str]]]:
+    """Incidents eines Berichts und deren aktuelle Antworten in Fragen-Reihenfolge."""
+    incidents = db.query(Incident).filter(Incident.report_id == report_id).order_by(Incident.created_at).all()
+    if not incidents:
+        return [], {}
+
+    rows = db.execute(sa.text("""
+        SELECT i.incident_type, a.question_key, a.value_json->>'answer' AS answer
+        FROM structured_answers a
+        JOIN incidents i ON i.id = a.incident_id
+        LEFT JOIN incident_questions q
+               ON q.incident_type = i.incident_type AND q.question_key = a.question_key
+        WHERE i.report_id = :report_id
+        ORDER BY i.incident_type, q.order_index NULLS LAST, a.question_key
+    """), {"report_id": report_id}).mappings().all()
+
+    answers: dict[str, dict[str, str]] = {inc.incident_type: {} for inc in incidents}
+    for r in rows:
+        answers.setdefault(r["incident_type"], {})[r["question_key"]] = r["answer"]
+    return incidents, answers
+
+
+def _primary_incident(db: Session, incidents: list[Incident]) -> Optional[Incident]:
+    """Der Incident, an dem bereits ein Bericht hängt; sonst der erste."""
+    if not incidents:
+        return None
+    with_report = (
+        db.query(FinalReport.incident_id)
+        .filter(FinalReport.incident_id.in_([i.id for i in incidents]))
+        .order_by(FinalReport.version.desc())
+        .first()
+    )
+    if with_report:
+        for inc in incidents:
+            if inc.id == with_report[0]:
+                return inc
+    return incidents[0]
+
+
+async def regenerate_final_report(report_id: uuid.UUID, *, reason: str = "answers_updated") -> Optional[str]:
+    """Schreibt nur den Abschlussbericht neu (keine Klassifikation, keine Fragen)."""
+    db = SessionLocal()
+    try:
+        raw_report = db.query(RawReport).filter(RawReport.id == report_id).first()
+        if raw_report is None:
+            return None
+        incidents, answers = load_report_answers(db, report_id)
+        text = await generate_final_report(
+            db,
+            report_id=report_id,
+            text=raw_report.body,
+            answers=answers,
+            primary_incident=_primary_incident(db, incidents),
+            model_name=get_model_name(),
+            base_url=get_base_url(),
+            reason=reason,
+        )
+        refresh_summary(db, report_id)
+        db.commit()
+        logger.info("Abschlussbericht für %s neu erzeugt (%s)", report_id, reason)
+        return text
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# Manuelle Korrektur + entprellte Regenerierung
+# ---------------------------------------------------------------------------
+
+def update_answer(
+    db: Session, incident: Incident, question_key: str, answer: str, *, regenerate: bool = True
+) -> dict:
+    """
+    Überschreibt eine Antwort manuell; die alte Antwort bleibt als 'previous' erhalten.
+    Mit `regenerate` wird die Neuerzeugung des Berichts in derselben Transaktion vorgemerkt.
+    """
+    existing = (
+        db.query(StructuredAnswer)
+        .filter(StructuredAnswer.incident_id == incident.id, StructuredAnswer.question_key == question_key)
+        .first()
+    )
+    previous = (existing.value_json or {}).get("answer") if existing else None
+    value_json = {
+        "answer": answer,
+        "source": "manual",
+        "previous": previous,
+        "edited_at": datetime.now(timezone.utc).isoformat(),
+    }
+    upsert_structured_answer(
+        db, incident_id=incident.id, question_key=question_key, answer_text=answer, value_json=value_json
+    )
+    refresh_summary(db, incident.report_id)
+    if regenerate:
+        schedule_regeneration(db, incident.report_id)
+    db.commit()
+    return value_json
+
+
+def schedule_regeneration(db: Session, report_id: uuid.UUID) -> float:
+    """
+    Setzt regen_due_at auf jetzt + Entprellung (ohne Commit). Mehrere
+    Korrekturen kurz hintereinander führen so zu nur einem LLM-Aufruf,
+    egal auf welchem Worker sie ankommen.
+    """
+    db.execute(sa.text("""
+        INSERT INTO report_regen (report_id, regen_due_at)
+        VALUES (:report_id, now() + make_interval(secs => :debounce))
+        ON CONFLICT (report_id) DO UPDATE SET regen_due_at = EXCLUDED.regen_due_at
+    """), {"report_id": report_id, "debounce": REPORT_REGEN_DEBOUNCE_S})
+    return REPORT_REGEN_DEBOUNCE_S
+
+
+def is_regeneration_pending(db: Session, report_id: uuid.UUID) -> bool:
+    return db.execute(
+        sa.text("SELECT EXISTS (SELECT 1 FROM report_regen WHERE report_id = :report_id)"),
+        {"report_id": report_id},
+    ).scalar()
+
+
+def _claim_due() -> list[tuple[uuid.UUID, datetime]]:
+    """Fällige, freie (oder verwaiste) Einträge atomar übernehmen; SKIP LOCKED verteilt auf Worker."""
+    db = SessionLocal()
+    try:
+        rows = db.execute(sa.text("""
+            UPDATE report_regen SET runner = :runner, claimed_at = now()
+            WHERE report_id IN (
+                SELECT report_id FROM report_regen
+                WHERE regen_due_at <= now()
+                  AND (runner IS NULL OR claimed_at < now() - make_interval(secs => :stale))
+                ORDER BY regen_due_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING report_id, regen_due_at
+        """), {"runner": RUNNER_ID, "stale": REPORT_REGEN_STALE_S, "limit": REPORT_REGEN_BATCH}).all()
+        db.commit()
+        return [(r.report_id, r.regen_due_at) for r in rows]
+    finally:
+        db.close()
+
+
+def _release(report_id: uuid.UUID, due_at: datetime) -> None:
+    """
+    Erledigt: Eintrag löschen. Kam während des Laufs eine Korrektur dazu
+    (regen_due_at verschoben), nur freigeben, damit danach erneut regeneriert wird.
+    """
+    db = SessionLocal()
+    try:
+        params = {"report_id": report_id, "runner": RUNNER_ID, "due_at": due_at}
+        deleted = db.execute(sa.text("""
+            DELETE FROM report_regen
+            WHERE report_id = :report_id AND runner = :runner AND regen_due_at = :due_at
+        """), params).rowcount
+        if not deleted:
+            db.execute(sa.text("""
+                UPDATE report_regen SET runner = NULL, claimed_at = NULL
+                WHERE report_id = :report_id AND runner = :runner
+            """), params)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _regenerate_claimed(report_id: uuid.UUID, due_at: datetime) -> None:
+    try:
+        await regenerate_final_report(report_id)
+    except Exception as e:
+        logger.error("Regenerierung des Berichts %s fehlgeschlagen: %r", report_id, e)
+    finally:
+        try:
+            await asyncio.to_thread(_release, report_id, due_at)
+        except Exception as e:
+            # Bleibt übernommen; nach REPORT_REGEN_STALE_S holt ihn ein Worker erneut
+            logger.warning("Regenerierung %s nicht freigegeben: %r", report_id, e)
+
+
+_running: dict[uuid.UUID, asyncio.Task] = {}
+
+
+async def regeneration_loop() -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(REPORT_REGEN_POLL_S)
+        try:
+            due = await asyncio.to_thread(_claim_due)
+        except Exception as e:
+            logger.warning("Fällige Regenerierungen nicht abgefragt: %r", e)
+            continue
+        for report_id, due_at in due:
+            task = loop.create_task(_regenerate_claimed(report_id, due_at))
+            _running[report_id] = task
+            task.add_done_callback(lambda _, rid=report_id: _running.pop(rid, None))
+
+
+_task: Optional[asyncio.Task] = None
+
+
+def start_regeneration_worker() -> None:
+    global _task
+    _task = asyncio.get_running_loop().create_task(regeneration_loop())
+
+
+async def stop_regeneration_worker() -> None:
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except (asyncio.CancelledError, Exception):
+            pass
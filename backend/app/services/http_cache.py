@@ -0,0 +1,91 @@
+# app/services/http_cache.py
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import sqlalchemy as sa
+from fastapi import HTTPException, Request, Response
+from sqlalchemy.orm import Session
+
+# Überlappung beim Delta-Sync: Transaktionen, die vor dem Cursor begonnen,
+# aber erst danach committet haben, werden so nicht verpasst (Client dedupliziert per id)
+HISTORY_CURSOR_SKEW_S = float(os.getenv("HISTORY_CURSOR_SKEW_S", "5"))
+
+CURSOR_HEADER = "X-History-Cursor"
+# "true", solange ein Delta-Sync mehr Änderungen hat als ?limit (sofort mit dem Cursor weiterholen)
+HAS_MORE_HEADER = "X-History-Has-More"
+# Clients sollen immer revalidieren, dürfen aber die Antwort behalten
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Schwacher Vergleich: W/-Präfix ignorieren
+    wanted = etag.removeprefix("W/")
+    return any(t.strip().removeprefix("W/") == wanted for t in header.split(","))
+
+
+def not_modified(etag: str, extra_headers: Optional[dict] = None) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL, **(extra_headers or {})})
+
+
+def set_cache_headers(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+
+# ---------------------------------------------------------------------------
+# Versionen
+# ---------------------------------------------------------------------------
+
+def config_version(db: Session) -> int:
+    """Aktuelle Konfigurationsversion (wird von notify_config_change hochgezählt)."""
+    return db.execute(sa.text("SELECT version FROM config_state")).scalar() or 0
+
+
+def history_fingerprint(db: Session) -> tuple:
+    """
+    Nur report_summaries: max(updated_at) über idx_report_summaries_updated_id plus
+    history_state.version, das refresh_summary/add_summary_stub und Löschungen
+    (Trigger) erhöhen. Eine Zeile per PK, ein Index-Lookup.
+    """
+    row = db.execute(sa.text("""
+        SELECT (SELECT version FROM history_state),
+               (SELECT max(updated_at) FROM report_summaries),
+               now()
+    """)).one()
+    return tuple(row[:2]), row[2]
+
+
+_CURSOR_TS_FORMAT = "%Y%m%dT%H%M%S.%fZ"
+
+
+def encode_cursor(ts: datetime, report_id: Optional[uuid.UUID] = None) -> str:
+    """
+    Ohne report_id: Sync-Zeitpunkt (beim Lesen mit HISTORY_CURSOR_SKEW_S Überlappung).
+    Mit report_id: exakte Fortsetzung nach (updated_at, report_id) beim Blättern.
+    """
+    value = ts.astimezone(timezone.utc).strftime(_CURSOR_TS_FORMAT)
+    return f"{value}~{report_id}" if report_id is not None else value
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, Optional[uuid.UUID]]:
+    value, _, report_id = cursor.partition("~")
+    try:
+        ts = datetime.strptime(value, _CURSOR_TS_FORMAT).replace(tzinfo=timezone.utc)
+        if report_id:
+            return ts, uuid.UUID(report_id)
+    except ValueError:
+        raise HTTPException(400, "Ungültiger Cursor")
+    return ts - timedelta(seconds=HISTORY_CURSOR_SKEW_S), None
@@ -8,6 +8,7 @@ import uuid
 # Imports für CRUD
 from app.models.db_models import IncidentQuestion
 from app.models.analyze_model import QuestionBase, QuestionUpdate
+from app.services.config_events import notify_config_change
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +20,7 @@ def load_incident_questions():
     try:
         with engine.connect() as conn:
             rows = conn.execute(sa.text(
-                "SELECT incident_type, question_key, label, answer_type, order_index FROM incident_questions ORDER BY incident_type, order_index"
+                "SELECT incident_type, question_key, label, answer_type, order_index, keywords FROM incident_questions ORDER BY incident_type, order_index"
             )).fetchall()
 
         # Achtung: im Original hattest du einmal "questions_key" und einmal "question_key". 
@@ -31,6 +32,7 @@ def load_incident_questions():
                 "label": r[2],
                 "answer_type": r[3],
                 "order_index": r[4],
+                "keywords": r[5] or [],
             }
             for r in rows
         ]
@@ -45,7 +47,7 @@ def load_incident_questions_for_types(types: list[str]):
 
     # Mapping verwenden, damit Column-Namen stimmen
     query = sa.text("""
-        SELECT incident_type, question_key, label, answer_type, order_index
+        SELECT incident_type, question_key, label, answer_type, order_index, keywords
         FROM incident_questions
         WHERE incident_type = ANY(:types)
         ORDER BY incident_type, order_index
@@ -62,6 +64,7 @@ def load_incident_questions_for_types(types: list[str]):
             "label": r["label"],
             "answer_type": r["answer_type"],
             "order_index": r["order_index"],
+            "keywords": r["keywords"] or [],
         }
         for r in rows
     ]
@@ -76,6 +79,7 @@ def get_all_questions(db: Session):
 def create_question(db: Session, data: QuestionBase):
     obj = IncidentQuestion(**data.dict())
     db.add(obj)
+    notify_config_change(db, "questions")
     db.commit()
     db.refresh(obj)
     return obj
@@ -87,6 +91,7 @@ def update_question(db: Session, q_id: uuid.UUID, data: QuestionUpdate):
         update_data = data.dict(exclude_unset=True)
         for key, val in update_data.items():
             setattr(obj, key, val)
+        notify_config_change(db, "questions")
         db.commit()
         db.refresh(obj)
     return obj
@@ -95,6 +100,7 @@ def delete_question(db: Session, q_id: uuid.UUID):
     obj = db.query(IncidentQuestion).filter(IncidentQuestion.id == q_id).first()
     if obj:
         db.delete(obj)
+        notify_config_change(db, "questions")
         db.commit()
         return True
     return False
\ No newline at end of file
@@ -7,6 +7,7 @@ from app.db.session import engine
 # Imports für CRUD
 from app.models.db_models import IncidentType
 from app.models.analyze_model import IncidentTypeCreate, IncidentTypeUpdate
+from app.services.config_events import notify_config_change
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +49,7 @@ def create_type(db: Session, data: IncidentTypeCreate):
     
     obj = IncidentType(**data.dict())
     db.add(obj)
+    notify_config_change(db, "types")
     db.commit()
     db.refresh(obj)
     return obj
@@ -62,6 +64,7 @@ def update_type(db: Session, code: str, data: IncidentTypeUpdate):
         if data.prompt_ref is not None: 
             obj.prompt_ref = data.prompt_ref
         
+        notify_config_change(db, "types")
         db.commit()
         db.refresh(obj)
     return obj
@@ -70,6 +73,7 @@ def delete_type(db: Session, code: str):
     obj = db.query(IncidentType).filter(IncidentType.code == code).first()
     if obj:
         db.delete(obj)
+        notify_config_change(db, "types")
         db.commit()
         return True
     return False
\ No newline at end of file
@@ -0,0 +1,79 @@
+# app/services/llm_replay.py
+#
+# LLM_BACKEND=replay: /api/generate-Aufrufe werden aus llm_runs (per Prompt-Hash)
+# beantwortet. Embeddings (ollama_client.embed) werden nicht aufgezeichnet und
+# gehen auch im Replay-Modus an OLLAMA_BASE_URL; für Lasttests ohne Ollama die
+# Embedding-Queue leer lassen bzw. LLM_BACKEND=stub verwenden.
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from typing import Optional
+
+import sqlalchemy as sa
+
+from app.db.session import engine
+
+logger = logging.getLogger(__name__)
+
+# Verhalten bei fehlender Aufzeichnung: "error" (Standard, ein Replay ruft nie echt auf)
+# oder "fallthrough" (an OLLAMA_BASE_URL bzw. Stub)
+LLM_REPLAY_MISS = os.getenv("LLM_REPLAY_MISS", "error")
+# Künstliche Antwortzeit pro Replay (0 = sofort), um Wartezeiten im Scheduler nachzustellen
+LLM_REPLAY_LATENCY_MS = int(os.getenv("LLM_REPLAY_LATENCY_MS", "0"))
+# Zwischengespeicherte Prompts pro Prozess (LRU), danach wieder aus llm_runs
+LLM_REPLAY_CACHE_SIZE = int(os.getenv("LLM_REPLAY_CACHE_SIZE", "1000"))
+
+# Prompt-Hash -> aufgezeichnete Ollama-Antwort (None = bekannt fehlend)
+_cache: OrderedDict[str, Optional[dict]] = OrderedDict()
+_stats = {"hits": 0, "misses": 0}
+
+
+class ReplayMiss(RuntimeError):
+    pass
+
+
+def prompt_hash(prompt: Optional[str]) -> Optional[str]:
+    if prompt is None:
+        return None
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def _load(digest: str) -> Optional[dict]:
+    with engine.connect() as conn:
+        return conn.execute(sa.text("""
+            SELECT response_json
+            FROM llm_runs
+            WHERE prompt_hash = :digest AND response_json IS NOT NULL
+              AND NOT (response_json ? 'error')
+            ORDER BY created_at DESC
+            LIMIT 1
+        """), {"digest": digest}).scalar()
+
+
+async def lookup(prompt: str) -> Optional[dict]:
+    """Jüngste aufgezeichnete Antwort zu genau diesem Prompt oder None."""
+    digest = prompt_hash(prompt)
+    if digest in _cache:
+        _cache.move_to_end(digest)
+        recorded = _cache[digest]
+    else:
+        recorded = await asyncio.to_thread(_load, digest)
+        _cache[digest] = recorded
+        while len(_cache) > LLM_REPLAY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    if recorded is None:
+        _stats["misses"] += 1
+        if LLM_REPLAY_MISS == "error":
+            raise ReplayMiss(f"Keine Aufzeichnung für Prompt {digest[:12]}")
+        logger.info("Replay: keine Aufzeichnung für %s, frage Backend", digest[:12])
+        return None
+    _stats["hits"] += 1
+    if LLM_REPLAY_LATENCY_MS:
+        await asyncio.sleep(LLM_REPLAY_LATENCY_MS / 1000)
+    return recorded
+
+
+def replay_stats() -> dict:
+    return {**_stats, "cached_prompts": len(_cache)}
@@ -0,0 +1,454 @@
+# app/services/llm_scheduler.py
+import asyncio
+import contextvars
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+import psycopg
+
+logger = logging.getLogger(__name__)
+
+# Prioritätsklassen, kleinere Zahl = wird zuerst bedient
+# "speculative": vorgezogene Extraktion während der Klassifikation (speculation_service)
+PRIORITIES = {"interactive": 0, "speculative": 1, "backfill": 2, "evaluation": 3}
+DEFAULT_PRIORITY = "interactive"
+
+# Gleichzeitige Anfragen an Ollama; sollte OLLAMA_NUM_PARALLEL des Servers entsprechen.
+# Gilt über alle Worker-Prozesse hinweg (Advisory-Lock-Slots in Postgres, s. _GlobalSlots)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", os.getenv("OLLAMA_NUM_PARALLEL", "1")))
+# So viele Slots bleiben interaktiven Anfragen vorbehalten (nur sinnvoll bei > 1 Slot;
+# mit globalen Slots mindestens 1, sonst belegt Hintergrundarbeit alle Worker-Slots)
+LLM_RESERVED_INTERACTIVE = int(os.getenv("LLM_RESERVED_INTERACTIVE", "1"))
+# Anzahl Wartezeiten pro Klasse für p50/p95
+LLM_SCHED_WINDOW = int(os.getenv("LLM_SCHED_WINDOW", "500"))
+# Prozessübergreifende Begrenzung; 0 nur bei genau einem Worker sinnvoll
+LLM_GLOBAL_SLOTS = os.getenv("LLM_GLOBAL_SLOTS", "1") == "1"
+# Erneuter Versuch, falls keine Freigabe per NOTIFY ankommt (LISTEN unterbrochen)
+LLM_GLOBAL_POLL_MS = int(os.getenv("LLM_GLOBAL_POLL_MS", "1000"))
+# Ohne Heartbeat so lange gilt ein Eintrag in llm_slot_waiters als verwaist
+LLM_GLOBAL_WAITER_STALE_S = float(os.getenv("LLM_GLOBAL_WAITER_STALE_S", "10"))
+
+# Erster Schlüssel von pg_advisory_lock(int, int); zweiter = Slot-Nummer
+_LOCK_NAMESPACE = 0x4C4C4D  # "LLM"
+# NOTIFY-Kanal für freigewordene Slots
+SLOT_CHANNEL = "sepj_llm_slots"
+RUNNER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default=DEFAULT_PRIORITY)
+_client: contextvars.ContextVar[str] = contextvars.ContextVar("llm_client", default="anonymous")
+
+
+@contextmanager
+def llm_context(priority: str, client: Optional[str] = None):
+    """
+    Setzt Priorität und Client für alle LLM-Aufrufe im aktuellen Kontext.
+    Tasks, die darin erzeugt werden, erben die Werte.
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unbekannte LLM-Priorität: {priority}")
+    p_token = _priority.set(priority)
+    c_token = _client.set(client) if client else None
+    try:
+        yield
+    finally:
+        _priority.reset(p_token)
+        if c_token is not None:
+            _client.reset(c_token)
+
+
+def _percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class _ClassStats:
+    def __init__(self):
+        self.requests = 0
+        self.max_depth = 0
+        self.waits_ms: deque[float] = deque(maxlen=LLM_SCHED_WINDOW)
+
+
+class _GlobalSlots:
+    """
+    Slots 0..n-1 als Postgres-Advisory-Locks, damit n Worker zusammen nicht
+    mehr als n Anfragen an Ollama schicken. Alle Locks eines Prozesses hängen
+    an einer eigenen Verbindung außerhalb des Pools (dazu eine LISTEN-
+    Verbindung), egal wie viele Anfragen laufen oder warten.
+
+    Priorität über Prozesse: wer wartet, trägt seine beste Klasse in
+    llm_slot_waiters ein und nimmt nur dann einen Slot, wenn kein anderer
+    Worker mit höherer Priorität (bzw. gleicher, aber früher) wartet.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.waits = 0
+        self.errors = 0
+        self._conn: Optional[psycopg.Connection] = None
+        self._held: set[int] = set()
+        # Serialisiert alle Zugriffe auf die Slot-Verbindung (to_thread)
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _dsn() -> str:
+        from app.db.session import engine
+        return engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+    def _call(self, fn, *args):
+        with self._lock:
+            if self._conn is None or self._conn.closed:
+                self._conn = psycopg.connect(self._dsn(), autocommit=True)
+            try:
+                return fn(self._conn, *args)
+            except Exception:
+                self._drop()
+                raise
+
+    def _drop(self) -> None:
+        # Mit der Sitzung enden auch ihre Locks; laufende Anfragen zählen dann nur lokal
+        if self._held:
+            logger.warning("Verbindung der LLM-Slots verloren, %d Slot(s) freigegeben", len(self._held))
+        self._held.clear()
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+
+    def _try_acquire(self, conn: psycopg.Connection, level: int, since: datetime, limit: int) -> Optional[int]:
+        ahead = conn.execute("""
+            WITH me AS (
+                INSERT INTO llm_slot_waiters (runner, level, since, updated_at)
+                VALUES (%(runner)s, %(level)s, %(since)s, now())
+                ON CONFLICT (runner) DO UPDATE
+                   SET level = EXCLUDED.level, since = EXCLUDED.since, updated_at = now()
+            )
+            SELECT EXISTS (
+                SELECT 1 FROM llm_slot_waiters
+                WHERE runner <> %(runner)s
+                  AND updated_at > now() - make_interval(secs => %(stale)s)
+                  AND (level, since) < (%(level)s, %(since)s)
+            )
+        """, {"runner": RUNNER_ID, "level": level, "since": since,
+              "stale": LLM_GLOBAL_WAITER_STALE_S}).fetchone()[0]
+        if ahead:
+            return None
+        for slot in range(limit):
+            # Advisory-Locks sind pro Sitzung wiederholbar: eigene Slots überspringen
+            if slot in self._held:
+                continue
+            if conn.execute("SELECT pg_try_advisory_lock(%s, %s)", (_LOCK_NAMESPACE, slot)).fetchone()[0]:
+                self._held.add(slot)
+                return slot
+        return None
+
+    def _release(self, conn: psycopg.Connection, slot: int) -> None:
+        if slot in self._held:
+            conn.execute("SELECT pg_advisory_unlock(%s, %s)", (_LOCK_NAMESPACE, slot))
+            self._held.discard(slot)
+        conn.execute("SELECT pg_notify(%s, '')", (SLOT_CHANNEL,))
+
+    @staticmethod
+    def _clear_waiting(conn: psycopg.Connection) -> None:
+        # Wer hinter uns gewartet hat, darf jetzt zugreifen
+        if conn.execute("DELETE FROM llm_slot_waiters WHERE runner = %s", (RUNNER_ID,)).rowcount:
+            conn.execute("SELECT pg_notify(%s, '')", (SLOT_CHANNEL,))
+
+    def _listen_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(self._dsn(), autocommit=True) as conn:
+                    conn.execute(f"LISTEN {SLOT_CHANNEL}")
+                    while not self._stop.is_set():
+                        for _ in conn.notifies(timeout=1.0):
+                            self._loop.call_soon_threadsafe(self.poke)
+            except Exception as e:
+                logger.warning("LLM-Slot-LISTEN unterbrochen: %r", e)
+            self._stop.wait(LLM_GLOBAL_POLL_MS / 1000)
+
+    def _ensure_listener(self) -> None:
+        if self._listener is not None and self._listener.is_alive():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen_loop, name="llm-slot-listener", daemon=True)
+        self._listener.start()
+
+    # -- async, vom Dispatcher des Schedulers ---------------------------------
+
+    async def try_acquire(self, level: int, since: datetime, limit: int) -> Optional[int]:
+        """Slot-Nummer oder None (alle belegt / andere Worker haben Vorrang). Wirft bei DB-Fehlern."""
+        self._ensure_listener()
+        self._wakeup.clear()
+        return await asyncio.to_thread(self._call, self._try_acquire, level, since, limit)
+
+    async def wait(self) -> None:
+        """Bis zur nächsten Freigabe (NOTIFY) oder höchstens LLM_GLOBAL_POLL_MS."""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), LLM_GLOBAL_POLL_MS / 1000)
+        except asyncio.TimeoutError:
+            pass
+
+    def poke(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def release(self, slot: int) -> None:
+        try:
+            await asyncio.to_thread(self._call, self._release, slot)
+        except Exception as e:
+            logger.warning("LLM-Slot %s nicht freigegeben, Verbindung verworfen: %r", slot, e)
+
+    async def clear_waiting(self) -> None:
+        try:
+            await asyncio.to_thread(self._call, self._clear_waiting)
+        except Exception as e:
+            logger.warning("Warte-Eintrag für LLM-Slots nicht gelöscht: %r", e)
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._lock:
+            if self._conn is not None and not self._conn.closed:
+                try:
+                    self._clear_waiting(self._conn)
+                except Exception:
+                    pass
+            self._drop()
+        if self._listener is not None:
+            self._listener.join(timeout=3)
+
+    def snapshot(self) -> dict:
+        return {"size": self.size, "held": len(self._held), "waits": self.waits, "errors": self.errors}
+
+
+class LLMScheduler:
+    """
+    Vergibt begrenzte Ollama-Slots nach Priorität; innerhalb einer Klasse
+    reihum pro Client (Round Robin), damit ein großer Batch eines Clients
+    andere nicht verdrängt. Mit global_slots wird die Grenze zusätzlich über
+    alle Prozesse durchgesetzt: ein Dispatcher holt zuerst den globalen Slot
+    für die wichtigste wartende Anfrage und belegt erst dann lokale Kapazität.
+    """
+
+    def __init__(self, max_concurrency: int, reserved_interactive: int = 0, *, global_slots: bool = False):
+        self.max_concurrency = max(1, max_concurrency)
+        self.reserved_interactive = min(reserved_interactive, self.max_concurrency - 1)
+        if global_slots and self.max_concurrency > 1 and self.reserved_interactive < 1:
+            # Sonst können Backfills aller Worker zusammen jeden Slot belegen
+            raise ValueError("LLM_GLOBAL_SLOTS braucht LLM_RESERVED_INTERACTIVE >= 1 bei mehr als einem Slot")
+        self.in_flight = 0
+        self._global = _GlobalSlots(self.max_concurrency) if global_slots else None
+        self._dispatcher: Optional[asyncio.Task] = None
+        # Klasse -> Client -> Warteschlange von Futures
+        self._waiting: dict[int, dict[str, deque[asyncio.Future]]] = {p: {} for p in PRIORITIES.values()}
+        # Klasse -> Reihenfolge der Clients für Round Robin
+        self._rotation: dict[int, deque[str]] = {p: deque() for p in PRIORITIES.values()}
+        # Wartebeginn pro Future (Reihenfolge gleicher Klassen über Prozesse)
+        self._since: dict[asyncio.Future, datetime] = {}
+        self._stats = {name: _ClassStats() for name in PRIORITIES}
+
+    # -- Warteschlangen ------------------------------------------------------
+
+    def _depth(self, level: int) -> int:
+        return sum(len(q) for q in self._waiting[level].values())
+
+    def _limit(self, level: int) -> int:
+        if level == PRIORITIES["interactive"]:
+            return self.max_concurrency
+        return self.max_concurrency - self.reserved_interactive
+
+    def _can_start(self, level: int) -> bool:
+        return self.in_flight < self._limit(level)
+
+    def _enqueue(self, level: int, client: str, fut: asyncio.Future) -> None:
+        queues = self._waiting[level]
+        if client not in queues:
+            queues[client] = deque()
+            self._rotation[level].append(client)
+        queues[client].append(fut)
+        self._since[fut] = datetime.now(timezone.utc)
+
+    def _remove(self, level: int, client: str, fut: asyncio.Future) -> None:
+        self._since.pop(fut, None)
+        queue = self._waiting[level].get(client)
+        if queue and fut in queue:
+            queue.remove(fut)
+            if not queue:
+                del self._waiting[level][client]
+                self._rotation[level].remove(client)
+
+    def _peek_waiter(self) -> Optional[tuple[int, asyncio.Future]]:
+        for level in sorted(self._waiting):
+            if self._rotation[level] and self._can_start(level):
+                client = self._rotation[level][0]
+                return level, self._waiting[level][client][0]
+        return None
+
+    def _next_waiter(self) -> Optional[tuple[int, asyncio.Future]]:
+        head = self._peek_waiter()
+        if head is None:
+            return None
+        level = head[0]
+        client = self._rotation[level].popleft()
+        queue = self._waiting[level][client]
+        fut = queue.popleft()
+        if queue:
+            self._rotation[level].append(client)
+        else:
+            del self._waiting[level][client]
+        self._since.pop(fut, None)
+        return level, fut
+
+    def _wake(self) -> None:
+        if self._global is not None:
+            if self._dispatcher is None or self._dispatcher.done():
+                self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+            else:
+                self._global.poke()
+            return
+        while True:
+            head = self._next_waiter()
+            if head is None:
+                return
+            fut = head[1]
+            if fut.done():
+                continue
+            self.in_flight += 1
+            fut.set_result(None)
+
+    async def _dispatch(self) -> None:
+        """
+        Ein Dispatcher pro Prozess: globalen Slot für die wichtigste wartende
+        Anfrage holen, dann erst lokal vergeben. Ohne Wartende wird der
+        Eintrag in llm_slot_waiters gelöscht, damit andere Worker nicht warten.
+        """
+        while True:
+            head = self._peek_waiter()
+            if head is None:
+                await self._global.clear_waiting()
+                if self._peek_waiter() is None:
+                    return
+                continue
+            level, fut = head
+            if fut.done():
+                # Abgebrochen, aber noch nicht aus der Warteschlange entfernt
+                self._next_waiter()
+                continue
+            try:
+                slot = await self._global.try_acquire(level, self._since[fut], self._limit(level))
+            except Exception as e:
+                self._global.errors += 1
+                logger.warning("Globale LLM-Slots nicht verfügbar, nur Grenze pro Prozess: %r", e)
+                self._grant(None)
+                continue
+            if slot is None:
+                self._global.waits += 1
+                await self._global.wait()
+                continue
+            if not self._grant(slot):
+                await self._global.release(slot)
+
+    def _grant(self, slot: Optional[int]) -> bool:
+        # Inzwischen kann ein anderer Wartender vorn stehen; reservierte Slots nur interaktiv
+        while True:
+            head = self._peek_waiter()
+            if head is None:
+                return False
+            level, fut = head
+            if slot is not None and slot >= self._limit(level):
+                return False
+            self._next_waiter()
+            if fut.done():
+                continue
+            self.in_flight += 1
+            fut.set_result(slot)
+            return True
+
+    # -- Öffentliche API -----------------------------------------------------
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None, client: Optional[str] = None):
+        priority = priority or _priority.get()
+        client = client or _client.get()
+        level = PRIORITIES.get(priority, PRIORITIES[DEFAULT_PRIORITY])
+        stats = self._stats[priority if priority in PRIORITIES else DEFAULT_PRIORITY]
+        stats.requests += 1
+        start = time.monotonic()
+
+        held = None
+        if (self._global is None and self._can_start(level)
+                and not any(self._rotation[l] for l in self._waiting if l <= level)):
+            self.in_flight += 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            self._enqueue(level, client, fut)
+            stats.max_depth = max(stats.max_depth, self._depth(level))
+            self._wake()
+            try:
+                held = await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    # Slot wurde schon vergeben -> sofort wieder freigeben
+                    self.in_flight -= 1
+                    if fut.result() is not None:
+                        asyncio.ensure_future(self._global.release(fut.result()))
+                    self._wake()
+                else:
+                    self._remove(level, client, fut)
+                raise
+
+        try:
+            stats.waits_ms.append((time.monotonic() - start) * 1000)
+            yield
+        finally:
+            if held is not None:
+                await self._global.release(held)
+            self.in_flight -= 1
+            self._wake()
+
+    def close(self) -> None:
+        """Beim Herunterfahren: globale Slots und Warte-Eintrag dieses Prozesses freigeben."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        if self._global is not None:
+            self._global.close()
+
+    def snapshot(self) -> dict:
+        classes = {}
+        for name, level in PRIORITIES.items():
+            stats = self._stats[name]
+            waits = list(stats.waits_ms)
+            classes[name] = {
+                "queued": self._depth(level),
+                "clients_waiting": len(self._waiting[level]),
+                "max_queue_depth": stats.max_depth,
+                "requests": stats.requests,
+                "wait_ms_p50": _percentile(waits, 0.5),
+                "wait_ms_p95": _percentile(waits, 0.95),
+                "wait_ms_max": max(waits) if waits else None,
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "reserved_interactive": self.reserved_interactive,
+            "in_flight": self.in_flight,
+            "global_slots": None if self._global is None else self._global.snapshot(),
+            "classes": classes,
+        }
+
+
+scheduler = LLMScheduler(LLM_MAX_CONCURRENCY, LLM_RESERVED_INTERACTIVE, global_slots=LLM_GLOBAL_SLOTS)
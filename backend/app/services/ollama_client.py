@@ -0,0 +1,131 @@
+# app/services/ollama_client.py
+import os
+import time
+import httpx
+import logging
+
+from app.services.llm_scheduler import scheduler
+from app.services import llm_replay
+from app.profiling import record_span, span
+
+logger = logging.getLogger(__name__)
+
+# Ein gemeinsamer Client pro Prozess, damit Verbindungen zu Ollama
+# wiederverwendet werden (kein TCP-Handshake pro Prompt)
+_client: httpx.AsyncClient | None = None
+
+
+# Wie lange Ollama ein Modell nach dem letzten Aufruf im Speicher hält
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# "ollama" (Standard), "stub" (app/llm_stub.py, für Lasttests) oder
+# "replay" (aufgezeichnete Antworten aus llm_runs per Prompt-Hash)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "ollama").lower()
+LLM_STUB_URL = os.getenv("LLM_STUB_URL", "http://localhost:11435")
+
+
+def get_base_url() -> str:
+    if LLM_BACKEND == "stub":
+        return LLM_STUB_URL
+    return os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
+
+
+def get_model_name() -> str:
+    return os.getenv("OLLAMA_MODEL", "gemma:2b")
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=120)
+    return _client
+
+
+# ---------------------------------------------------------------------------
+# Hilfsfunktion: Anfrage an Ollama / Local LLM
+# ---------------------------------------------------------------------------
+async def call_ollama_with_meta(
+    model: str,
+    base_url: str,
+    prompt: str,
+    *,
+    format: dict | str | None = None,
+    options: dict | None = None,
+) -> tuple[str, dict]:
+    """
+    Sendet einen Prompt an Ollama und gibt (Antworttext, komplette JSON-Response) zurück.
+    Mit `format` (JSON-Schema oder "json") wird die Ausgabe serverseitig eingeschränkt.
+    """
+    url = f"{base_url}/api/generate"
+
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {"num_predict": -1, **(options or {})},
+    }
+    if format is not None:
+        payload["format"] = format
+
+    # Slot beim Scheduler (Priorität + Fairness aus dem Aufruf-Kontext)
+    queued_at = time.perf_counter()
+    async with scheduler.slot():
+        record_span("llm_wait", queued_at)
+        with span("llm", model):
+            data = await llm_replay.lookup(prompt) if LLM_BACKEND == "replay" else None
+            if data is None:
+                response = await get_client().post(url, json=payload)
+                response.raise_for_status()
+                data = response.json()
+    text = data.get("response", "").strip()
+    return text, data
+
+
+async def call_ollama(model: str, base_url: str, prompt: str) -> str:
+    """Sendet einen Prompt an Ollama und gibt den Text der Antwort zurück."""
+    text, _ = await call_ollama_with_meta(model, base_url, prompt)
+    return text
+
+
+async def embed(model: str, base_url: str, text: str) -> list[float]:
+    """
+    Berechnet ein Embedding über Ollamas lokalen /api/embeddings-Endpoint.
+    Wird nicht aufgezeichnet, läuft also auch mit LLM_BACKEND=replay gegen Ollama.
+    """
+    url = f"{base_url}/api/embeddings"
+
+    queued_at = time.perf_counter()
+    async with scheduler.slot():
+        record_span("llm_wait", queued_at)
+        with span("llm", model):
+            response = await get_client().post(
+                url, json={"model": model, "prompt": text, "keep_alive": OLLAMA_KEEP_ALIVE}
+            )
+    response.raise_for_status()
+    data = response.json()
+    return data.get("embedding") or []
+
+
+# ---------------------------------------------------------------------------
+# Warmup / Readiness
+# ---------------------------------------------------------------------------
+async def preload_model(model: str, base_url: str, *, embedding: bool = False) -> None:
+    """
+    Lädt ein Modell in Ollama vor (Request ohne Prompt bzw. leeres Embedding)
+    und hält es per keep_alive im Speicher.
+    """
+    if embedding:
+        url, payload = f"{base_url}/api/embeddings", {"model": model, "prompt": "", "keep_alive": OLLAMA_KEEP_ALIVE}
+    else:
+        url, payload = f"{base_url}/api/generate", {"model": model, "keep_alive": OLLAMA_KEEP_ALIVE}
+    # Modell-Laden kann auf CPU deutlich länger als der Standard-Timeout dauern
+    response = await get_client().post(url, json=payload, timeout=None)
+    response.raise_for_status()
+
+
+async def loaded_models(base_url: str) -> list[str]:
+    """Aktuell von Ollama im Speicher gehaltene Modelle (/api/ps)."""
+    response = await get_client().get(f"{base_url}/api/ps", timeout=5)
+    response.raise_for_status()
+    return [m.get("name") or m.get("model") for m in response.json().get("models", [])]
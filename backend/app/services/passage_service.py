@@ -0,0 +1,67 @@
+# app/services/passage_service.py
+import logging
+import os
+from typing import Optional
+
+from app.services.prompt_budget import estimate_tokens
+from app.services.text_index import BM25Index, split_sentences, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Passagen-Auswahl pro Frage statt ganzem Transkript (0 schaltet ab)
+PASSAGE_SELECTION = os.getenv("PASSAGE_SELECTION", "1") == "1"
+PASSAGE_TOP_K = int(os.getenv("PASSAGE_TOP_K", "2"))
+# Nachbarsätze links/rechts jeder Top-Passage als Kontext
+PASSAGE_WINDOW = int(os.getenv("PASSAGE_WINDOW", "1"))
+# Unter diesem BM25-Score ist die Auswahl unsicher -> voller Text
+PASSAGE_MIN_SCORE = float(os.getenv("PASSAGE_MIN_SCORE", "1.0"))
+# Kurze Berichte werden immer komplett geschickt, da lohnt keine Auswahl
+PASSAGE_MIN_TEXT_TOKENS = int(os.getenv("PASSAGE_MIN_TEXT_TOKENS", "300"))
+
+
+class PassageSelector:
+    """
+    Zerlegt einen Bericht einmal in Sätze und wählt pro Frage die
+    relevantesten Sätze (BM25 über Fragetext + Stichwort-Hinweise).
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.sentences = split_sentences(text)
+        self.enabled = PASSAGE_SELECTION and estimate_tokens(text) >= PASSAGE_MIN_TEXT_TOKENS
+        self.index = BM25Index(self.sentences) if self.enabled else None
+
+    def select(self, label: str, keywords: Optional[list[str]] = None) -> tuple[str, dict]:
+        """Liefert (Text für den Prompt, Metadaten für den LLMRun)."""
+        if not self.enabled or not self.sentences:
+            return self.text, {"mode": "full", "reason": "short_text"}
+
+        query = tokenize(label)
+        for kw in keywords or []:
+            query.extend(tokenize(kw))
+
+        top = self.index.top_k(query, PASSAGE_TOP_K)
+        best = top[0][1] if top else 0.0
+        if best < PASSAGE_MIN_SCORE:
+            return self.text, {"mode": "full", "reason": "low_score", "score": round(best, 2)}
+
+        selected: set[int] = set()
+        for i, _ in top:
+            lo = max(i - PASSAGE_WINDOW, 0)
+            hi = min(i + PASSAGE_WINDOW, len(self.sentences) - 1)
+            selected.update(range(lo, hi + 1))
+
+        # Ursprüngliche Reihenfolge beibehalten, Lücken markieren
+        parts, last = [], None
+        for i in sorted(selected):
+            if last is not None and i != last + 1:
+                parts.append("[…]")
+            parts.append(self.sentences[i])
+            last = i
+
+        return " ".join(parts), {
+            "mode": "passages",
+            "score": round(best, 2),
+            "sentences": len(selected),
+            "of": len(self.sentences),
+        }
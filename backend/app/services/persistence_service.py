@@ -1,8 +1,12 @@
 import time
 from typing import Iterable, List, Dict, Any, Optional
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.models.db_models import RawReport, Incident, StructuredAnswer, LLMRun
+from app.services.llm_replay import prompt_hash
+from app.services.report_summary_service import add_summary_stub
 
 
 def create_raw_report(
@@ -13,6 +17,7 @@ def create_raw_report(
     source: str = "api",
     language: str = "de",
     created_by: Optional[str] = None,
+    config_version: Optional[int] = None,
 ) -> RawReport:
     report = RawReport(
         title=title,
@@ -20,9 +25,11 @@ def create_raw_report(
         language=language,
         source=source,
         created_by=created_by,
+        config_version=config_version,
     )
     db.add(report)
     db.flush()  # damit report.id gesetzt ist
+    add_summary_stub(db, report)
     return report
 
 
@@ -55,6 +62,8 @@ def create_llm_run(
     report_id=None,
     incident_id=None,
     latency_ms: Optional[int] = None,
+    tokens_prompt_est: Optional[int] = None,
+    result_payload: Optional[Dict[str, Any]] = None,
 ) -> LLMRun:
     tokens_prompt = None
     tokens_completion = None
@@ -71,9 +80,13 @@ def create_llm_run(
         model_name=model_name,
         request_json=request_payload,
         response_json=response_payload,
+        result_json=result_payload,
         tokens_prompt=tokens_prompt,
         tokens_completion=tokens_completion,
+        tokens_prompt_est=tokens_prompt_est,
         latency_ms=latency_ms,
+        # Schlüssel für LLM_BACKEND=replay
+        prompt_hash=prompt_hash(request_payload.get("prompt")) if isinstance(request_payload, dict) else None,
     )
     db.add(run)
     db.flush()
@@ -86,12 +99,33 @@ def create_structured_answer(
     incident_id,
     question_key: str,
     answer_text: str,
+    value_json: Optional[Dict[str, Any]] = None,
 ) -> StructuredAnswer:
+    # value_json enthält bei typisierten Antworten zusätzlich value/source/confidence
     sa = StructuredAnswer(
         incident_id=incident_id,
         question_key=question_key,
-        value_json={"answer": answer_text},
+        value_json=value_json or {"answer": answer_text, "source": "llm"},
     )
     db.add(sa)
     db.flush()
     return sa
+
+
+def upsert_structured_answer(
+    db: Session,
+    *,
+    incident_id,
+    question_key: str,
+    answer_text: str,
+    value_json: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Wie create_structured_answer, ersetzt aber eine vorhandene Antwort (Backfill)."""
+    value = value_json or {"answer": answer_text, "source": "llm"}
+    stmt = pg_insert(StructuredAnswer).values(
+        incident_id=incident_id, question_key=question_key, value_json=value
+    ).on_conflict_do_update(
+        index_elements=["incident_id", "question_key"],
+        set_={"value_json": value, "created_at": func.now()},
+    )
+    db.execute(stmt)
@@ -0,0 +1,244 @@
+# app/services/prompt_budget.py
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+import sqlalchemy as sa
+
+from app.services.text_index import split_sentences
+
+logger = logging.getLogger(__name__)
+
+# Token-Budget pro Prompt-Zweck (Prompt-Tokens, ohne Antwort)
+DEFAULT_BUDGETS = {
+    "classify": 3000,
+    "extract_answer": 2000,
+    "write_final_report": 3500,
+}
+# Untergrenze für den Transkript-Anteil, auch wenn der feste Teil das Budget schon sprengt
+MIN_TRANSCRIPT_TOKENS = int(os.getenv("PROMPT_MIN_TRANSCRIPT_TOKENS", "300"))
+# "truncate" = Anfang + Ende behalten, "summarize" = Abschnitte per LLM zusammenfassen
+OVERFLOW_STRATEGY = os.getenv("PROMPT_OVERFLOW_STRATEGY", "truncate")
+SUMMARY_CHUNK_TOKENS = int(os.getenv("PROMPT_SUMMARY_CHUNK_TOKENS", "800"))
+TRUNCATION_MARKER = "[… gekürzt …]"
+
+
+def budget_for(purpose: str) -> int:
+    env_value = os.getenv(f"PROMPT_BUDGET_{purpose.upper()}")
+    if env_value:
+        return int(env_value)
+    return DEFAULT_BUDGETS.get(purpose, int(os.getenv("PROMPT_BUDGET_DEFAULT", "3000")))
+
+
+# ---------------------------------------------------------------------------
+# Token-Schätzung (Heuristik, optional aus llm_runs kalibriert)
+# ---------------------------------------------------------------------------
+
+class TokenEstimator:
+    """
+    Zeichen-pro-Token-Heuristik. Mit TOKEN_ESTIMATE_CALIBRATE=1 wird das
+    Verhältnis periodisch aus den gespeicherten prompt_eval_count-Werten
+    der letzten LLM-Runs nachgezogen.
+    """
+
+    def __init__(self):
+        self.chars_per_token = float(os.getenv("CHARS_PER_TOKEN", "3.5"))
+        self.calibrate_enabled = os.getenv("TOKEN_ESTIMATE_CALIBRATE", "0") == "1"
+        self.calibrate_interval_s = int(os.getenv("TOKEN_ESTIMATE_CALIBRATE_S", "600"))
+        self._calibrated_at = 0.0
+
+    def estimate(self, text: str) -> int:
+        return int(len(text or "") / self.chars_per_token) + 1
+
+    def needs_calibration(self) -> bool:
+        return self.calibrate_enabled and time.monotonic() - self._calibrated_at > self.calibrate_interval_s
+
+    def calibrate(self) -> None:
+        from app.db.session import engine
+
+        query = sa.text("""
+            SELECT sum(length(request_json->>'prompt')) AS chars, sum(tokens_prompt) AS tokens
+            FROM (
+                SELECT request_json, tokens_prompt FROM llm_runs
+                WHERE tokens_prompt > 0 AND request_json ? 'prompt'
+                ORDER BY created_at DESC
+                LIMIT 200
+            ) recent
+        """)
+        self._calibrated_at = time.monotonic()
+        try:
+            with engine.connect() as conn:
+                row = conn.execute(query).mappings().first()
+        except Exception as e:
+            logger.warning("Token-Kalibrierung fehlgeschlagen: %r", e)
+            return
+
+        if row and row["chars"] and row["tokens"]:
+            # Grenzen schützen vor Ausreißern (z.B. Prompt-Cache in Ollama)
+            ratio = min(max(row["chars"] / row["tokens"], 2.0), 8.0)
+            logger.info("Token-Schätzung kalibriert: %.2f Zeichen/Token", ratio)
+            self.chars_per_token = ratio
+
+
+estimator = TokenEstimator()
+
+
+def estimate_tokens(text: str) -> int:
+    return estimator.estimate(text)
+
+
+# ---------------------------------------------------------------------------
+# Transkript ins Budget einpassen
+# ---------------------------------------------------------------------------
+
+def truncate_to_budget(text: str, max_tokens: int) -> tuple[str, bool]:
+    """Behält Sätze vom Anfang (60 %) und Ende (40 %) des Textes, die Mitte fällt weg."""
+    if estimate_tokens(text) <= max_tokens:
+        return text, False
+
+    sentences = split_sentences(text)
+    head_budget = int(max_tokens * 0.6)
+    tail_budget = max_tokens - head_budget - estimate_tokens(TRUNCATION_MARKER)
+
+    head, used = [], 0
+    for s in sentences:
+        cost = estimate_tokens(s)
+        if used + cost > head_budget:
+            break
+        head.append(s)
+        used += cost
+
+    tail, used = [], 0
+    for s in reversed(sentences[len(head):]):
+        cost = estimate_tokens(s)
+        if used + cost > tail_budget:
+            break
+        tail.insert(0, s)
+        used += cost
+
+    if not head and not tail:
+        # Ein einzelner Riesensatz: hart auf Zeichen kürzen
+        max_chars = int(max_tokens * estimator.chars_per_token)
+        return text[:max_chars] + " " + TRUNCATION_MARKER, True
+
+    return "\n".join(head + [TRUNCATION_MARKER] + tail), True
+
+
+def chunk_text(text: str, chunk_tokens: int) -> list[str]:
+    """Teilt Text an Satzgrenzen in Abschnitte von höchstens chunk_tokens."""
+    chunks, current, used = [], [], 0
+    for s in split_sentences(text):
+        cost = estimate_tokens(s)
+        if current and used + cost > chunk_tokens:
+            chunks.append(" ".join(current))
+            current, used = [], 0
+        current.append(s)
+        used += cost
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+_summary_cache: dict[str, str] = {}
+_SUMMARY_CACHE_MAX = 64
+
+
+async def summarize_to_budget(text: str, max_tokens: int) -> tuple[str, bool]:
+    """Fasst zu lange Transkripte abschnittsweise per LLM zusammen (Ergebnis wird gecacht)."""
+    if estimate_tokens(text) <= max_tokens:
+        return text, False
+
+    from app.services.ollama_client import call_ollama, get_base_url, get_model_name
+
+    key = hashlib.sha1(f"{max_tokens}:{text}".encode("utf-8")).hexdigest()
+    if key in _summary_cache:
+        return _summary_cache[key], True
+
+    chunks = chunk_text(text, SUMMARY_CHUNK_TOKENS)
+    per_chunk = max(max_tokens // max(len(chunks), 1), 50)
+    summaries = []
+    for chunk in chunks:
+        prompt = (
+            f"Fasse den folgenden Abschnitt eines Berichts sachlich in höchstens {per_chunk} Wörtern zusammen. "
+            "Behalte alle Namen, Zeiten, Orte und Handlungen bei. Erfinde nichts.\n\n"
+            f"{chunk}"
+        )
+        try:
+            summaries.append(await call_ollama(get_model_name(), get_base_url(), prompt))
+        except Exception as e:
+            logger.warning("Zusammenfassung fehlgeschlagen, kürze stattdessen: %r", e)
+            return truncate_to_budget(text, max_tokens)
+
+    summary, _ = truncate_to_budget("\n".join(summaries), max_tokens)
+    if len(_summary_cache) >= _SUMMARY_CACHE_MAX:
+        _summary_cache.pop(next(iter(_summary_cache)))
+    _summary_cache[key] = summary
+    return summary, True
+
+
+async def fit_transcript(text: str, max_tokens: int) -> tuple[str, bool]:
+    if OVERFLOW_STRATEGY == "summarize":
+        return await summarize_to_budget(text, max_tokens)
+    return truncate_to_budget(text, max_tokens)
+
+
+# ---------------------------------------------------------------------------
+# Prompt-Zusammenbau
+# ---------------------------------------------------------------------------
+
+@dataclass
+class BudgetedPrompt:
+    prompt: str
+    purpose: str
+    tokens_est: int
+    budget: int
+    truncated: bool
+
+    def request_payload(self, **extra) -> dict:
+        """request_json für den LLMRun inkl. Budget-Metadaten."""
+        return {
+            "prompt": self.prompt,
+            "budget": self.budget,
+            "truncated": self.truncated,
+            **extra,
+        }
+
+
+async def assemble_prompt(
+    purpose: str,
+    render: Callable[[str], str],
+    transcript: str,
+    *,
+    overhead_render: Optional[Callable[[str], str]] = None,
+) -> BudgetedPrompt:
+    """
+    Baut einen Prompt so, dass er ins Budget des jeweiligen Zwecks passt.
+    `render` erzeugt den Prompt für ein (ggf. gekürztes) Transkript;
+    `overhead_render` misst den festen Anteil, falls sich dieser von
+    `render("")` unterscheidet (z.B. Few-Shot-Beispiele, die nur Restplatz füllen).
+    """
+    if estimator.needs_calibration():
+        await asyncio.to_thread(estimator.calibrate)
+
+    budget = budget_for(purpose)
+    overhead = estimate_tokens((overhead_render or render)(""))
+    available = max(budget - overhead, MIN_TRANSCRIPT_TOKENS)
+
+    fitted, truncated = await fit_transcript(transcript, available)
+    if truncated:
+        logger.info(
+            "Transkript für %s gekürzt: ~%d → ~%d Tokens",
+            purpose, estimate_tokens(transcript), estimate_tokens(fitted),
+        )
+
+    prompt = render(fitted)
+    return BudgetedPrompt(
+        prompt=prompt,
+        purpose=purpose,
+        tokens_est=estimate_tokens(prompt),
+        budget=budget,
+        truncated=truncated,
+    )
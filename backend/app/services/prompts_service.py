@@ -4,19 +4,31 @@ from sqlalchemy.orm import Session
 from app.db.session import engine
 from app.models.db_models import Prompt
 from app.models.api_models import PromptCreate, PromptUpdate
+from app.services.prompt_budget import estimate_tokens
+from app.services.config_events import notify_config_change
+import json
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# "full" = alle Typbeschreibungen, "compact" = Kurzdefinitionen + Few-Shot-Beispiele
+PROMPT_MODE = os.getenv("PROMPT_MODE", "full")
+FEWSHOT_K = int(os.getenv("FEWSHOT_K", "3"))
+CLASSIFY_PROMPT_TOKEN_BUDGET = int(os.getenv("CLASSIFY_PROMPT_TOKEN_BUDGET", "1200"))
+
 # --- Bestehende Funktionen (unverändert lassen, nur Imports prüfen) ---
+# Prompt-Bausteine der Klassifikation (auch für Snapshots in config_cache)
+CLASSIFY_PROMPT_NAMES = [
+    "base_prompt",
+    "task_prompt_incident_classification",
+    "category_intro_prompt",
+    "classify_rules_prompt",
+    "info_prompt",
+]
+
 def load_prompts(version="v1") -> dict[str, str]:
-    names = [
-        "base_prompt",
-        "task_prompt_incident_classification",
-        "category_intro_prompt",
-        "classify_rules_prompt",
-        "info_prompt",
-    ]
+    names = CLASSIFY_PROMPT_NAMES
     # ... (Dein existierender Code für load_prompts) ...
     query = text("""
         SELECT name, content FROM prompts
@@ -43,6 +55,95 @@ def build_prompt(text: str, types: list[dict], prompts: dict[str, str]) -> str:
 {text.strip()}
 """
 
+def short_definition(desc: str, max_chars: int = 160) -> str:
+    """Erster Absatz der Typbeschreibung ohne 'Definition:'-Präfix und ohne Beispiellisten."""
+    first = (desc or "").strip().split("\n\n")[0].strip()
+    if first.lower().startswith("definition:"):
+        first = first[len("definition:"):].strip()
+    first = " ".join(first.split())
+    return first if len(first) <= max_chars else first[:max_chars].rsplit(" ", 1)[0] + " …"
+
+
+def build_compact_prompt(
+    text: str,
+    types: list[dict],
+    prompts: dict[str, str],
+    examples: list[dict],
+    token_budget: int = CLASSIFY_PROMPT_TOKEN_BUDGET,
+) -> str:
+    """
+    Kompakter Klassifikations-Prompt: nur Kurzdefinitionen der Typen plus
+    ähnliche, bereits klassifizierte Beispiele – so viele, wie ins Budget passen.
+    """
+    type_lines = [f"'{t['name']}': {short_definition(t['desc'])}" for t in types]
+    categories_str = "\n".join(type_lines)
+    code_to_name = {t["code"]: t["name"] for t in types}
+
+    head = f"""
+{prompts.get('base_prompt', '')}
+{prompts.get('task_prompt_incident_classification', '')}
+{prompts.get('category_intro_prompt', '')}
+
+{categories_str}
+"""
+    tail = f"""
+{prompts.get('classify_rules_prompt', '')}
+{prompts.get('info_prompt', '')}
+
+{text.strip()}
+"""
+    used = estimate_tokens(head) + estimate_tokens(tail)
+
+    example_blocks = []
+    for ex in examples:
+        names = [code_to_name.get(code, code) for code in ex["types"]]
+        block = f'Bericht: "{" ".join(ex["text"].split())}"\nAntwort: {json.dumps(names, ensure_ascii=False)}'
+        cost = estimate_tokens(block)
+        if used + cost > token_budget:
+            break
+        example_blocks.append(block)
+        used += cost
+
+    examples_str = ""
+    if example_blocks:
+        examples_str = "\nBeispiele bereits klassifizierter Berichte:\n" + "\n\n".join(example_blocks) + "\n"
+
+    return head + examples_str + tail
+
+def build_question_prompt(text: str, question_text: str) -> str:
+    return f"""
+Text: {text}
+Frage: {question_text}
+Regel: Beantworte die Frage klar und knapp. Wenn keine Information im Text steht, antworte 'Keine Information'.
+"""
+
+
+def build_facts_summary(answers: dict[str, dict[str, str]]) -> str:
+    facts_summary = ""
+    for inc_type, facts in answers.items():
+        facts_summary += f"\n[Vorfall: {inc_type.upper()}]\n"
+        for key, value in facts.items():
+            facts_summary += f"- {key}: {value}\n"
+    return facts_summary
+
+
+def build_writer_prompt(text: str, facts_summary: str) -> str:
+    return f"""
+Du bist ein Polizeibeamter. Schreibe einen formalen, sachlichen Bericht (Fließtext) basierend auf dem folgenden Sachverhalt und den extrahierten Fakten.
+
+Original-Text:
+"{text}"
+
+Bestätigte Fakten:
+{facts_summary}
+
+Anweisungen:
+- Schreibe im passiven Beamtendeutsch (z.B. "wurde festgestellt", "ereignete sich").
+- Fasse das Geschehen chronologisch zusammen.
+- Erwähne alle beteiligten Personen und Zeiten.
+- Keine Aufzählungszeichen, nur Fließtext.
+"""
+
 # --- NEUE CRUD Funktionen (Verwendung von Session) ---
 
 def get_all_prompts(db: Session):
@@ -59,6 +160,7 @@ def create_prompt(db: Session, data: PromptCreate):
         version_tag=data.version_tag
     )
     db.add(new_prompt)
+    notify_config_change(db, "prompts")
     db.commit()
     db.refresh(new_prompt)
     return new_prompt
@@ -70,6 +172,7 @@ def update_prompt(db: Session, prompt_id, data: PromptUpdate):
         if data.purpose is not None: prompt.purpose = data.purpose
         if data.content is not None: prompt.content = data.content
         if data.version_tag is not None: prompt.version_tag = data.version_tag
+        notify_config_change(db, "prompts")
         db.commit()
         db.refresh(prompt)
     return prompt
@@ -78,6 +181,7 @@ def delete_prompt(db: Session, prompt_id):
     prompt = get_prompt_by_id(db, prompt_id)
     if prompt:
         db.delete(prompt)
+        notify_config_change(db, "prompts")
         db.commit()
         return True
     return False
@@ -90,7 +194,7 @@ def get_all_prompts(db):
 
 def create_prompt(db, data: PromptBase):
     obj = Prompt(name=data.name, purpose=data.purpose, content=data.content, version_tag=data.version_tag)
-    db.add(obj); db.commit(); db.refresh(obj)
+    db.add(obj); notify_config_change(db, "prompts"); db.commit(); db.refresh(obj)
     return obj
 
 def update_prompt(db, prompt_id, data: PromptUpdate):
@@ -100,10 +204,10 @@ def update_prompt(db, prompt_id, data: PromptUpdate):
         if data.purpose: obj.purpose = data.purpose
         if data.content: obj.content = data.content
         if data.version_tag: obj.version_tag = data.version_tag
-        db.commit(); db.refresh(obj)
+        notify_config_change(db, "prompts"); db.commit(); db.refresh(obj)
     return obj
 
 def delete_prompt(db, prompt_id):
     obj = db.query(Prompt).filter(Prompt.id == prompt_id).first()
-    if obj: db.delete(obj); db.commit(); return True
+    if obj: db.delete(obj); notify_config_change(db, "prompts"); db.commit(); return True
     return False
\ No newline at end of file
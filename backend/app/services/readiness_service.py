@@ -0,0 +1,178 @@
+# app/services/readiness_service.py
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import sqlalchemy as sa
+
+from app.db.session import engine
+from app.services.config_cache import config_cache
+from app.services.embedding_service import EMBED_MODEL
+from app.services.ollama_client import get_base_url, get_model_name, preload_model, loaded_models
+
+logger = logging.getLogger(__name__)
+
+# Modelle beim Start vorladen (0 = nur Erreichbarkeit prüfen)
+WARMUP_MODELS = os.getenv("WARMUP_MODELS", "1") == "1"
+# Embedding-Modell mit vorladen (nur sinnvoll, wenn Ähnlichkeitssuche genutzt wird)
+WARMUP_EMBED_MODEL = os.getenv("WARMUP_EMBED_MODEL", "1") == "1"
+# So viele DB-Verbindungen werden beim Start geöffnet
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "4"))
+# Abstand der Hintergrundprüfungen; /ready liefert nur das gecachte Ergebnis
+READY_CHECK_INTERVAL_S = float(os.getenv("READY_CHECK_INTERVAL_S", "15"))
+# Abhängigkeiten, die für "ready" erfüllt sein müssen
+READY_REQUIRE = [d.strip() for d in os.getenv("READY_REQUIRE", "database,config,llm").split(",") if d.strip()]
+
+
+def _model_tag(name: str) -> str:
+    return name if ":" in name else f"{name}:latest"
+
+
+class ReadinessState:
+    """Zuletzt ermittelter Status pro Abhängigkeit (database, config, llm)."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.warmup_done = False
+        self.checks: dict[str, dict] = {
+            name: {"status": "pending", "detail": None, "checked_at": None, "latency_ms": None}
+            for name in ("database", "config", "llm")
+        }
+
+    def set(self, name: str, ok: bool, detail=None, latency_ms: Optional[int] = None) -> None:
+        self.checks[name] = {
+            "status": "ok" if ok else "error",
+            "detail": detail,
+            "checked_at": time.time(),
+            "latency_ms": latency_ms,
+        }
+
+    @property
+    def ready(self) -> bool:
+        return self.warmup_done and all(self.checks[d]["status"] == "ok" for d in READY_REQUIRE if d in self.checks)
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.ready,
+            "warmup_done": self.warmup_done,
+            "uptime_s": int(time.time() - self.started_at),
+            "required": READY_REQUIRE,
+            "checks": self.checks,
+        }
+
+
+state = ReadinessState()
+
+
+# ---------------------------------------------------------------------------
+# Einzelne Prüfungen
+# ---------------------------------------------------------------------------
+
+def _ping_db() -> None:
+    with engine.connect() as conn:
+        conn.execute(sa.text("SELECT 1"))
+
+
+def _prime_pool(n: int) -> int:
+    """Öffnet n Verbindungen gleichzeitig, damit sie danach im Pool bereitliegen."""
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        list(pool.map(lambda _: _hold_connection(), range(n)))
+    return n
+
+
+def _hold_connection() -> None:
+    with engine.connect() as conn:
+        conn.execute(sa.text("SELECT 1"))
+        time.sleep(0.05)
+
+
+async def check_database(prime: int = 0) -> None:
+    start = time.monotonic()
+    try:
+        if prime > 0:
+            await asyncio.to_thread(_prime_pool, prime)
+        else:
+            await asyncio.to_thread(_ping_db)
+        state.set("database", True, {"primed": prime} if prime else None, int((time.monotonic() - start) * 1000))
+    except Exception as e:
+        state.set("database", False, repr(e))
+
+
+async def check_config() -> None:
+    try:
+        snapshot = await asyncio.to_thread(config_cache.get)
+        ok = bool(snapshot.incident_types) and bool(snapshot.prompts)
+        state.set("config", ok, {"version": snapshot.version, "types": len(snapshot.incident_types)})
+    except Exception as e:
+        state.set("config", False, repr(e))
+
+
+def _required_models() -> list[tuple[str, bool]]:
+    models = [(get_model_name(), False)]
+    if WARMUP_EMBED_MODEL:
+        models.append((EMBED_MODEL, True))
+    return models
+
+
+async def check_llm(preload: bool = False) -> None:
+    """Prüft, ob die Modelle geladen sind; lädt sie bei Bedarf (erneut) vor."""
+    base_url = get_base_url()
+    start = time.monotonic()
+    try:
+        loaded = {_model_tag(m) for m in await loaded_models(base_url)}
+        missing = [(m, emb) for m, emb in _required_models() if _model_tag(m) not in loaded]
+        if missing and preload:
+            for model, embedding in missing:
+                logger.info("Lade Modell vor: %s", model)
+                await preload_model(model, base_url, embedding=embedding)
+            missing = []
+        state.set(
+            "llm",
+            not missing,
+            {"loaded": sorted(loaded), "missing": [m for m, _ in missing]},
+            int((time.monotonic() - start) * 1000),
+        )
+    except Exception as e:
+        state.set("llm", False, repr(e))
+
+
+# ---------------------------------------------------------------------------
+# Start + periodische Prüfung (FastAPI-Lifespan)
+# ---------------------------------------------------------------------------
+
+async def warmup() -> None:
+    await check_database(prime=WARMUP_DB_CONNECTIONS)
+    await check_config()
+    await check_llm(preload=WARMUP_MODELS)
+    state.warmup_done = True
+    logger.info("Warmup abgeschlossen: %s", "ready" if state.ready else state.checks)
+
+
+async def readiness_loop() -> None:
+    await warmup()
+    while True:
+        await asyncio.sleep(READY_CHECK_INTERVAL_S)
+        await check_database()
+        await check_config()
+        # Entladene Modelle (z.B. nach Ollama-Neustart) wieder vorladen
+        await check_llm(preload=WARMUP_MODELS)
+
+
+_task: Optional[asyncio.Task] = None
+
+
+def start_readiness() -> None:
+    global _task
+    _task = asyncio.get_running_loop().create_task(readiness_loop())
+
+
+async def stop_readiness() -> None:
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except (asyncio.CancelledError, Exception):
+            pass
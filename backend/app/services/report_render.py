@@ -0,0 +1,205 @@
+# app/services/report_render.py
+"""
+Schlanke PDF-/DOCX-Ausgabe ohne Zusatzpakete: Überschriften, Absätze,
+Aufzählungen und eine Tabelle "Frage: Antwort". Mehr braucht der
+Abschlussbericht nicht.
+"""
+import re
+import zlib
+import zipfile
+from typing import BinaryIO, Iterator
+from xml.sax.saxutils import escape
+
+# Blocktypen: ("h1" | "h2" | "p" | "li" | "kv", text | (label, value))
+Block = tuple
+
+
+def markdown_blocks(md: str) -> Iterator[Block]:
+    """Einfaches Markdown (#, ##, -, *, **fett**) in Blöcke zerlegen."""
+    paragraph: list[str] = []
+
+    def flush():
+        if paragraph:
+            yield ("p", " ".join(paragraph))
+            paragraph.clear()
+
+    for raw in (md or "").splitlines():
+        line = re.sub(r"\*\*(.+?)\*\*|__(.+?)__", lambda m: m.group(1) or m.group(2), raw.strip())
+        if not line:
+            yield from flush()
+        elif line.startswith("#"):
+            yield from flush()
+            level = len(line) - len(line.lstrip("#"))
+            yield ("h1" if level == 1 else "h2", line.lstrip("#").strip())
+        elif re.match(r"^[-*•]\s+", line):
+            yield from flush()
+            yield ("li", re.sub(r"^[-*•]\s+", "", line))
+        else:
+            paragraph.append(line)
+    yield from flush()
+
+
+# ---------------------------------------------------------------------------
+# PDF (A4, Helvetica, WinAnsi-Kodierung für Umlaute)
+# ---------------------------------------------------------------------------
+
+_PAGE_W, _PAGE_H = 595, 842
+_MARGIN = 56
+_STYLES = {
+    # Schrift, Größe, Zeilenabstand, Abstand davor
+    "h1": ("F2", 16, 20, 10),
+    "h2": ("F2", 12, 16, 10),
+    "p": ("F1", 10, 13, 6),
+    "li": ("F1", 10, 13, 2),
+    "kv": ("F1", 10, 13, 2),
+}
+
+
+def _pdf_str(text: str) -> bytes:
+    raw = text.encode("cp1252", errors="replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _wrap(text: str, size: int, width: float) -> list[str]:
+    # Helvetica: mittlere Zeichenbreite ~0.5 em; leicht konservativ gerechnet
+    max_chars = max(10, int(width / (size * 0.52)))
+    lines, current = [], ""
+    for word in text.split():
+        while len(word) > max_chars:
+            if current:
+                lines.append(current)
+                current = ""
+            lines.append(word[:max_chars])
+            word = word[max_chars:]
+        candidate = f"{current} {word}" if current else word
+        if len(candidate) > max_chars:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines or [""]
+
+
+def _pdf_pages(blocks: Iterator[Block]) -> Iterator[bytes]:
+    """Liefert pro Seite den (unkomprimierten) Content-Stream."""
+    ops: list[bytes] = []
+    y = _PAGE_H - _MARGIN
+    width = _PAGE_W - 2 * _MARGIN
+
+    for kind, content in blocks:
+        font, size, leading, space = _STYLES[kind]
+        if kind == "kv":
+            label, value = content
+            text, indent = f"{label}: {value or '–'}", 0
+        elif kind == "li":
+            text, indent = f"• {content}", 10
+        else:
+            text, indent = content, 0
+        y -= space
+        for line in _wrap(text, size, width - indent):
+            if y - leading < _MARGIN:
+                yield b"\n".join(ops)
+                ops = []
+                y = _PAGE_H - _MARGIN
+            y -= leading
+            ops.append(b"BT /%s %d Tf %d %d Td %s Tj ET" % (font.encode(), size, _MARGIN + indent, y, _pdf_str(line)))
+    yield b"\n".join(ops)
+
+
+def render_pdf(blocks: Iterator[Block], out: BinaryIO) -> None:
+    offsets: dict[int, int] = {}
+
+    def obj(num: int, body: bytes) -> None:
+        offsets[num] = out.tell()
+        out.write(b"%d 0 obj\n" % num + body + b"\nendobj\n")
+
+    out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    obj(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+
+    # Seiten werden direkt geschrieben; Objekt 2 (Seitenbaum) folgt am Ende
+    page_ids = []
+    num = 5
+    for content in _pdf_pages(blocks):
+        data = zlib.compress(content)
+        obj(num, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(data) + data + b"\nendstream")
+        obj(num + 1, (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+        ) % (_PAGE_W, _PAGE_H, num))
+        page_ids.append(num + 1)
+        num += 2
+
+    kids = b" ".join(b"%d 0 R" % p for p in page_ids)
+    obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+    obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % num)
+    for i in range(1, num):
+        out.write(b"%010d 00000 n \n" % offsets[i])
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (num, xref))
+
+
+# ---------------------------------------------------------------------------
+# DOCX (WordprocessingML, direkt formatiert -> keine styles.xml nötig)
+# ---------------------------------------------------------------------------
+
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+
+def _run(text: str, *, bold: bool = False, size: int = 0) -> str:
+    props = ("<w:b/>" if bold else "") + (f'<w:sz w:val="{size * 2}"/>' if size else "")
+    rpr = f"<w:rPr>{props}</w:rPr>" if props else ""
+    return f'<w:r>{rpr}<w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+
+
+def _docx_paragraph(kind: str, content) -> str:
+    if kind == "h1":
+        return f"<w:p>{_run(content, bold=True, size=16)}</w:p>"
+    if kind == "h2":
+        return f"<w:p>{_run(content, bold=True, size=12)}</w:p>"
+    if kind == "li":
+        return f'<w:p><w:pPr><w:ind w:left="360"/></w:pPr>{_run("• " + content)}</w:p>'
+    if kind == "kv":
+        label, value = content
+        return f"<w:p>{_run(label + ': ', bold=True)}{_run(value or '–')}</w:p>"
+    return f"<w:p>{_run(content)}</w:p>"
+
+
+def render_docx(blocks: Iterator[Block], out: BinaryIO) -> None:
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _RELS)
+        with zf.open("word/document.xml", "w") as doc:
+            doc.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document xmlns:w="{_W_NS}"><w:body>'.encode())
+            for kind, content in blocks:
+                doc.write(_docx_paragraph(kind, content).encode("utf-8"))
+            doc.write(b"</w:body></w:document>")
+
+
+RENDERERS = {"pdf": render_pdf, "docx": render_docx}
+MEDIA_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
@@ -0,0 +1,281 @@
+# app/services/report_summary_service.py
+"""
+report_summaries: eine Zeile pro Bericht mit allem, was die History anzeigt.
+Gepflegt am Ende der Analyse und bei Antwort-/Berichtsänderungen, jeweils in
+der Transaktion des Aufrufers. Bestand nachziehen:
+
+    python -m app.services.report_summary_service            # nur fehlende/leere
+    python -m app.services.report_summary_service --all      # alles neu
+"""
+import argparse
+import json
+import logging
+import re
+import uuid
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy import and_, event, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.db_models import (
+    RawReport, LLMRun, FinalReport, Incident, StructuredAnswer, IncidentQuestion, ReportSummary,
+)
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_CHARS = 60
+REBUILD_BATCH = 200
+
+
+def clean_llm_response(response_data):
+    """
+    Hilfsfunktion: Holt den reinen Text aus verschiedenen Antwort-Formaten.
+    """
+    if not response_data:
+        return ""
+
+    if isinstance(response_data, dict):
+        return response_data.get("response", str(response_data))
+
+    if isinstance(response_data, str):
+        return response_data
+
+    return str(response_data)
+
+
+def parse_classification(response_data):
+    """
+    Versucht, eine Klassifikations-Liste aus den Daten zu retten.
+    """
+    try:
+        if isinstance(response_data, list):
+            return response_data
+
+        text = clean_llm_response(response_data)
+
+        if "[" in text and "]" in text:
+            try:
+                match = re.search(r'\[.*\]', text, re.DOTALL)
+                if match:
+                    json_str = match.group(0).replace("'", '"') # Fix single quotes
+                    return json.loads(json_str)
+            except:
+                pass
+
+        if len(text) < 50:
+            return [text]
+
+        return []
+    except:
+        return []
+
+
+def preview_for(body: Optional[str]) -> str:
+    return body[:PREVIEW_CHARS] + "..." if body else ""
+
+
+def compute_result_data(db: Session, report_id: uuid.UUID, runs: Optional[list] = None) -> dict:
+    """Klassifikation, Fakten und Abschlussbericht eines Berichts (teuerster Teil der History)."""
+    if runs is None:
+        runs = db.query(LLMRun).filter(LLMRun.report_id == report_id).order_by(LLMRun.created_at).all()
+
+    final_rep_entry = db.query(FinalReport).filter(FinalReport.incident_id.in_(
+        [run.incident_id for run in runs if run.incident_id]
+    )).order_by(FinalReport.version.desc()).first()
+
+    classification = []
+    facts = {}
+
+    for run in runs:
+        try:
+            if run.purpose == "classify":
+                if run.result_json:
+                    classification = run.result_json.get("incident_types", [])
+                else:
+                    # Altbestand ohne validiertes Ergebnis
+                    classification = parse_classification(run.response_json)
+
+            elif run.purpose == "extract_answer" and run.request_json:
+                answ = clean_llm_response(run.response_json)
+
+                prompt_snippet = run.request_json.get("prompt", "")
+                if "Frage:" in prompt_snippet:
+                    label = prompt_snippet.split("Frage:")[-1].split("\n")[0].strip()
+                    facts[label] = answ
+        except Exception as e:
+            logger.warning("Error parsing run %s: %s", run.id, e)
+            continue
+
+    # Gespeicherte Antworten haben Vorrang (Regel-Extraktion, manuelle Korrekturen)
+    stored = (
+        db.query(StructuredAnswer.question_key, StructuredAnswer.value_json, IncidentQuestion.label)
+        .join(Incident, Incident.id == StructuredAnswer.incident_id)
+        .outerjoin(IncidentQuestion, and_(
+            IncidentQuestion.incident_type == Incident.incident_type,
+            IncidentQuestion.question_key == StructuredAnswer.question_key,
+        ))
+        .filter(Incident.report_id == report_id)
+        .order_by(IncidentQuestion.order_index)
+        .all()
+    )
+    if stored:
+        facts = {label or key: (value or {}).get("answer") for key, value, label in stored}
+
+    # Final Report Body laden
+    final_report_content = None
+    if final_rep_entry:
+        try:
+            final_report_content = json.loads(final_rep_entry.body_md)
+        except:
+            final_report_content = final_rep_entry.body_md
+
+    return {
+        "classification": classification,
+        "facts": facts,
+        "final_report": final_report_content
+    }
+
+
+def _summary_values(db: Session, report: RawReport) -> dict:
+    runs = db.query(LLMRun).filter(LLMRun.report_id == report.id).order_by(LLMRun.created_at).all()
+    result_data = compute_result_data(db, report.id, runs)
+
+    incident_ids = [i for (i,) in db.query(Incident.id).filter(Incident.report_id == report.id)]
+    matched_types = [
+        t for (t,) in db.query(Incident.incident_type).filter(Incident.report_id == report.id).order_by(Incident.created_at)
+    ]
+    answer_count = 0
+    if incident_ids:
+        answer_count = (
+            db.query(func.count()).select_from(StructuredAnswer)
+            .filter(StructuredAnswer.incident_id.in_(incident_ids))
+            .scalar()
+        )
+
+    return {
+        "report_id": report.id,
+        "created_at": report.created_at,
+        "title": report.title or "Unbenannter Bericht",
+        "preview": preview_for(report.body),
+        "matched_types": matched_types,
+        "answer_count": answer_count,
+        "has_final_report": result_data["final_report"] is not None,
+        "run_count": len(runs),
+        "total_latency_ms": sum(r.latency_ms or 0 for r in runs),
+        "total_tokens": sum((r.tokens_prompt or 0) + (r.tokens_completion or 0) for r in runs),
+        "result_data": result_data,
+        "updated_at": func.now(),
+    }
+
+
+_HISTORY_CHANGED = "history_changed"
+
+
+def _bump_history_version(db: Session) -> None:
+    """
+    ETag/Cursor der History (http_cache.history_fingerprint). Nur vormerken:
+    erhöht wird einmal pro Transaktion direkt vor dem Commit, damit die
+    Zeilensperre auf history_state nicht über die ganze Transaktion gehalten
+    wird (und Leser die neue Version erst mit den Daten sehen).
+    """
+    db.info[_HISTORY_CHANGED] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_history_on_commit(db: Session) -> None:
+    if db.info.pop(_HISTORY_CHANGED, False):
+        # Ausstehende ORM-Änderungen zuerst, die Sperre dann nur bis zum COMMIT
+        db.flush()
+        db.execute(sa.text("UPDATE history_state SET version = version + 1, updated_at = now()"))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_history_bump(db: Session, transaction) -> None:
+    # Rollback: vorgemerkte Erhöhung verwerfen
+    if transaction.parent is None:
+        db.info.pop(_HISTORY_CHANGED, None)
+
+
+def refresh_summary(db: Session, report_id: uuid.UUID) -> None:
+    """Zeile neu berechnen (Upsert). Committet nicht: läuft in der Transaktion des Aufrufers."""
+    report = db.query(RawReport).filter(RawReport.id == report_id).first()
+    if report is None:
+        return
+    values = _summary_values(db, report)
+    stmt = pg_insert(ReportSummary).values(**values)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[ReportSummary.report_id],
+        set_={k: stmt.excluded[k] for k in values if k != "report_id"},
+    ))
+    _bump_history_version(db)
+
+
+def add_summary_stub(db: Session, report: RawReport) -> None:
+    """Neuer Bericht ohne Analyse: sofort in der History sichtbar, result_data folgt."""
+    db.execute(pg_insert(ReportSummary).values(
+        report_id=report.id,
+        created_at=report.created_at or func.now(),
+        title=report.title or "Unbenannter Bericht",
+        preview=preview_for(report.body),
+        matched_types=[],
+    ).on_conflict_do_nothing(index_elements=[ReportSummary.report_id]))
+    _bump_history_version(db)
+
+
+def sync_summary(db: Session, report_id: uuid.UUID) -> None:
+    """Aktualisieren und committen; Fehler nur loggen (Zeile lässt sich neu aufbauen)."""
+    try:
+        refresh_summary(db, report_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("report_summaries für %s nicht aktualisiert", report_id)
+
+
+def rebuild_summaries(*, only_missing: bool = True, batch: int = REBUILD_BATCH) -> int:
+    """Bestand nachziehen, seitenweise nach (created_at, id) mit Commit pro Seite."""
+    from app.db.session import SessionLocal
+
+    done = 0
+    last: Optional[tuple] = None
+    db = SessionLocal()
+    try:
+        while True:
+            query = db.query(RawReport.id, RawReport.created_at)
+            if only_missing:
+                query = query.outerjoin(ReportSummary, ReportSummary.report_id == RawReport.id).filter(
+                    sa.or_(ReportSummary.report_id.is_(None), ReportSummary.result_data.is_(None))
+                )
+            if last is not None:
+                query = query.filter(sa.tuple_(RawReport.created_at, RawReport.id) > last)
+            page = query.order_by(RawReport.created_at, RawReport.id).limit(batch).all()
+            if not page:
+                break
+            for report_id, _ in page:
+                refresh_summary(db, report_id)
+            db.commit()
+            db.expunge_all()
+            done += len(page)
+            last = tuple(page[-1])
+            logger.info("report_summaries: %d Berichte aufgebaut", done)
+    finally:
+        db.close()
+    return done
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="report_summaries aus den Analysedaten neu aufbauen")
+    parser.add_argument("--all", action="store_true", help="Alle Berichte statt nur fehlende/leere")
+    parser.add_argument("--batch", type=int, default=REBUILD_BATCH)
+    args = parser.parse_args()
+
+    from app.logging_setup import configure_logging
+    configure_logging()
+    count = rebuild_summaries(only_missing=not args.all, batch=args.batch)
+    print(f"{count} Berichte aktualisiert")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+# app/services/search_service.py
+import sqlalchemy as sa
+from datetime import date, datetime, timedelta
+from typing import Optional, Union
+import base64
+import html
+import json
+import logging
+import os
+
+from app.db.session import engine
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Gesamtzahl wird nur bis hierher gezählt, darüber heißt es "1000+"
+SEARCH_COUNT_CAP = int(os.getenv("SEARCH_COUNT_CAP", "1000"))
+
+# Markierung erst nach dem Escapen einsetzen: Berichtstext ist Nutzereingabe
+_MARK_START, _MARK_STOP = "\x02", "\x03"
+HEADLINE_OPTIONS = f"MaxFragments=2, MaxWords=25, MinWords=8, StartSel={_MARK_START}, StopSel={_MARK_STOP}"
+
+
+def _safe_snippet(text: Optional[str]) -> Optional[str]:
+    """HTML-escapen, dann die Treffer-Markierungen als <mark> einsetzen."""
+    if text is None:
+        return None
+    return html.escape(text).replace(_MARK_START, "<mark>").replace(_MARK_STOP, "</mark>")
+
+
+def encode_cursor(key, report_id) -> str:
+    """Keyset-Cursor: Sortierschlüssel (Rang bzw. Zeitpunkt) und id der letzten Zeile."""
+    value = key.isoformat() if isinstance(key, datetime) else float(key)
+    raw = json.dumps([value, str(report_id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, *, ranked: bool) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key, report_id = json.loads(raw)
+        key = float(key) if ranked else datetime.fromisoformat(key)
+        return key, str(report_id)
+    except (ValueError, TypeError):
+        raise ValueError("Ungültiger Cursor")
+
+
+def _build_filters(
+    params: dict,
+    *,
+    incident_types: Optional[list[str]],
+    date_from: Optional[Union[date, datetime]],
+    date_to: Optional[Union[date, datetime]],
+    answer_keys: Optional[list[str]],
+) -> str:
+    """Baut die WHERE-Bedingungen für die Facetten (alle über Indizes abgedeckt)."""
+    clauses = ["TRUE"]
+
+    if incident_types:
+        params["types"] = incident_types
+        clauses.append("""EXISTS (
+            SELECT 1 FROM incidents i
+            WHERE i.report_id = r.id AND i.incident_type = ANY(:types)
+        )""")
+
+    if date_from:
+        params["date_from"] = date_from
+        clauses.append("r.created_at >= :date_from")
+
+    if date_to:
+        if isinstance(date_to, datetime):
+            params["date_to"] = date_to
+            clauses.append("r.created_at <= :date_to")
+        else:
+            # Reines Datum: der ganze Tag gehört noch dazu
+            params["date_to"] = date_to + timedelta(days=1)
+            clauses.append("r.created_at < :date_to")
+
+    if answer_keys:
+        params["answer_keys"] = answer_keys
+        clauses.append("""EXISTS (
+            SELECT 1 FROM incidents i
+            JOIN structured_answers sa ON sa.incident_id = i.id
+            WHERE i.report_id = r.id AND sa.question_key = ANY(:answer_keys)
+        )""")
+
+    return " AND ".join(clauses)
+
+
+def search_reports(
+    q: Optional[str] = None,
+    *,
+    incident_types: Optional[list[str]] = None,
+    date_from: Optional[Union[date, datetime]] = None,
+    date_to: Optional[Union[date, datetime]] = None,
+    answer_keys: Optional[list[str]] = None,
+    cursor: Optional[str] = None,
+    page_size: int = 20,
+    with_facets: bool = False,
+    bind: Optional[Engine] = None,
+) -> dict:
+    """
+    Volltextsuche über Rohberichte und generierte Abschlussberichte.
+    Treffer nach Relevanz (ts_rank_cd, dann id), ohne Suchbegriff nach
+    (created_at, id); weiter geblättert wird per Keyset-Cursor (next_cursor),
+    nicht per OFFSET. Snippets nur für die Zeilen der Seite, Gesamtzahl
+    nur auf der ersten Seite und höchstens bis SEARCH_COUNT_CAP, Facetten
+    nur auf Anfrage. `bind`: Engine (z.B. Lese-Replikat), sonst Primär-DB.
+    Ungültiger Cursor -> ValueError.
+    """
+    q = (q or "").strip()
+    params: dict = {}
+    filters = _build_filters(
+        params,
+        incident_types=incident_types,
+        date_from=date_from,
+        date_to=date_to,
+        answer_keys=answer_keys,
+    )
+    filter_params = dict(params)
+
+    if q:
+        params["q"] = q
+        # Kandidaten kommen ausschließlich aus den beiden GIN-Indizes
+        filtered_sql = f"""
+            WITH query AS (SELECT websearch_to_tsquery('german', :q) AS tsq),
+            matches AS (
+                SELECT r.id AS report_id, ts_rank_cd(r.search_tsv, query.tsq) AS rank
+                FROM raw_reports r, query
+                WHERE r.search_tsv @@ query.tsq
+                UNION ALL
+                SELECT i.report_id, ts_rank_cd(f.search_tsv, query.tsq)
+                FROM final_reports f
+                JOIN incidents i ON i.id = f.incident_id, query
+                WHERE f.search_tsv @@ query.tsq
+            ),
+            ranked AS (
+                SELECT report_id, max(rank) AS rank FROM matches GROUP BY report_id
+            ),
+            filtered AS (
+                SELECT r.id, r.created_at, ranked.rank
+                FROM ranked
+                JOIN raw_reports r ON r.id = ranked.report_id
+                WHERE {filters}
+            )
+        """
+        order_sql = "rank DESC, id DESC"
+        keyset_sql = "(rank, id) < (CAST(:c_key AS real), CAST(:c_id AS uuid))"
+        snippet_sql = f"""
+            ts_headline('german', r.body, query.tsq, '{HEADLINE_OPTIONS}') AS snippet,
+            (
+                SELECT ts_headline('german', f.body_md, query.tsq, '{HEADLINE_OPTIONS}')
+                FROM final_reports f
+                JOIN incidents i ON i.id = f.incident_id
+                WHERE i.report_id = page.id AND f.search_tsv @@ query.tsq
+                LIMIT 1
+            ) AS final_snippet
+        """
+        from_sql = "page JOIN raw_reports r ON r.id = page.id, query"
+    else:
+        # Ohne Suchbegriff: reine Facettenfilterung, neueste zuerst (idx_raw_reports_created_id)
+        filtered_sql = f"""
+            WITH filtered AS (
+                SELECT r.id, r.created_at, 0.0::real AS rank
+                FROM raw_reports r
+                WHERE {filters}
+            )
+        """
+        order_sql = "created_at DESC, id DESC"
+        keyset_sql = "(created_at, id) < (CAST(:c_key AS timestamptz), CAST(:c_id AS uuid))"
+        snippet_sql = "left(r.body, 200) AS snippet, NULL AS final_snippet"
+        from_sql = "page JOIN raw_reports r ON r.id = page.id"
+
+    if cursor:
+        params["c_key"], params["c_id"] = decode_cursor(cursor, ranked=bool(q))
+    # Eine Zeile mehr holen: zeigt an, ob es eine weitere Seite gibt
+    params["fetch"] = page_size + 1
+
+    hits_query = sa.text(f"""
+        {filtered_sql},
+        page AS (
+            SELECT * FROM filtered
+            WHERE {keyset_sql if cursor else "TRUE"}
+            ORDER BY {order_sql}
+            LIMIT :fetch
+        )
+        SELECT
+            page.id, r.title, page.created_at, page.rank,
+            {snippet_sql},
+            ARRAY(
+                SELECT DISTINCT i.incident_type FROM incidents i WHERE i.report_id = page.id
+            ) AS incident_types
+        FROM {from_sql}
+        ORDER BY {", ".join("page." + part for part in order_sql.split(", "))}
+    """)
+
+    count_query = sa.text(f"""
+        {filtered_sql}
+        SELECT count(*) FROM (SELECT 1 FROM filtered LIMIT :count_cap) capped
+    """)
+
+    facets_query = sa.text(f"""
+        {filtered_sql}
+        SELECT i.incident_type, count(DISTINCT i.report_id) AS n
+        FROM filtered
+        JOIN incidents i ON i.report_id = filtered.id
+        GROUP BY i.incident_type
+        ORDER BY n DESC
+    """)
+
+    if q:
+        filter_params["q"] = q
+    bind = bind or engine
+    with bind.connect() as conn:
+        rows = conn.execute(hits_query, params).mappings().fetchall()
+        total = None
+        if not cursor:
+            total = conn.execute(count_query, {**filter_params, "count_cap": SEARCH_COUNT_CAP + 1}).scalar_one()
+        facets = {}
+        if with_facets:
+            facets = {
+                r["incident_type"]: r["n"]
+                for r in conn.execute(facets_query, filter_params).mappings()
+            }
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(last["rank"] if q else last["created_at"], last["id"])
+
+    return {
+        "query": q,
+        "page_size": page_size,
+        # Nur auf der ersten Seite; total_exact=False heißt "mehr als SEARCH_COUNT_CAP"
+        "total": min(total, SEARCH_COUNT_CAP) if total is not None else None,
+        "total_exact": total is not None and total <= SEARCH_COUNT_CAP,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+        "hits": [
+            {
+                "id": str(r["id"]),
+                "title": r["title"] or "Unbenannter Bericht",
+                "date": r["created_at"],
+                "rank": float(r["rank"] or 0.0),
+                "incident_types": list(r["incident_types"] or []),
+                "snippet": _safe_snippet(r["snippet"]),
+                "final_report_snippet": _safe_snippet(r["final_snippet"]),
+            }
+            for r in rows
+        ],
+        "facets": {"incident_types": facets} if with_facets else {},
+    }
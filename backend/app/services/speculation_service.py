@@ -0,0 +1,251 @@
+# app/services/speculation_service.py
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date
+from typing import Optional
+
+from app.services.extraction_service import extract_answer, ExtractionResult
+from app.services.llm_scheduler import llm_context, scheduler
+from app.services.passage_service import PassageSelector
+from app.services.text_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: Extraktion für wahrscheinliche Typen schon während der Klassifikation starten
+SPECULATIVE_EXTRACTION = os.getenv("SPECULATIVE_EXTRACTION", "0") == "1"
+# Höchstens so viele Typen spekulativ vorziehen
+SPECULATIVE_MAX_TYPES = int(os.getenv("SPECULATIVE_MAX_TYPES", "1"))
+# Mindestanzahl Stichwort-Treffer, damit ein Typ als wahrscheinlich gilt
+SPECULATIVE_MIN_SCORE = int(os.getenv("SPECULATIVE_MIN_SCORE", "2"))
+# Obergrenze spekulativer LLM-Aufrufe pro Request (begrenzt verschwendete Arbeit)
+SPECULATIVE_MAX_CALLS = int(os.getenv("SPECULATIVE_MAX_CALLS", "6"))
+
+_QUOTED_RE = re.compile(r'"([^"]{3,80})"')
+
+
+# ---------------------------------------------------------------------------
+# Billiges lokales Signal: Stichwort-Treffer aus den Typbeschreibungen
+# ---------------------------------------------------------------------------
+
+_keyword_cache: dict[str, list[tuple[str, ...]]] = {}
+
+
+def _keywords_for(incident_type: dict) -> list[tuple[str, ...]]:
+    """Zitierte Begriffe aus der Beschreibung (z.B. "aufgebrochen") plus Typname, gestemmt."""
+    desc = incident_type.get("desc") or ""
+    cache_key = f"{incident_type['code']}:{hash(desc)}"
+    if cache_key not in _keyword_cache:
+        phrases = _QUOTED_RE.findall(desc) + [incident_type.get("name") or ""]
+        keywords = []
+        for phrase in phrases:
+            tokens = tuple(tokenize(phrase))
+            # Ganze Beispielsätze sind als Signal zu spezifisch
+            if tokens and len(tokens) <= 3:
+                keywords.append(tokens)
+        _keyword_cache[cache_key] = keywords
+    return _keyword_cache[cache_key]
+
+
+def score_types(text: str, incident_types: list[dict]) -> list[tuple[str, int]]:
+    """Anzahl der Stichwort-Treffer pro Typ, absteigend sortiert."""
+    tokens = tokenize(text)
+    token_set = set(tokens)
+    joined = " " + " ".join(tokens) + " "
+
+    scores = []
+    for t in incident_types:
+        score = 0
+        for kw in _keywords_for(t):
+            if len(kw) == 1:
+                score += kw[0] in token_set
+            else:
+                score += (" " + " ".join(kw) + " ") in joined
+        if score:
+            scores.append((t["code"], score))
+    return sorted(scores, key=lambda x: x[1], reverse=True)
+
+
+def predict_types(text: str, incident_types: list[dict]) -> list[str]:
+    return [
+        code for code, score in score_types(text, incident_types)
+        if score >= SPECULATIVE_MIN_SCORE
+    ][:SPECULATIVE_MAX_TYPES]
+
+
+# ---------------------------------------------------------------------------
+# Metriken (prozessweit)
+# ---------------------------------------------------------------------------
+
+class SpeculationMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.predicted_types = 0
+        self.confirmed_types = 0
+        self.calls_started = 0
+        self.calls_used = 0
+        self.calls_wasted = 0
+        self.wasted_ms = 0
+
+    def record(self, summary: dict) -> None:
+        with self._lock:
+            self.requests += 1
+            self.predicted_types += len(summary["predicted"])
+            self.confirmed_types += len(summary["confirmed"])
+            self.calls_started += summary["calls_started"]
+            self.calls_used += summary["calls_used"]
+            self.calls_wasted += summary["calls_wasted"]
+            self.wasted_ms += summary["wasted_ms"]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "predicted_types": self.predicted_types,
+                "confirmed_types": self.confirmed_types,
+                "hit_rate": (self.confirmed_types / self.predicted_types) if self.predicted_types else None,
+                "calls_started": self.calls_started,
+                "calls_used": self.calls_used,
+                "calls_wasted": self.calls_wasted,
+                "wasted_ms": self.wasted_ms,
+            }
+
+
+speculation_metrics = SpeculationMetrics()
+
+
+# ---------------------------------------------------------------------------
+# Spekulative Ausführung
+# ---------------------------------------------------------------------------
+
+class SpeculativeExtraction:
+    """
+    Startet pro vorhergesagtem Typ einen Task, der dessen Fragen nacheinander
+    beantwortet (so konkurriert die Spekulation höchstens mit einem Aufruf
+    pro Typ um Ollama). Nach der Klassifikation werden bestätigte Typen
+    übernommen und alle anderen abgebrochen.
+    """
+
+    def __init__(
+        self,
+        text: str,
+        predicted: list[str],
+        questions: list[dict],
+        *,
+        model_name: str,
+        base_url: str,
+        reference_date: Optional[date] = None,
+    ):
+        self.text = text
+        # Wie im normalen Pfad: Bezugsdatum für relative Angaben ("gestern")
+        self.reference_date = reference_date
+        self.passages = PassageSelector(text)
+        self.predicted = predicted
+        self.results: dict[tuple[str, str], ExtractionResult] = {}
+        self.calls_started = 0
+        self.tasks: dict[str, asyncio.Task] = {}
+        self._started_at: dict[tuple[str, str], float] = {}
+
+        by_type: dict[str, list[dict]] = {}
+        for q in questions:
+            by_type.setdefault(q["incident_type"], []).append(q)
+
+        budget = SPECULATIVE_MAX_CALLS
+        for code in predicted:
+            type_questions = by_type.get(code, [])[:budget]
+            budget -= len(type_questions)
+            if type_questions:
+                # Eigene, niedrigere Priorität: echte interaktive Anfragen gehen vor
+                with llm_context("speculative"):
+                    self.tasks[code] = asyncio.create_task(
+                        self._run_type(type_questions, model_name=model_name, base_url=base_url)
+                    )
+
+    @classmethod
+    def start(
+        cls,
+        text: str,
+        incident_types: list[dict],
+        *,
+        load_questions,
+        model_name: str,
+        base_url: str,
+        reference_date: Optional[date] = None,
+    ) -> Optional["SpeculativeExtraction"]:
+        if scheduler.max_concurrency <= 1:
+            # Mit nur einem Slot kann nichts parallel zur Klassifikation laufen
+            logger.debug("Spekulative Extraktion übersprungen: LLM_MAX_CONCURRENCY=1")
+            return None
+        predicted = predict_types(text, incident_types)
+        if not predicted:
+            return None
+        logger.info("Spekulative Extraktion für %s", predicted)
+        return cls(
+            text, predicted, load_questions(predicted),
+            model_name=model_name, base_url=base_url, reference_date=reference_date,
+        )
+
+    async def _run_type(self, questions: list[dict], *, model_name: str, base_url: str) -> None:
+        for q in questions:
+            key = (q["incident_type"], q["question_key"])
+            self.calls_started += 1
+            self._started_at[key] = time.monotonic()
+            result = await extract_answer(
+                self.text, q, model_name=model_name, base_url=base_url, passages=self.passages,
+                reference_date=self.reference_date,
+            )
+            if result.prompt is None:
+                # Regel-Antwort ohne LLM-Aufruf: zählt weder als gestartet noch als verschwendet
+                self.calls_started -= 1
+                del self._started_at[key]
+            result.meta["speculative"] = True
+            self.results[key] = result
+
+    async def resolve(self, confirmed_types: list[str]) -> dict:
+        """Wartet auf bestätigte Typen, bricht den Rest ab und liefert eine Zusammenfassung."""
+        confirmed = [c for c in self.predicted if c in confirmed_types]
+        wasted_ms = 0
+
+        for code, task in self.tasks.items():
+            if code in confirmed:
+                try:
+                    await task
+                except Exception as e:
+                    logger.warning("Spekulative Extraktion für %s fehlgeschlagen: %r", code, e)
+            else:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+        now = time.monotonic()
+        used = 0
+        for (code, key), started in self._started_at.items():
+            if code in confirmed and (code, key) in self.results:
+                used += 1
+                continue
+            # Verworfen: abgeschlossene Aufrufe mit ihrer Latenz, laufende bis jetzt
+            result = self.results.pop((code, key), None)
+            if result is not None and result.latency_ms is not None:
+                wasted_ms += result.latency_ms
+            else:
+                wasted_ms += int((now - started) * 1000)
+
+        summary = {
+            "predicted": self.predicted,
+            "confirmed": confirmed,
+            "calls_started": self.calls_started,
+            "calls_used": used,
+            "calls_wasted": self.calls_started - used,
+            "wasted_ms": wasted_ms,
+        }
+        speculation_metrics.record(summary)
+        return summary
+
+    def take(self, incident_type: str, question_key: str) -> Optional[ExtractionResult]:
+        return self.results.pop((incident_type, question_key), None)
@@ -0,0 +1,87 @@
+# app/services/text_index.py
+import math
+import re
+from collections import Counter
+
+# Kleine deutsche Stoppwortliste – reicht für Ranking, kein Linguistik-Anspruch
+STOPWORDS = {
+    "der", "die", "das", "den", "dem", "des", "ein", "eine", "einer", "eines", "einem", "einen",
+    "und", "oder", "aber", "mit", "von", "vom", "zu", "zum", "zur", "im", "in", "ins", "am", "an",
+    "auf", "aus", "bei", "für", "über", "unter", "nach", "vor", "um", "als", "wie", "so", "es",
+    "er", "sie", "wir", "ihr", "ich", "du", "sich", "ist", "sind", "war", "waren", "wurde",
+    "wurden", "hat", "haben", "hatte", "hatten", "wird", "werden", "nicht", "kein", "keine",
+    "auch", "noch", "dass", "daß", "da", "dann", "nur", "sehr", "schon", "gegen", "durch",
+    "dieser", "diese", "dieses", "seine", "sein", "seiner", "ihre", "ihrem", "ihren",
+}
+
+_TOKEN_RE = re.compile(r"[0-9a-zäöüß]+")
+_SUFFIXES = ("ungen", "ung", "en", "er", "es", "e", "n", "s")
+
+
+def stem(token: str) -> str:
+    """Sehr leichtes Suffix-Stripping, damit z.B. 'Zelle'/'Zellen' oder 'Tür'/'Türen' zusammenfallen."""
+    for suffix in _SUFFIXES:
+        if len(token) - len(suffix) >= 3 and token.endswith(suffix):
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        stem(t)
+        for t in _TOKEN_RE.findall((text or "").lower())
+        if t not in STOPWORDS and len(t) > 1
+    ]
+
+
+class BM25Index:
+    """
+    Minimaler In-Memory-BM25-Index. Dokumente werden einmal tokenisiert,
+    Abfragen kosten nur Zählungen über die Abfrage-Terme.
+    """
+
+    def __init__(self, documents: list[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(doc)) for doc in documents]
+        self.doc_lens = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_len = (sum(self.doc_lens) / len(self.doc_lens)) if self.doc_lens else 0.0
+
+        doc_freq: Counter = Counter()
+        for tf in self.term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(documents)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.term_freqs)
+
+    def scores(self, query: str | list[str]) -> list[float]:
+        terms = tokenize(query) if isinstance(query, str) else query
+        terms = [t for t in set(terms) if t in self.idf]
+        result = []
+        for tf, length in zip(self.term_freqs, self.doc_lens):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_len or 1.0))
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            result.append(score)
+        return result
+
+    def top_k(self, query: str | list[str], k: int) -> list[tuple[int, float]]:
+        """Indizes und Scores der k besten Dokumente (Score > 0)."""
+        ranked = sorted(enumerate(self.scores(query)), key=lambda x: x[1], reverse=True)
+        return [(i, s) for i, s in ranked[:k] if s > 0]
+
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def split_sentences(text: str) -> list[str]:
+    """Zerlegt Text in Sätze bzw. Zeilen (Transkripte haben oft keine Satzzeichen)."""
+    return [s.strip() for s in _SENTENCE_RE.split(text or "") if s and s.strip()]
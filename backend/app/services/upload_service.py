@@ -0,0 +1,414 @@
+# app/services/upload_service.py
+import asyncio
+import logging
+import os
+import re
+import tempfile
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Iterator, Optional
+from xml.etree import ElementTree
+
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from app.db.session import SessionLocal
+from app.models.db_models import RawReport
+from app.services.persistence_service import create_raw_report
+from app.services.analysis_pipeline import run_analysis, StageFailed
+from app.services.llm_scheduler import llm_context
+
+logger = logging.getLogger(__name__)
+
+# Obergrenze pro Datei; wird schon beim Empfang geprüft
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+# Verzeichnis für Zwischendateien (leer = System-Temp)
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None
+# Spielraum für Multipart-Rahmen (Boundary, Part-Header, Textfelder) beim Content-Length-Check
+UPLOAD_MULTIPART_OVERHEAD = 64 * 1024
+UPLOAD_MAX_PARTS = 10
+# Berichte pro Commit beim Einfügen
+UPLOAD_INSERT_BATCH = int(os.getenv("UPLOAD_INSERT_BATCH", "50"))
+# Kürzere Abschnitte (z.B. Leerzeilen zwischen Trennern) werden verworfen
+UPLOAD_MIN_REPORT_CHARS = int(os.getenv("UPLOAD_MIN_REPORT_CHARS", "20"))
+# Gleichzeitige Analysen pro Upload (LLM-Slots vergibt ohnehin der Scheduler)
+UPLOAD_ANALYZE_CONCURRENCY = int(os.getenv("UPLOAD_ANALYZE_CONCURRENCY", "1"))
+# Trennzeilen zwischen Berichten einer Schichtexport-Datei
+UPLOAD_SEPARATOR_PATTERN = re.compile(
+    os.getenv("UPLOAD_SEPARATOR_PATTERN", r"^\s*(?:-{3,}|={3,}|\*{3,}|_{3,})\s*$")
+)
+# Kopfzeilen, mit denen ein neuer Bericht beginnt (Zeile bleibt Teil des Berichts)
+UPLOAD_HEADER_PATTERN = re.compile(
+    os.getenv("UPLOAD_HEADER_PATTERN", r"^\s*(?:Bericht|Meldung|Einsatzbericht|Vorfall)\s*(?:Nr\.?|#)\s*\d+"),
+    re.IGNORECASE,
+)
+
+SUPPORTED_KINDS = {".txt": "txt", ".text": "txt", ".md": "txt", ".docx": "docx", ".pdf": "pdf"}
+_CONTENT_TYPES = {
+    "text/plain": "txt",
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+}
+
+# PDF-Extraktion ist CPU-lastig -> eigener Prozess, blockiert weder Event-Loop noch GIL
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+# Laufende Hintergrund-Analysen pro Upload
+_tasks: dict[uuid.UUID, asyncio.Task] = {}
+
+
+class UploadError(Exception):
+    def __init__(self, status_code: int, msg: str):
+        super().__init__(msg)
+        self.status_code = status_code
+
+
+def detect_kind(filename: Optional[str], content_type: Optional[str] = None) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    kind = SUPPORTED_KINDS.get(ext) or _CONTENT_TYPES.get((content_type or "").split(";")[0].strip())
+    if kind is None:
+        raise UploadError(415, f"Dateityp nicht unterstützt: {filename or content_type}")
+    return kind
+
+
+# ---------------------------------------------------------------------------
+# Empfang: Body in Blöcken in eine Temp-Datei schreiben
+# ---------------------------------------------------------------------------
+
+async def save_stream(chunks: AsyncIterator[bytes], suffix: str = "") -> str:
+    """Schreibt den Upload blockweise auf die Platte; nie mehr als ein Block im Speicher."""
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="sepj-upload-", dir=UPLOAD_TMP_DIR)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise UploadError(413, f"Datei größer als {UPLOAD_MAX_BYTES} Bytes")
+                await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+def check_content_length(value: Optional[str], *, multipart: bool = False) -> None:
+    """413 schon vor dem Empfang, wenn der Client die Größe ansagt."""
+    try:
+        length = int(value) if value else None
+    except ValueError:
+        raise UploadError(400, "Ungültiger Content-Length-Header")
+    limit = UPLOAD_MAX_BYTES + (UPLOAD_MULTIPART_OVERHEAD if multipart else 0)
+    if length is not None and length > limit:
+        raise UploadError(413, f"Datei größer als {UPLOAD_MAX_BYTES} Bytes")
+
+
+class _FilePart:
+    """
+    Callbacks für python-multipart: Daten des ersten Datei-Felds "file" werden
+    gesammelt und nach jedem Block weitergereicht, alles andere verworfen.
+    """
+
+    def __init__(self):
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.pending: list[bytes] = []
+        self.parts = 0
+        self._headers: dict[bytes, bytes] = {}
+        self._field, self._value = b"", b""
+        self._in_file = False
+        self._done = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self) -> None:
+        self.parts += 1
+        if self.parts > UPLOAD_MAX_PARTS:
+            raise UploadError(400, "Zu viele Felder im Formular")
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._in_file = not self._done and options.get(b"name") == b"file" and b"filename" in options
+        if self._in_file:
+            self.filename = options[b"filename"].decode("utf-8", "replace") or None
+            self.content_type = self._headers.get(b"content-type", b"").decode("latin-1") or None
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self.pending.append(data[start:end])
+
+    def on_part_end(self) -> None:
+        if self._in_file:
+            self._in_file, self._done = False, True
+
+
+async def save_multipart(chunks: AsyncIterator[bytes], content_type: str, *, filename: Optional[str] = None) -> tuple[str, str, str]:
+    """
+    Liest multipart/form-data direkt vom Request-Stream und schreibt das Feld
+    "file" über save_stream auf die Platte. Die Größengrenze greift damit schon
+    beim Empfang (kein Spoolen durch Starlette vorab). Gibt (Pfad, Name, Typ) zurück.
+    """
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise UploadError(400, "Multipart ohne Boundary")
+    part = _FilePart()
+    parser = MultipartParser(boundary, part.callbacks())
+    kind: Optional[str] = None
+
+    async def _file_chunks():
+        nonlocal kind
+        async for chunk in chunks:
+            try:
+                parser.write(chunk)
+            except MultipartParseError as e:
+                raise UploadError(400, f"Ungültiges Multipart-Format: {e}")
+            if part.filename is not None and kind is None:
+                # Dateityp prüfen, sobald die Part-Header da sind, nicht erst am Ende
+                kind = detect_kind(part.filename or filename, part.content_type)
+            while part.pending:
+                yield part.pending.pop(0)
+        parser.finalize()
+
+    path = await save_stream(_file_chunks())
+    if part.filename is None:
+        os.unlink(path)
+        raise UploadError(400, "Feld 'file' fehlt")
+    return path, part.filename or filename or "upload", kind
+
+
+# ---------------------------------------------------------------------------
+# Textextraktion (zeilenweise, damit große Dateien flach im Speicher bleiben)
+# ---------------------------------------------------------------------------
+
+def _detect_encoding(path: str) -> str:
+    with open(path, "rb") as f:
+        try:
+            for line in f:
+                line.decode("utf-8")
+        except UnicodeDecodeError:
+            return "cp1252"
+    return "utf-8-sig"
+
+
+def iter_txt_lines(path: str) -> Iterator[str]:
+    encoding = _detect_encoding(path)
+    with open(path, encoding=encoding, errors="replace", newline=None) as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def iter_docx_lines(path: str) -> Iterator[str]:
+    """Absätze aus word/document.xml; Seitenumbrüche werden als \\f ausgegeben."""
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        raise UploadError(400, "Ungültige DOCX-Datei")
+    with archive, archive.open("word/document.xml") as xml:
+        for _, elem in ElementTree.iterparse(xml, events=("end",)):
+            if elem.tag != f"{_W}p":
+                continue
+            parts = []
+            for node in elem.iter():
+                if node.tag == f"{_W}t" and node.text:
+                    parts.append(node.text)
+                elif node.tag == f"{_W}tab":
+                    parts.append("\t")
+                elif node.tag == f"{_W}br":
+                    parts.append("\f" if node.get(f"{_W}type") == "page" else "\n")
+            elem.clear()
+            yield from "".join(parts).split("\n")
+
+
+def _pdf_to_txt(path: str, out_path: str) -> int:
+    """Läuft im Prozess-Pool: schreibt den Text Seite für Seite in out_path."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    with open(out_path, "w", encoding="utf-8") as out:
+        for page in reader.pages:
+            out.write(page.extract_text() or "")
+            out.write("\n")
+    return len(reader.pages)
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(max_workers=1)
+    return _pdf_pool
+
+
+async def pdf_to_txt(path: str) -> str:
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        raise UploadError(415, "PDF-Import nicht verfügbar (pypdf fehlt)")
+    fd, out_path = tempfile.mkstemp(suffix=".txt", prefix="sepj-upload-", dir=UPLOAD_TMP_DIR)
+    os.close(fd)
+    try:
+        pages = await asyncio.get_running_loop().run_in_executor(_get_pdf_pool(), _pdf_to_txt, path, out_path)
+    except Exception as e:
+        os.unlink(out_path)
+        raise UploadError(400, f"PDF konnte nicht gelesen werden: {e}")
+    logger.info("PDF %s: %s Seiten extrahiert", path, pages)
+    return out_path
+
+
+def shutdown_pdf_pool() -> None:
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+
+# ---------------------------------------------------------------------------
+# Aufteilen in einzelne Berichte
+# ---------------------------------------------------------------------------
+
+def split_reports(lines: Iterator[str]) -> Iterator[str]:
+    """
+    Trennt an Trennzeilen (---, ===, ***), Seitenvorschüben und Kopfzeilen
+    wie "Bericht Nr. 12". Es liegt immer nur ein Bericht im Speicher.
+    """
+    buffer: list[str] = []
+
+    def flush() -> Optional[str]:
+        text = "\n".join(buffer).strip()
+        buffer.clear()
+        return text if len(text) >= UPLOAD_MIN_REPORT_CHARS else None
+
+    for raw in lines:
+        segments = raw.split("\f")
+        for i, line in enumerate(segments):
+            if i > 0 or UPLOAD_SEPARATOR_PATTERN.match(line):
+                text = flush()
+                if text:
+                    yield text
+                if i == 0:
+                    continue
+            elif UPLOAD_HEADER_PATTERN.match(line) and any(l.strip() for l in buffer):
+                text = flush()
+                if text:
+                    yield text
+            buffer.append(line)
+    text = flush()
+    if text:
+        yield text
+
+
+def _title_for(text: str, filename: str, n: int) -> str:
+    first = text.split("\n", 1)[0].strip()
+    return first[:200] if first else f"{filename} #{n}"
+
+
+def _iter_lines(kind: str, path: str) -> Iterator[str]:
+    if kind == "docx":
+        return iter_docx_lines(path)
+    return iter_txt_lines(path)
+
+
+def ingest_file(path: str, kind: str, *, filename: str, created_by: Optional[str] = None) -> list[uuid.UUID]:
+    """Synchron (im Worker-Thread): liest, teilt und speichert die Berichte batchweise."""
+    ids: list[uuid.UUID] = []
+    db = SessionLocal()
+    try:
+        for n, text in enumerate(split_reports(_iter_lines(kind, path)), start=1):
+            report = create_raw_report(
+                db,
+                text=text,
+                title=_title_for(text, filename, n),
+                source=f"upload:{filename}",
+                language="de",
+                created_by=created_by,
+            )
+            ids.append(report.id)
+            if n % UPLOAD_INSERT_BATCH == 0:
+                db.commit()
+                db.expunge_all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return ids
+
+
+async def ingest_upload(path: str, *, filename: str, kind: str, created_by: Optional[str] = None) -> list[uuid.UUID]:
+    text_path = path
+    try:
+        if kind == "pdf":
+            text_path = await pdf_to_txt(path)
+            kind = "txt"
+        return await asyncio.to_thread(ingest_file, text_path, kind, filename=filename, created_by=created_by)
+    finally:
+        for p in {path, text_path}:
+            try:
+                os.unlink(p)
+            except FileNotFoundError:
+                pass
+
+
+# ---------------------------------------------------------------------------
+# Analyse der importierten Berichte
+# ---------------------------------------------------------------------------
+
+async def _analyze_one(report_id: uuid.UUID) -> None:
+    db = SessionLocal()
+    try:
+        raw_report = db.get(RawReport, report_id)
+        if raw_report is not None:
+            await run_analysis(db, raw_report)
+    except StageFailed as e:
+        # Stufe ist gespeichert -> per /api/llm/analyze/{id}/retry fortsetzbar
+        logger.warning("Upload-Analyse %s fehlgeschlagen in %s: %s", report_id, e.stage, e)
+    except Exception:
+        logger.exception("Upload-Analyse %s fehlgeschlagen", report_id)
+    finally:
+        db.close()
+
+
+async def _analyze_all(upload_id: uuid.UUID, report_ids: list[uuid.UUID]) -> None:
+    sem = asyncio.Semaphore(max(1, UPLOAD_ANALYZE_CONCURRENCY))
+
+    async def run(report_id):
+        async with sem:
+            await _analyze_one(report_id)
+
+    with llm_context("backfill", f"upload:{upload_id}"):
+        await asyncio.gather(*(run(r) for r in report_ids))
+    logger.info("Upload %s: %s Berichte analysiert", upload_id, len(report_ids))
+
+
+def schedule_analysis(upload_id: uuid.UUID, report_ids: list[uuid.UUID]) -> None:
+    task = asyncio.get_running_loop().create_task(_analyze_all(upload_id, report_ids))
+    _tasks[upload_id] = task
+    task.add_done_callback(lambda _: _tasks.pop(upload_id, None))
+
+
+def pending_uploads() -> list[str]:
+    return [str(u) for u, t in _tasks.items() if not t.done()]
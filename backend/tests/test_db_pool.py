@@ -0,0 +1,44 @@
+"""Pool-Erschöpfung der Engine-Factory (create_db_engine), ohne Postgres über SQLite."""
+import time
+
+import pytest
+from sqlalchemy import exc, text
+
+from app.db.session import create_db_engine, pool_stats
+
+
+@pytest.fixture
+def small_pool(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "1")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("DB_POOL_TIMEOUT", "0.1")
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    yield engine
+    engine.dispose()
+
+
+def test_pool_settings_from_env(small_pool):
+    stats = pool_stats(small_pool)
+    assert stats["size"] == 1
+    assert stats["max_overflow"] == 0
+    assert stats["timeout"] == pytest.approx(0.1)
+
+
+def test_exhausted_pool_times_out(small_pool):
+    with small_pool.connect() as held:
+        held.execute(text("SELECT 1"))
+        start = time.monotonic()
+        with pytest.raises(exc.TimeoutError):
+            small_pool.connect()
+        waited = time.monotonic() - start
+    assert 0.05 <= waited < 2
+    assert pool_stats(small_pool)["checkedout"] == 0
+
+
+def test_pool_usable_after_timeout(small_pool):
+    with small_pool.connect():
+        with pytest.raises(exc.TimeoutError):
+            small_pool.connect()
+    with small_pool.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+    assert pool_stats(small_pool)["checkouts"] >= 2
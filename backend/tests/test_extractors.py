@@ -0,0 +1,100 @@
+"""Regel-Extraktoren (app/services/extractors.py): reine Funktionen, tabellengetrieben."""
+from datetime import date
+
+import pytest
+
+from app.services.extractors import (
+    RULE_MIN_CONFIDENCE,
+    extract_datetime,
+    extract_location,
+    extract_number,
+    extract_person_count,
+    extract_typed,
+)
+
+REF = date(2024, 5, 10)
+ITEMS = {"label": "Wie viele Gegenstände wurden gefunden?", "answer_type": "number"}
+LAPTOPS = {"label": "Wie viele Laptops fehlen?", "answer_type": "number"}
+BARE = {"label": "Wie viele?", "answer_type": "number"}
+
+
+@pytest.mark.parametrize("text, question, value, sure", [
+    ("Es wurden 3 Gegenstände gefunden.", ITEMS, 3, True),
+    ("Es wurden drei verdächtige Gegenstände gefunden.", ITEMS, 3, True),
+    ("Aus dem Container fehlen vier Laptops.", LAPTOPS, 4, True),
+    ("In Zelle 12 wurden 2 Gegenstände gefunden.", ITEMS, 2, True),
+    # Falsch-Positive: Zahl ohne Bezug zum gefragten Nomen
+    ("In Zelle 12 wurden Gegenstände gefunden.", ITEMS, 12, False),
+    ("Am Tor 3 fehlten Laptops.", LAPTOPS, 3, False),
+    ("Es waren 5 Personen anwesend.", ITEMS, 5, False),
+    ("Es wurden 3 Gegenstände gefunden.", BARE, 3, False),
+    ("Es wurden 3 Gegenstände und 4 Gegenstände gefunden.", ITEMS, 3, False),
+])
+def test_extract_number(text, question, value, sure):
+    typed = extract_number(text, question, REF)
+    assert typed is not None and typed.value == value
+    assert (typed.confidence >= RULE_MIN_CONFIDENCE) is sure
+
+
+@pytest.mark.parametrize("text", [
+    "Keine Angaben zur Menge.",
+    "Am 03.05.2024 um 14:30 Uhr wurde ein Gegenstand gefunden.",
+])
+def test_extract_number_none(text):
+    assert extract_number(text, ITEMS, REF) is None
+
+
+WHEN = {"label": "Wann passierte es?", "answer_type": "datetime"}
+
+
+@pytest.mark.parametrize("text, value, sure", [
+    ("Am 03.05.2024 um 14:30 Uhr brannte es.", {"date": "2024-05-03", "time": "14:30"}, True),
+    ("Gestern gegen 23 Uhr brannte es.", {"date": "2024-05-09", "time": "23:00"}, True),
+    ("Am 3. Mai brannte es.", {"date": "2024-05-03", "time": None}, True),
+    # Nur Uhrzeit: kein Ersatz für die LLM-Antwort
+    ("Gegen 23 Uhr brannte es.", {"date": None, "time": "23:00"}, False),
+    ("Um 14:30 wurde der Alarm ausgelöst.", {"date": None, "time": "14:30"}, False),
+    ("Am 03.05. und am 04.05. brannte es.", {"date": "2024-05-03", "time": None}, False),
+])
+def test_extract_datetime(text, value, sure):
+    typed = extract_datetime(text, WHEN, REF)
+    assert typed is not None and typed.value == value
+    assert (typed.confidence >= RULE_MIN_CONFIDENCE) is sure
+
+
+@pytest.mark.parametrize("text, value, sure", [
+    ("Brand in der Hauptstraße 12.", "Hauptstraße 12", True),
+    ("Unfall am Bahnhofsplatz.", "Bahnhofsplatz", True),
+    ("Einbruch im Lager 3.", "Lager 3", True),
+    ("Er war im Dienst.", "Dienst", False),
+    ("Sie stand im Regen.", "Regen", False),
+    ("Einbruch im Lager 3 und in der Hauptstraße 12.", "Lager 3", False),
+])
+def test_extract_location(text, value, sure):
+    typed = extract_location(text, {"label": "Wo passierte es?"}, REF)
+    assert typed is not None and typed.value == value
+    assert (typed.confidence >= RULE_MIN_CONFIDENCE) is sure
+
+
+@pytest.mark.parametrize("text, value", [
+    ("Zwei Insassen gerieten in Streit.", 2),
+    ("Es wurden 3 verletzte Personen versorgt.", 3),
+])
+def test_extract_person_count(text, value):
+    typed = extract_person_count(text, {"label": "Wie viele Personen?"}, REF)
+    assert typed is not None and typed.value == value
+    assert typed.confidence >= RULE_MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("text, question", [
+    ("In Zelle 12 wurden Gegenstände gefunden.", ITEMS),
+    ("Gegen 23 Uhr brannte es.", WHEN),
+    ("Er war im Dienst.", {"label": "Wo passierte es?", "answer_type": "location"}),
+])
+def test_extract_typed_leaves_unsure_answers_to_llm(text, question):
+    assert extract_typed(text, question, REF) is None
+
+
+def test_extract_typed_accepts_sure_answer():
+    typed = extract_typed("Es wurden 3 Gegenstände gefunden.", ITEMS, REF)
+    assert typed is not None and typed.value == 3
@@ -0,0 +1,84 @@
+"""
+Delta-Sync der History (?since=, app/routes/reports.py). Der Paging-Test
+braucht eine initialisierte Datenbank (db/sepj_init.sql):
+
+    TEST_DATABASE_URL=postgresql+psycopg://... python -m pytest tests/test_history_sync.py
+"""
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.http_cache import HISTORY_CURSOR_SKEW_S, decode_cursor, encode_cursor
+
+needs_db = pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL nicht gesetzt")
+
+
+def test_sync_cursor_overlaps_by_skew():
+    ts = datetime(2024, 5, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor(ts)) == (ts - timedelta(seconds=HISTORY_CURSOR_SKEW_S), None)
+
+
+def test_page_cursor_is_exact():
+    ts = datetime(2024, 5, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+    report_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(ts, report_id)) == (ts, report_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "gestern", "20240501T120000.000000Z~kein-uuid"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(HTTPException):
+        decode_cursor(cursor)
+
+
+@needs_db
+def test_since_pages_through_more_updates_than_limit():
+    from fastapi.testclient import TestClient
+    from sqlalchemy import text
+
+    from app.db.session import engine
+    from app.main import app
+
+    limit, count = 5, 13
+    # Alle mit demselben updated_at (schlimmster Fall, z.B. Backfill), in der Zukunft
+    # damit andere Zeilen der Test-DB nicht dazwischenkommen
+    updated_at = datetime.now(timezone.utc) + timedelta(days=1)
+    with engine.begin() as conn:
+        ids = {
+            conn.execute(
+                text("INSERT INTO raw_reports (title, body) VALUES ('History-Test', 'Text') RETURNING id")
+            ).scalar()
+            for _ in range(count)
+        }
+        for report_id in ids:
+            conn.execute(text("""
+                INSERT INTO report_summaries (report_id, created_at, title, preview, updated_at)
+                VALUES (:id, now(), 'History-Test', '', :updated_at)
+            """), {"id": report_id, "updated_at": updated_at})
+
+    try:
+        client = TestClient(app)
+        cursor = encode_cursor(updated_at - timedelta(minutes=1))
+        seen, pages = set(), 0
+        while True:
+            response = client.get("/api/reports/history", params={"since": cursor, "limit": limit})
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page) <= limit
+            seen.update(uuid.UUID(r["id"]) for r in page)
+            cursor = response.headers["X-History-Cursor"]
+            pages += 1
+            if response.headers.get("X-History-Has-More") != "true":
+                break
+            assert pages < count
+        assert ids <= seen
+        assert pages == -(-count // limit)
+
+        # Danach: Cursor der letzten Zeile, nur noch die Überlappung (Client dedupliziert per id)
+        response = client.get("/api/reports/history", params={"since": cursor, "limit": count + 1})
+        assert "X-History-Has-More" not in response.headers
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM raw_reports WHERE id = ANY(:ids)"), {"ids": list(ids)})
@@ -0,0 +1,49 @@
+"""history_state wird einmal pro Transaktion beim Commit erhöht (report_summary_service)."""
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+from app.services import report_summary_service
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def _now(dbapi_conn, _):
+        dbapi_conn.create_function("now", 0, lambda: "2024-05-01 12:00:00")
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE history_state (id INTEGER PRIMARY KEY, version INTEGER, updated_at TEXT)"))
+        conn.execute(text("INSERT INTO history_state VALUES (1, 0, NULL)"))
+    session = Session(engine)
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _version(db: Session) -> int:
+    return db.execute(text("SELECT version FROM history_state")).scalar()
+
+
+def test_one_bump_per_commit(db):
+    report_summary_service._bump_history_version(db)
+    report_summary_service._bump_history_version(db)
+    # Vor dem Commit noch unverändert: keine Zeilensperre während der Transaktion
+    assert _version(db) == 0
+    db.commit()
+    assert _version(db) == 1
+    # Commit ohne Änderung an report_summaries erhöht nicht
+    db.execute(text("SELECT 1"))
+    db.commit()
+    assert _version(db) == 1
+
+
+def test_rollback_discards_bump(db):
+    db.execute(text("UPDATE history_state SET updated_at = now()"))
+    report_summary_service._bump_history_version(db)
+    db.rollback()
+    db.execute(text("SELECT 1"))
+    db.commit()
+    assert _version(db) == 0
@@ -0,0 +1,36 @@
+"""Replay-Cache (app/services/llm_replay.py) ohne Datenbank: _load wird ersetzt."""
+import asyncio
+
+import pytest
+
+from app.services import llm_replay
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    loads = []
+
+    def fake_load(digest):
+        loads.append(digest)
+        return None if digest == llm_replay.prompt_hash("fehlt") else {"response": digest[:8]}
+
+    monkeypatch.setattr(llm_replay, "_load", fake_load)
+    monkeypatch.setattr(llm_replay, "_cache", llm_replay.OrderedDict())
+    monkeypatch.setattr(llm_replay, "LLM_REPLAY_CACHE_SIZE", 2)
+    return loads
+
+
+def test_miss_raises_by_default(recorded):
+    assert llm_replay.LLM_REPLAY_MISS == "error"
+    with pytest.raises(llm_replay.ReplayMiss):
+        asyncio.run(llm_replay.lookup("fehlt"))
+
+
+def test_cache_is_bounded_lru(recorded):
+    for prompt in ("a", "b", "a", "c"):
+        asyncio.run(llm_replay.lookup(prompt))
+    # "b" war am längsten unbenutzt und ist verdrängt, "a" blieb im Cache
+    assert list(llm_replay._cache) == [llm_replay.prompt_hash("a"), llm_replay.prompt_hash("c")]
+    asyncio.run(llm_replay.lookup("b"))
+    assert recorded.count(llm_replay.prompt_hash("b")) == 2
+    assert recorded.count(llm_replay.prompt_hash("a")) == 1
@@ -0,0 +1,144 @@
+"""
+Vergabe der LLM-Slots (app/services/llm_scheduler.py). Die globalen Slots
+werden durch FakeSlots ersetzt, damit die Tests ohne Postgres laufen.
+"""
+import asyncio
+
+import pytest
+
+from app.services.llm_scheduler import LLMScheduler
+
+
+class FakeSlots:
+    """Wie _GlobalSlots, aber im Speicher; `taken` simuliert andere Worker."""
+
+    def __init__(self, size: int, taken: int = 0):
+        self.size = size
+        self.free = set(range(taken, size))
+        self.fail = False
+        self.errors = 0
+        self.waits = 0
+        self.acquired: list[int] = []
+        self._event = asyncio.Event()
+
+    async def try_acquire(self, level, since, limit):
+        if self.fail:
+            raise RuntimeError("db down")
+        for slot in sorted(self.free):
+            if slot < limit:
+                self.free.discard(slot)
+                self.acquired.append(level)
+                return slot
+        return None
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
+
+    def poke(self):
+        self._event.set()
+
+    async def release(self, slot):
+        self.free.add(slot)
+        self.poke()
+
+    async def clear_waiting(self):
+        pass
+
+    def snapshot(self):
+        return {"size": self.size}
+
+
+def _scheduler(max_concurrency, reserved, slots: FakeSlots) -> LLMScheduler:
+    sched = LLMScheduler(max_concurrency, reserved, global_slots=True)
+    sched._global = slots
+    return sched
+
+
+async def _run(sched: LLMScheduler, priority: str, order: list, release: asyncio.Event):
+    async with sched.slot(priority, client=priority):
+        order.append(priority)
+        await release.wait()
+
+
+def test_global_slots_require_reserved_interactive():
+    with pytest.raises(ValueError):
+        LLMScheduler(2, 0, global_slots=True)
+    # Ein Slot: nichts zu reservieren
+    assert LLMScheduler(1, 0, global_slots=True).reserved_interactive == 0
+
+
+def test_global_slot_goes_to_highest_priority():
+    async def scenario():
+        slots = FakeSlots(1)
+        sched = _scheduler(1, 0, slots)
+        order, release = [], asyncio.Event()
+        first = asyncio.create_task(_run(sched, "backfill", order, release))
+        await asyncio.sleep(0.01)
+        # Beide warten; der interaktive kommt später, aber zuerst dran
+        waiting = [asyncio.create_task(_run(sched, p, order, release)) for p in ("evaluation", "interactive")]
+        await asyncio.sleep(0.01)
+        assert order == ["backfill"]
+        release.set()
+        await asyncio.gather(first, *waiting)
+        return order
+
+    assert asyncio.run(scenario()) == ["backfill", "interactive", "evaluation"]
+
+
+def test_waiting_for_global_slot_keeps_local_capacity_free():
+    async def scenario():
+        # Alle globalen Slots hält ein anderer Worker
+        slots = FakeSlots(2, taken=2)
+        sched = _scheduler(2, 1, slots)
+        order, release = [], asyncio.Event()
+        task = asyncio.create_task(_run(sched, "backfill", order, release))
+        await asyncio.sleep(0.01)
+        assert sched.in_flight == 0 and order == []
+
+        # Anderer Worker gibt den reservierten Slot frei: nicht für Hintergrundarbeit
+        await slots.release(1)
+        await asyncio.sleep(0.01)
+        assert order == []
+
+        await slots.release(0)
+        await asyncio.sleep(0.01)
+        assert order == ["backfill"] and sched.in_flight == 1
+        release.set()
+        await task
+        return sched.in_flight
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_reserved_slot_for_interactive():
+    async def scenario():
+        slots = FakeSlots(2)
+        sched = _scheduler(2, 1, slots)
+        order, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(_run(sched, p, order, release)) for p in ("backfill", "backfill")]
+        await asyncio.sleep(0.01)
+        # Der zweite Backfill darf den reservierten Slot nicht nehmen
+        assert order == ["backfill"]
+        tasks.append(asyncio.create_task(_run(sched, "interactive", order, release)))
+        await asyncio.sleep(0.01)
+        assert order == ["backfill", "interactive"]
+        release.set()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["backfill", "interactive", "backfill"]
+
+
+def test_db_error_falls_back_to_local_limit():
+    async def scenario():
+        slots = FakeSlots(1)
+        slots.fail = True
+        sched = _scheduler(1, 0, slots)
+        order, release = [], asyncio.Event()
+        release.set()
+        await asyncio.gather(*(_run(sched, "interactive", order, release) for _ in range(3)))
+        return order, slots.errors, sched.in_flight
+
+    order, errors, in_flight = asyncio.run(scenario())
+    assert len(order) == 3 and errors == 3 and in_flight == 0
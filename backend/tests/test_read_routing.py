@@ -0,0 +1,133 @@
+"""
+Lese-Routing auf das Replikat (app/db/routing.py). Braucht zwei Datenbanken
+(conftest.py setzt daraus DATABASE_URL/DATABASE_READ_URL):
+
+    TEST_DATABASE_URL=postgresql+psycopg://.../primary \
+    TEST_DATABASE_READ_URL=postgresql+psycopg://.../replica \
+    python -m pytest tests/test_read_routing.py
+
+Ohne beide Variablen wird das Modul übersprungen; die Routing-Entscheidung
+selbst testet test_read_routing_decision.py ohne Datenbank.
+"""
+import os
+import uuid
+
+import pytest
+
+REPLICA_URL = os.getenv("TEST_DATABASE_READ_URL")
+if not (os.getenv("TEST_DATABASE_URL") and REPLICA_URL):
+    pytest.skip("TEST_DATABASE_URL und TEST_DATABASE_READ_URL nicht gesetzt", allow_module_level=True)
+
+from fastapi import Depends, FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.engine import make_url  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.db import routing  # noqa: E402
+from app.db.session import read_engine  # noqa: E402
+
+
+def _probe_app() -> FastAPI:
+    """Minimale App: ein lesender Endpoint meldet, wohin er gelesen hat."""
+    app = FastAPI()
+    app.add_middleware(routing.ReadAfterWriteMiddleware)
+
+    @app.get("/read")
+    def read(db: Session = Depends(routing.get_read_db)):
+        db.execute(text("SELECT 1")).scalar_one()
+        return {"replica": db.get_bind() is read_engine}
+
+    @app.post("/write")
+    def write():
+        return {"ok": True}
+
+    return app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Lag bei jedem Request prüfen, damit Monkeypatches sofort greifen
+    monkeypatch.setattr(routing, "DB_READ_LAG_CHECK_S", 0.0)
+    routing._recent_writes.clear()
+    routing._lag.update(checked_at=0.0, ok=True, lag_s=None, error=None)
+    routing._stats.clear()
+    with TestClient(_probe_app()) as c:
+        c.headers["X-Client-Id"] = f"test-{uuid.uuid4()}"
+        yield c
+
+
+def _reads_replica(client: TestClient) -> bool:
+    response = client.get("/read")
+    assert response.status_code == 200
+    return response.json()["replica"]
+
+
+def test_replica_configured():
+    assert routing.has_read_replica()
+
+
+def test_reads_go_to_replica(client):
+    assert _reads_replica(client)
+    assert routing._stats["replica"] == 1
+    assert routing.replica_stats()["usable"] is True
+
+
+def test_read_after_write_same_process(client):
+    assert client.post("/write").status_code == 200
+    assert not _reads_replica(client)
+    assert routing._stats["primary_after_write"] == 1
+
+
+def test_read_after_write_other_client_unaffected(client):
+    client.post("/write")
+    client.cookies.clear()
+    other = client.headers["X-Client-Id"] + "-other"
+    response = client.get("/read", headers={"X-Client-Id": other})
+    assert response.json()["replica"]
+
+
+def test_read_after_write_via_cookie(client):
+    response = client.post("/write")
+    assert routing.WRITE_COOKIE in response.cookies
+    # Anderer Worker: kennt den Schreibzugriff nur über das Cookie
+    routing._recent_writes.clear()
+    assert not _reads_replica(client)
+    client.cookies.clear()
+    assert _reads_replica(client)
+
+
+def test_write_cookie_expires(client, monkeypatch):
+    client.post("/write")
+    routing._recent_writes.clear()
+    monkeypatch.setattr(routing, "DB_READ_AFTER_WRITE_S", 0.0)
+    assert _reads_replica(client)
+
+
+def test_lag_fallback(client, monkeypatch):
+    # Jeder Rückstand (auch 0) gilt als zu groß
+    monkeypatch.setattr(routing, "DB_READ_MAX_LAG_S", -1.0)
+    assert not _reads_replica(client)
+    assert routing._stats["primary_lag"] == 1
+    stats = routing.replica_stats()
+    assert stats["usable"] is False and stats["lag_s"] is not None
+
+
+def test_unreachable_replica_fallback(client, monkeypatch):
+    dead_url = make_url(REPLICA_URL).set(host="127.0.0.1", port=1)
+    dead = create_engine(dead_url, connect_args={"connect_timeout": 2})
+    monkeypatch.setattr(routing, "read_engine", dead)
+    try:
+        assert not _reads_replica(client)
+        stats = routing.replica_stats()
+        assert stats["usable"] is False and stats["error"]
+        assert routing._stats["primary_lag"] == 1
+    finally:
+        dead.dispose()
+
+
+def test_replica_recovers(client, monkeypatch):
+    monkeypatch.setattr(routing, "DB_READ_MAX_LAG_S", -1.0)
+    assert not _reads_replica(client)
+    monkeypatch.setattr(routing, "DB_READ_MAX_LAG_S", 2.0)
+    assert _reads_replica(client)
@@ -0,0 +1,119 @@
+"""
+Routing-Entscheidung Replikat/Primär (app/db/routing.py) ohne Datenbank:
+Engines sind Platzhalter, der Lag-Check wird ersetzt.
+"""
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.db import routing
+
+PRIMARY, REPLICA = object(), object()
+
+
+@pytest.fixture
+def lag(monkeypatch):
+    """Steuert den Lag-Check: state["lag_s"] setzen oder state["error"] für Nichterreichbarkeit."""
+    state = {"lag_s": 0.0, "error": None, "calls": 0}
+
+    def fake_check_lag():
+        state["calls"] += 1
+        if state["error"]:
+            raise state["error"]
+        routing._lag.update(lag_s=state["lag_s"], ok=state["lag_s"] <= routing.DB_READ_MAX_LAG_S, error=None)
+
+    monkeypatch.setattr(routing, "_check_lag", fake_check_lag)
+    monkeypatch.setattr(routing, "has_read_replica", lambda: True)
+    monkeypatch.setattr(routing, "engine", PRIMARY)
+    monkeypatch.setattr(routing, "read_engine", REPLICA)
+    monkeypatch.setattr(routing, "DB_READ_LAG_CHECK_S", 0.0)
+    monkeypatch.setattr(routing, "DB_READ_MAX_LAG_S", 2.0)
+    monkeypatch.setattr(routing, "_recent_writes", {})
+    monkeypatch.setattr(routing, "_stats", routing.Counter())
+    monkeypatch.setattr(routing, "_lag", {"checked_at": 0.0, "ok": True, "lag_s": None, "error": None})
+    return state
+
+
+def _request(headers: dict | None = None, cookies: dict | None = None, ip: str = "10.0.0.1") -> Request:
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    if cookies:
+        raw.append((b"cookie", "; ".join(f"{k}={v}" for k, v in cookies.items()).encode()))
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw, "client": (ip, 1234)})
+
+
+def test_without_replica_reads_primary(lag, monkeypatch):
+    monkeypatch.setattr(routing, "has_read_replica", lambda: False)
+    assert routing.read_engine_for(_request()) is PRIMARY
+    assert lag["calls"] == 0
+
+
+def test_fresh_client_reads_replica(lag):
+    assert routing.read_engine_for(_request()) is REPLICA
+    assert routing._stats["replica"] == 1
+
+
+@pytest.mark.parametrize("age_s, expected", [(1.0, PRIMARY), (60.0, REPLICA)])
+def test_write_cookie(lag, age_s, expected):
+    request = _request(cookies={routing.WRITE_COOKIE: f"{time.time() - age_s:.3f}"})
+    assert routing.read_engine_for(request) is expected
+
+
+def test_malformed_cookie_is_ignored(lag):
+    assert routing.read_engine_for(_request(cookies={routing.WRITE_COOKIE: "gestern"})) is REPLICA
+
+
+def test_recent_write_keyed_on_client_id_not_ip(lag):
+    routing._mark_write("client-a")
+    assert routing.read_engine_for(_request({"X-Client-Id": "client-a"})) is PRIMARY
+    assert routing.read_engine_for(_request({"X-Client-Id": "client-b"})) is REPLICA
+    # Gleiche IP ohne Id: kein Rückschluss auf fremde Schreibzugriffe
+    assert routing.read_engine_for(_request()) is REPLICA
+    assert routing._stats == {"primary_after_write": 1, "replica": 2}
+
+
+def test_lag_too_high_reads_primary(lag):
+    lag["lag_s"] = 5.0
+    assert routing.read_engine_for(_request()) is PRIMARY
+    assert routing._stats["primary_lag"] == 1
+    assert routing.replica_stats()["usable"] is False
+
+
+def test_unreachable_replica_then_recovers(lag):
+    lag["error"] = OSError("connection refused")
+    assert routing.read_engine_for(_request()) is PRIMARY
+    assert "connection refused" in routing.replica_stats()["error"]
+    lag["error"] = None
+    assert routing.read_engine_for(_request()) is REPLICA
+
+
+def test_lag_check_is_cached(lag, monkeypatch):
+    monkeypatch.setattr(routing, "DB_READ_LAG_CHECK_S", 60.0)
+    for _ in range(3):
+        routing.read_engine_for(_request())
+    assert lag["calls"] == 1
+
+
+def _probe_client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(routing.ReadAfterWriteMiddleware)
+
+    @app.post("/write")
+    def write():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+def test_middleware_marks_client_id_and_sets_cookie(lag):
+    response = _probe_client().post("/write", headers={"X-Client-Id": "client-a"})
+    assert routing.WRITE_COOKIE in response.cookies
+    assert set(routing._recent_writes) == {"client-a"}
+
+
+def test_middleware_without_client_id_only_sets_cookie(lag):
+    response = _probe_client().post("/write")
+    assert routing.WRITE_COOKIE in response.cookies
+    assert routing._recent_writes == {}
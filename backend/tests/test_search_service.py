@@ -0,0 +1,41 @@
+"""Reine Hilfsfunktionen der Suche (ohne Datenbank)."""
+import uuid
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.services.search_service import _build_filters, _safe_snippet, decode_cursor, encode_cursor
+
+
+def test_date_to_date_only_includes_whole_day():
+    params = {}
+    sql = _build_filters(params, incident_types=None, date_from=None, date_to=date(2024, 5, 1), answer_keys=None)
+    assert "r.created_at < :date_to" in sql
+    assert params["date_to"] == date(2024, 5, 2)
+
+
+def test_date_to_datetime_is_inclusive():
+    ts = datetime(2024, 5, 1, 18, 30, tzinfo=timezone.utc)
+    params = {}
+    sql = _build_filters(params, incident_types=None, date_from=None, date_to=ts, answer_keys=None)
+    assert "r.created_at <= :date_to" in sql
+    assert params["date_to"] == ts
+
+
+@pytest.mark.parametrize("key, ranked", [
+    (0.0123456, True),
+    (datetime(2024, 5, 1, 12, 0, 0, 123456, tzinfo=timezone.utc), False),
+])
+def test_cursor_roundtrip(key, ranked):
+    report_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(key, report_id), ranked=ranked) == (key, str(report_id))
+
+
+@pytest.mark.parametrize("cursor", ["", "nope", "W1td", encode_cursor(0.5, uuid.uuid4()) + "!"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, ranked=False)
+
+
+def test_snippet_escaped_before_marks():
+    assert _safe_snippet("<b>\x02Brand\x03</b>") == "&lt;b&gt;<mark>Brand</mark>&lt;/b&gt;"
@@ -9,6 +9,8 @@
 -- % docker compose exec db psql -U sepj -d sepj -f /sepj_init.sql
 
 CREATE EXTENSION IF NOT EXISTS pgcrypto;
+-- pgvector für Bericht-Embeddings (Image: pgvector/pgvector:pg16)
+CREATE EXTENSION IF NOT EXISTS vector;
 
 -- ============================================================================
 -- 1) RAW REPORTS – Original transcripts
@@ -23,6 +25,12 @@ CREATE TABLE IF NOT EXISTS raw_reports (
   created_at  TIMESTAMPTZ NOT NULL DEFAULT now()
   );
 CREATE INDEX IF NOT EXISTS idx_raw_reports_created_at ON raw_reports(created_at DESC);
+-- Keyset-Paginierung der Suche ohne Suchbegriff: (created_at, id) absteigend
+CREATE INDEX IF NOT EXISTS idx_raw_reports_created_id ON raw_reports(created_at DESC, id DESC);
+-- Volltextsuche (deutsches Wörterbuch) über Titel + Text
+ALTER TABLE raw_reports ADD COLUMN IF NOT EXISTS search_tsv tsvector
+  GENERATED ALWAYS AS (to_tsvector('german', coalesce(title, '') || ' ' || body)) STORED;
+CREATE INDEX IF NOT EXISTS idx_raw_reports_search ON raw_reports USING GIN (search_tsv);
 
 -- ============================================================================
 -- 2) INCIDENTS – Events extracted from reports
@@ -63,6 +71,8 @@ CREATE TABLE IF NOT EXISTS incident_questions (
   order_index   INT DEFAULT 0,
   UNIQUE (incident_type, question_key)
 );
+-- Stichwort-Hinweise für die Passagen-Auswahl pro Frage
+ALTER TABLE incident_questions ADD COLUMN IF NOT EXISTS keywords TEXT[];
 
 -- ============================================================================
 -- 5) STRUCTURED ANSWERS – Per-incident attribute values
@@ -76,6 +86,9 @@ CREATE TABLE IF NOT EXISTS structured_answers (
   UNIQUE (incident_id, question_key)
 );
 CREATE INDEX IF NOT EXISTS idx_answers_incident ON structured_answers(incident_id);
+CREATE INDEX IF NOT EXISTS idx_answers_key ON structured_answers(question_key, incident_id);
+-- max(created_at) für ETag/Delta-Sync der History (Upsert setzt created_at neu)
+CREATE INDEX IF NOT EXISTS idx_answers_created ON structured_answers(created_at DESC);
 
 -- ============================================================================
 -- 6) FINAL REPORTS – Generated report text per incident
@@ -88,6 +101,15 @@ CREATE TABLE IF NOT EXISTS final_reports (
   created_by     UUID,
   created_at     TIMESTAMPTZ NOT NULL DEFAULT now()
 );
+CREATE INDEX IF NOT EXISTS idx_final_reports_incident ON final_reports(incident_id);
+-- Neue Version bei jeder Regenerierung (z.B. nach manueller Korrektur)
+ALTER TABLE final_reports ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 1;
+CREATE INDEX IF NOT EXISTS idx_final_reports_version ON final_reports(incident_id, version DESC);
+CREATE INDEX IF NOT EXISTS idx_final_reports_created ON final_reports(created_at DESC);
+-- Volltextsuche (deutsches Wörterbuch) über den generierten Bericht
+ALTER TABLE final_reports ADD COLUMN IF NOT EXISTS search_tsv tsvector
+  GENERATED ALWAYS AS (to_tsvector('german', body_md)) STORED;
+CREATE INDEX IF NOT EXISTS idx_final_reports_search ON final_reports USING GIN (search_tsv);
 
 -- ============================================================================
 -- 7) LLM RUNS – Model observability / audit logs
@@ -106,6 +128,111 @@ CREATE TABLE IF NOT EXISTS llm_runs (
   created_at        TIMESTAMPTZ NOT NULL DEFAULT now()
 );
 CREATE INDEX IF NOT EXISTS idx_llm_runs_by_incident ON llm_runs(incident_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_llm_runs_created ON llm_runs(created_at DESC);
+-- Lokale Token-Schätzung des Prompts (Vergleich mit tokens_prompt = prompt_eval_count)
+ALTER TABLE llm_runs ADD COLUMN IF NOT EXISTS tokens_prompt_est INT;
+-- Validiertes, typisiertes Ergebnis (z.B. Klassifikation), erspart Re-Parsing
+ALTER TABLE llm_runs ADD COLUMN IF NOT EXISTS result_json JSONB;
+-- SHA-256 des Prompts: Schlüssel für Replay (LLM_BACKEND=replay)
+ALTER TABLE llm_runs ADD COLUMN IF NOT EXISTS prompt_hash TEXT;
+CREATE INDEX IF NOT EXISTS idx_llm_runs_prompt_hash ON llm_runs(prompt_hash, created_at DESC);
+UPDATE llm_runs SET prompt_hash = encode(sha256(convert_to(request_json->>'prompt', 'UTF8')), 'hex')
+  WHERE prompt_hash IS NULL AND request_json ? 'prompt';
+
+-- ============================================================================
+-- 7b) REPORT EMBEDDINGS – Vektoren für Ähnlichkeitssuche (Ollama /api/embeddings)
+-- ============================================================================
+-- Dimension muss zu OLLAMA_EMBED_DIM passen (nomic-embed-text: 768)
+CREATE TABLE IF NOT EXISTS report_embeddings (
+  report_id   UUID PRIMARY KEY REFERENCES raw_reports(id) ON DELETE CASCADE,
+  model_name  TEXT NOT NULL,
+  embedding   vector(768) NOT NULL,
+  created_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+-- Approximativer Index (HNSW) für Top-k-Suche bei großem Bestand
+CREATE INDEX IF NOT EXISTS idx_report_embeddings_hnsw
+  ON report_embeddings USING hnsw (embedding vector_cosine_ops);
+
+-- ============================================================================
+-- 7c) ANALYSIS STAGES – Checkpoints der Analyse-Pipeline pro Bericht
+-- ============================================================================
+-- stage: 'classify' | 'answer:<incident_type>:<question_key>' | 'final_report'
+-- Ein Retry überspringt Stufen mit status = 'done'.
+CREATE TABLE IF NOT EXISTS analysis_stages (
+  report_id   UUID NOT NULL REFERENCES raw_reports(id) ON DELETE CASCADE,
+  stage       TEXT NOT NULL,
+  status      TEXT NOT NULL,            -- 'done'|'failed'
+  attempts    INT NOT NULL DEFAULT 1,
+  error       TEXT,
+  detail      JSONB,                    -- z.B. Ergebnis der Klassifikation
+  updated_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (report_id, stage)
+);
+
+-- ============================================================================
+-- 7d) REPORT SUMMARIES – denormalisierte History-Zeile pro Bericht
+-- ============================================================================
+-- Gepflegt von report_summary_service (Analyse-Ende, Antwort-Korrektur,
+-- Regenerierung, Backfill). result_data NULL = noch nicht berechnet; nachziehen mit
+--   python -m app.services.report_summary_service
+CREATE TABLE IF NOT EXISTS report_summaries (
+  report_id         UUID PRIMARY KEY REFERENCES raw_reports(id) ON DELETE CASCADE,
+  created_at        TIMESTAMPTZ NOT NULL,            -- = raw_reports.created_at
+  title             TEXT,
+  preview           TEXT,
+  matched_types     TEXT[] NOT NULL DEFAULT '{}',
+  answer_count      INT NOT NULL DEFAULT 0,
+  has_final_report  BOOLEAN NOT NULL DEFAULT FALSE,
+  run_count         INT NOT NULL DEFAULT 0,
+  total_latency_ms  BIGINT NOT NULL DEFAULT 0,
+  total_tokens      BIGINT NOT NULL DEFAULT 0,
+  result_data       JSONB,                           -- classification, facts, final_report
+  updated_at        TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_report_summaries_created ON report_summaries(created_at DESC);
+-- Delta-Sync der History: Keyset über (updated_at, report_id)
+DROP INDEX IF EXISTS idx_report_summaries_updated;
+CREATE INDEX IF NOT EXISTS idx_report_summaries_updated_id ON report_summaries(updated_at, report_id);
+-- Bestehende Berichte sofort sichtbar (ohne result_data, das berechnet die History live)
+INSERT INTO report_summaries (report_id, created_at, title, preview)
+SELECT id, created_at, coalesce(title, 'Unbenannter Bericht'),
+       CASE WHEN body IS NULL OR body = '' THEN '' ELSE left(body, 60) || '...' END
+FROM raw_reports
+ON CONFLICT DO NOTHING;
+
+-- ============================================================================
+-- 7e) REQUEST PROFILES – Stichproben, langsame und angeforderte Request-Traces (app/profiling.py)
+-- ============================================================================
+-- trigger: 'header' (X-Profile) | 'sample' | 'slow'; profile nur mit Stack-Stichproben
+CREATE TABLE IF NOT EXISTS request_profiles (
+  id           UUID PRIMARY KEY,
+  method       TEXT NOT NULL,
+  path         TEXT NOT NULL,
+  status       INT,
+  duration_ms  INT NOT NULL,
+  trigger      TEXT NOT NULL,
+  request_id   TEXT,
+  report_id    UUID,                    -- ohne FK: Profile überleben gelöschte Berichte
+  summary      JSONB NOT NULL,          -- Summen je Art (db/llm/...) und Phasen
+  timeline     JSONB NOT NULL,          -- Spans in zeitlicher Reihenfolge
+  profile      JSONB,                   -- folded stacks -> Anzahl Stichproben
+  created_at   TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_request_profiles_created ON request_profiles(created_at DESC);
+
+-- ============================================================================
+-- 7f) REPORT REGEN – entprellte Neuerzeugung des Abschlussberichts
+-- ============================================================================
+-- Jede Korrektur schiebt regen_due_at nach hinten; ein Worker übernimmt fällige
+-- Zeilen atomar (runner = host:pid) und löscht sie danach, sofern keine neue
+-- Korrektur dazukam (app/services/final_report_service.py).
+CREATE TABLE IF NOT EXISTS report_regen (
+  report_id     UUID PRIMARY KEY REFERENCES raw_reports(id) ON DELETE CASCADE,
+  regen_due_at  TIMESTAMPTZ NOT NULL,
+  runner        TEXT,
+  claimed_at    TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS idx_report_regen_due ON report_regen(regen_due_at);
 
 -- ============================================================================
 -- 8) PROMPTS – Prompt-Stammdaten
@@ -118,6 +245,125 @@ CREATE TABLE IF NOT EXISTS prompts (
   content        TEXT NOT NULL,      -- eigentlicher Prompt-Text
   created_at     TIMESTAMPTZ NOT NULL DEFAULT now()
 );
+
+-- ============================================================================
+-- 9) BACKFILL JOBS – Nachträgliche Beantwortung neuer/geänderter Fragen
+-- ============================================================================
+-- cursor_* zeigt auf das zuletzt abgearbeitete Incident (Sortierung created_at, id),
+-- damit ein abgebrochener Job dort weitermachen kann.
+CREATE TABLE IF NOT EXISTS backfill_jobs (
+  id                 UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  incident_type      TEXT NOT NULL,
+  question_key       TEXT NOT NULL,
+  overwrite          BOOLEAN NOT NULL DEFAULT FALSE,  -- auch vorhandene Antworten neu erzeugen
+  status             TEXT NOT NULL DEFAULT 'pending', -- 'pending'|'running'|'done'|'failed'|'cancelled'
+  total              INT NOT NULL DEFAULT 0,
+  processed          INT NOT NULL DEFAULT 0,
+  failed             INT NOT NULL DEFAULT 0,
+  cursor_created_at  TIMESTAMPTZ,
+  cursor_incident_id UUID,
+  error              TEXT,
+  created_at         TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at         TIMESTAMPTZ NOT NULL DEFAULT now(),
+  finished_at        TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS idx_backfill_jobs_question ON backfill_jobs(incident_type, question_key);
+-- Ausführender Worker (host:pid); gesetzt beim atomaren Übernehmen pending -> running
+ALTER TABLE backfill_jobs ADD COLUMN IF NOT EXISTS runner TEXT;
+-- Paging der Incidents eines Typs in Job-Reihenfolge
+CREATE INDEX IF NOT EXISTS idx_incidents_type_created ON incidents(incident_type, created_at, id);
+
+-- ============================================================================
+-- 10) CONFIG STATE – Versionszähler für Konfigurations-Caches der Worker
+-- ============================================================================
+-- Admin-CRUD erhöht version und sendet NOTIFY 'sepj_config' in derselben Transaktion.
+CREATE TABLE IF NOT EXISTS config_state (
+  id          BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),  -- genau eine Zeile
+  version     BIGINT NOT NULL DEFAULT 0,
+  updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO config_state (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+-- ============================================================================
+-- 10b) CONFIG SNAPSHOTS – unveränderlicher Konfigurationsstand pro Version
+-- ============================================================================
+-- Wird in derselben Transaktion wie die Versionserhöhung geschrieben
+-- (config_events.notify_config_change). Format = Bulk-Import/-Export.
+CREATE OR REPLACE FUNCTION config_snapshot_data() RETURNS JSONB
+LANGUAGE sql STABLE AS $$
+  SELECT jsonb_build_object(
+    'incident_types', coalesce((
+      SELECT jsonb_agg(to_jsonb(t) - 'created_at' ORDER BY t.code) FROM incident_types t), '[]'::jsonb),
+    'questions', coalesce((
+      SELECT jsonb_agg(to_jsonb(q) - 'id' ORDER BY q.incident_type, q.order_index, q.question_key)
+      FROM incident_questions q), '[]'::jsonb),
+    'prompts', coalesce((
+      SELECT jsonb_agg(to_jsonb(p) - 'id' - 'created_at' ORDER BY p.name, p.version_tag, p.created_at)
+      FROM prompts p), '[]'::jsonb)
+  )
+$$;
+
+CREATE TABLE IF NOT EXISTS config_snapshots (
+  version     BIGINT PRIMARY KEY,
+  scope       TEXT NOT NULL,                 -- 'types'|'questions'|'prompts'|'bulk'|'init'
+  comment     TEXT,
+  data        JSONB NOT NULL,
+  created_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Mit diesem Konfigurationsstand wurde der Bericht analysiert (Retry nutzt denselben)
+ALTER TABLE raw_reports ADD COLUMN IF NOT EXISTS config_version BIGINT;
+
+-- ============================================================================
+-- 10c) HISTORY STATE – Versionszähler für ETag/Cursor der History
+-- ============================================================================
+-- Erhöht von report_summary_service (einmal pro Transaktion mit Änderungen an
+-- report_summaries, direkt vor dem Commit) und per Trigger bei Löschungen; zusammen mit max(report_summaries.updated_at)
+-- die Grundlage für ETag und Cursor, statt count(*) über raw_reports.
+CREATE TABLE IF NOT EXISTS history_state (
+  id          BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),  -- genau eine Zeile
+  version     BIGINT NOT NULL DEFAULT 0,
+  updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO history_state (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_history_version() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  UPDATE history_state SET version = version + 1, updated_at = now();
+  RETURN NULL;
+END $$;
+
+-- Pro Statement, nicht pro Zeile: ein Löschvorgang = eine Erhöhung
+DROP TRIGGER IF EXISTS trg_raw_reports_history ON raw_reports;
+CREATE TRIGGER trg_raw_reports_history AFTER DELETE ON raw_reports
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_history_version();
+DROP TRIGGER IF EXISTS trg_llm_runs_history ON llm_runs;
+CREATE TRIGGER trg_llm_runs_history AFTER DELETE ON llm_runs
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_history_version();
+DROP TRIGGER IF EXISTS trg_final_reports_history ON final_reports;
+CREATE TRIGGER trg_final_reports_history AFTER DELETE ON final_reports
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_history_version();
+DROP TRIGGER IF EXISTS trg_structured_answers_history ON structured_answers;
+CREATE TRIGGER trg_structured_answers_history AFTER DELETE ON structured_answers
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_history_version();
+DROP TRIGGER IF EXISTS trg_report_summaries_history ON report_summaries;
+CREATE TRIGGER trg_report_summaries_history AFTER DELETE ON report_summaries
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_history_version();
+
+-- ============================================================================
+-- 10d) LLM SLOT WAITERS – prozessübergreifende Vergabe der Ollama-Slots
+-- ============================================================================
+-- Eine Zeile pro wartendem Worker (host:pid) mit seiner besten Prioritätsklasse
+-- (app/services/llm_scheduler.py). Ein Slot (Advisory-Lock) wird nur genommen,
+-- wenn kein anderer Worker mit höherer Priorität bzw. gleicher, aber früher,
+-- wartet; Freigaben wecken per NOTIFY 'sepj_llm_slots'.
+CREATE UNLOGGED TABLE IF NOT EXISTS llm_slot_waiters (
+  runner      TEXT PRIMARY KEY,
+  level       INT NOT NULL,             -- llm_scheduler.PRIORITIES, kleiner = wichtiger
+  since       TIMESTAMPTZ NOT NULL,     -- Wartebeginn der Anfrage
+  updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
 -- ============================================================================
 
 -- ============================================================================
@@ -185,6 +431,18 @@ VALUES
   ('alkohol_drogen', 'consequences', 'Welche Folgen gab es?',           'string',   TRUE, 40)
 ON CONFLICT DO NOTHING;
 
+-- Stichwort-Hinweise für häufige Fragen (nur setzen, wenn noch leer)
+UPDATE incident_questions SET keywords = ARRAY['uhr', 'gestern', 'heute', 'morgens', 'abends', 'nachts', 'datum', 'gegen', 'zeitpunkt']
+  WHERE question_key = 'when' AND keywords IS NULL;
+UPDATE incident_questions SET keywords = ARRAY['zelle', 'raum', 'hof', 'gang', 'keller', 'werkstatt', 'eingang', 'trakt', 'ort']
+  WHERE question_key = 'where' AND keywords IS NULL;
+UPDATE incident_questions SET keywords = ARRAY['insasse', 'bediensteter', 'beamter', 'häftling', 'person', 'täter', 'opfer']
+  WHERE question_key IN ('who_involved', 'opfer', 'taeter') AND keywords IS NULL;
+UPDATE incident_questions SET keywords = ARRAY['verletzt', 'verletzung', 'schaden', 'beschädigt', 'entwendet', 'folge', 'arzt']
+  WHERE question_key = 'consequences' AND keywords IS NULL;
+UPDATE incident_questions SET keywords = ARRAY['zeuge', 'zeugin', 'beobachtet', 'gesehen', 'anwesend']
+  WHERE question_key = 'witnesses' AND keywords IS NULL;
+
 INSERT INTO prompts (name, purpose, version_tag, content)
 VALUES
   (
@@ -287,4 +545,16 @@ INSERT INTO raw_reports (title, body, source, language) VALUES
   ('Schnittverletzung beim Kochen',
    'Heute früh um 07:10 schnitt sich D versehentlich beim Schneiden am Finger. Der Schnitt wurde vor Ort versorgt.',
    'note', 'de')
-   ON CONFLICT DO NOTHING;
\ No newline at end of file
+   ON CONFLICT DO NOTHING;
+
+-- History-Zeilen für die Beispielberichte (siehe 7d)
+INSERT INTO report_summaries (report_id, created_at, title, preview)
+SELECT id, created_at, coalesce(title, 'Unbenannter Bericht'),
+       CASE WHEN body IS NULL OR body = '' THEN '' ELSE left(body, 60) || '...' END
+FROM raw_reports
+ON CONFLICT DO NOTHING;
+
+-- Snapshot des Ausgangsstands (siehe 10b)
+INSERT INTO config_snapshots (version, scope, data)
+SELECT version, 'init', config_snapshot_data() FROM config_state
+ON CONFLICT DO NOTHING;
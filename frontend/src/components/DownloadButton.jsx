@@ -1,30 +1,35 @@
 import React from "react";
 import axios from "axios";
 
-export default function DownloadButton({ fileName, onError }) {
+export default function DownloadButton({ reportId, format = "pdf", fileName, onError }) {
   const handleDownload = async () => {
     try {
       const response = await axios.get(
-        `http://localhost:3001/reports/download?filename=${fileName}`,
+        `http://localhost:8000/api/reports/${reportId}/export?format=${format}`,
         { responseType: "blob" }
       );
+      // Dateiname aus Content-Disposition übernehmen, falls vorhanden
+      const disposition = response.headers["content-disposition"] || "";
+      const match = disposition.match(/filename="?([^";]+)"?/);
       const url = window.URL.createObjectURL(new Blob([response.data]));
       const a = document.createElement("a");
       a.href = url;
-      a.download = fileName || "bericht.pdf";
+      a.download = fileName || (match && match[1]) || `bericht.${format}`;
       document.body.appendChild(a);
       a.click();
       a.remove();
+      window.URL.revokeObjectURL(url);
     } catch (err) {
       console.error("Download fehlgeschlagen", err);
-      onError("Fehler beim Download");
+      onError && onError("Fehler beim Download");
     }
   };
 
   return (
     <button
       onClick={handleDownload}
-      className="border border-black px-6 py-2 mt-4 hover:bg-gray-200"
+      disabled={!reportId}
+      className="border border-black px-6 py-2 mt-4 hover:bg-gray-200 disabled:opacity-50"
     >
       Bericht downloaden
     </button>
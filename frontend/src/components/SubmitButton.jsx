@@ -9,12 +9,12 @@ export default function SubmitButton({ file, onSuccess, onError }) {
     formData.append("file", file);
 
     try {
-      const response = await axios.post("http://localhost:3001/reports/upload", formData, {
+      const response = await axios.post("http://localhost:8000/api/reports/upload", formData, {
         headers: { "Content-Type": "multipart/form-data" },
       });
 
       if (response.status === 200) {
-        onSuccess && onSuccess();
+        onSuccess && onSuccess(response.data);
       } else {
         onError && onError("Upload fehlgeschlagen");
       }
@@ -75,6 +75,19 @@ export default function QuestionsManager() {
     } catch(e) { alert("Netzwerkfehler"); }
   };
 
+  // Frage für bestehende Vorfälle nachträglich beantworten lassen
+  const handleBackfill = async (q) => {
+    try {
+        const res = await fetch(`http://localhost:8000/api/config/questions/${q.id}/backfill`, { method: "POST" });
+        if (res.ok) {
+            const job = await res.json();
+            alert(`Nachbeantwortung gestartet: ${job.total} Vorfälle (Status: ${job.status})`);
+        } else {
+            alert("Fehler beim Starten der Nachbeantwortung");
+        }
+    } catch(e) { alert("Netzwerkfehler"); }
+  };
+
   const confirmDelete = (id) => {
     setDeleteId(id);
     setShowDeleteModal(true);
@@ -199,6 +212,15 @@ export default function QuestionsManager() {
                     >
                         Löschen
                     </Button>
+                    {!q.isNew && (
+                        <Button
+                            size="xs"
+                            color="gray"
+                            onClick={() => handleBackfill(q)}
+                        >
+                            Nachbeantworten
+                        </Button>
+                    )}
                     <Button 
                         size="xs" 
                         color="blue" 
@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import ReportModal from "../components/ReportModal";
 import HistoryItem from "../components/HistoryItem";
 
@@ -9,10 +9,33 @@ export default function LandingPage() {
   const [history, setHistory] = useState([]);
   const [selectedReport, setSelectedReport] = useState(null);
 
+  // Sync-Cursor der letzten History-Abfrage (Delta-Sync über ?since=)
+  const historyCursor = useRef(null);
+
   const fetchHistory = () => {
-    fetch("http://localhost:8000/api/reports/history")
-      .then((res) => res.json())
-      .then((data) => setHistory(data))
+    const cursor = historyCursor.current;
+    const url = cursor
+      ? `http://localhost:8000/api/reports/history?since=${encodeURIComponent(cursor)}`
+      : "http://localhost:8000/api/reports/history";
+    fetch(url)
+      .then(async (res) => {
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        historyCursor.current = res.headers.get("X-History-Cursor") || cursor;
+        // Mehr Änderungen als eine Seite: direkt ab dem neuen Cursor weiterholen
+        if (cursor && res.headers.get("X-History-Has-More") === "true") fetchHistory();
+        const data = await res.json();
+        if (!cursor) {
+          setHistory(data);
+          return;
+        }
+        // Nur neue/geänderte Einträge: per id ersetzen, neueste oben
+        setHistory((prev) => {
+          const changed = new Set(data.map((r) => r.id));
+          return [...data, ...prev.filter((r) => !changed.has(r.id))]
+            .sort((a, b) => new Date(b.date) - new Date(a.date))
+            .slice(0, 20);
+        });
+      })
       .catch((err) => console.error("Fehler beim Laden der History:", err));
   };
 